@@ -0,0 +1,65 @@
+# In-process pub/sub for signal events: every event is serialised once and the same frame is handed
+# to each subscriber's bounded queue, so a subscriber costs a queue put, not a JSON dump
+# A subscriber that falls QUEUE_SIZE events behind is disconnected and resumes from the history buffer
+import asyncio
+import json
+from collections import deque, namedtuple
+from utils.logger import logger
+
+QUEUE_SIZE = 100  # events a subscriber may fall behind before it is dropped
+HISTORY_SIZE = 500  # recent events kept for clients resuming with Last-Event-ID
+EVENT_SIGNAL = 'signal'
+EVENT_STATUS = 'status'
+
+# data is the JSON text sent over WebSockets, sse the same payload framed for Server-Sent Events
+Event = namedtuple('Event', ['id', 'type', 'data', 'sse'])
+
+class Broadcaster:
+    def __init__(self, queue_size: int = QUEUE_SIZE, history_size: int = HISTORY_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self.last_id = 0
+
+    def publish(self, event_type: str, payload: dict):
+        # Called from the event loop; never waits on a subscriber
+        try:
+            self.last_id += 1
+            data = json.dumps({'id': self.last_id, 'type': event_type, 'data': payload}, default=str)
+            event = Event(self.last_id, event_type, data, f"id: {self.last_id}\nevent: {event_type}\ndata: {data}\n\n".encode())
+            self.history.append(event)
+            for queue in list(self.subscribers):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._drop(queue)
+        except Exception as e:
+            logger.error(f"Error publishing {event_type} event: {str(e)}")
+
+    def publish_signal(self, event_type: str, signal):
+        try:
+            payload = signal.to_dict()
+        except Exception as e:
+            logger.error(f"[{signal.symbol}] Error serialising {event_type} event: {str(e)}")
+            return
+        self.publish(event_type, payload)
+
+    def _drop(self, queue: asyncio.Queue):
+        # Make room for the end-of-stream marker; the client reconnects and replays what it missed
+        self.subscribers.discard(queue)
+        queue.get_nowait()
+        queue.put_nowait(None)
+        logger.warning("Dropped a slow signal feed subscriber")
+
+    def subscribe(self, last_event_id: int = None) -> tuple:
+        # Returns the subscriber's queue and the buffered events after last_event_id
+        # None in the queue means the subscription was dropped
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        backlog = [e for e in self.history if e.id > last_event_id] if last_event_id is not None else []
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+broadcaster = Broadcaster()
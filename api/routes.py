@@ -0,0 +1,79 @@
+# Signal feed endpoints on the FastAPI app: SSE and WebSocket streams of new signals and status changes
+# from the shared broadcaster, and a paginated query over the signal log for history
+import asyncio
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from api.broadcaster import broadcaster
+from report.analytics import signal_page
+from utils.logger import logger
+
+KEEPALIVE_SECONDS = 15  # comment frame so proxies keep idle SSE connections open
+MAX_PAGE_SIZE = 500
+
+def _last_event_id(value) -> int:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+async def signal_stream(request: Request):
+    # Server-Sent Events; browsers resume after a reconnect by sending Last-Event-ID
+    queue, backlog = broadcaster.subscribe(_last_event_id(request.headers.get('last-event-id')))
+
+    async def frames():
+        try:
+            for event in backlog:
+                yield event.sse
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield event.sse
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(frames(), media_type='text/event-stream', headers=headers)
+
+async def signal_socket(websocket: WebSocket, last_event_id: int = None):
+    # WebSocket stream of the same events as JSON text messages
+    await websocket.accept()
+    queue, backlog = broadcaster.subscribe(last_event_id)
+    try:
+        for event in backlog:
+            await websocket.send_text(event.data)
+        while True:
+            event = await queue.get()
+            if event is None:
+                await websocket.close(code=1013)
+                break
+            await websocket.send_text(event.data)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in signal WebSocket: {str(e)}")
+    finally:
+        broadcaster.unsubscribe(queue)
+
+async def list_signals(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    symbol: str = None,
+    status: str = None,
+    direction: str = None,
+    start: str = None,
+    end: str = None
+):
+    # Newest first; pass next_cursor back as cursor for the following page
+    rows, next_cursor = await asyncio.to_thread(signal_page, limit, cursor, symbol, status, direction, start, end)
+    return {'signals': rows, 'next_cursor': next_cursor}
+
+def register_api(app: FastAPI):
+    app.add_api_route("/signals", list_signals, methods=["GET"])
+    app.add_api_route("/signals/stream", signal_stream, methods=["GET"])
+    app.add_api_websocket_route("/signals/ws", signal_socket)
+    logger.info("Signal feed endpoints mounted at /signals")
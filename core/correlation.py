@@ -0,0 +1,128 @@
+# Rolling return correlation across the scanned universe, updated once per candle
+# Pairwise sums are kept in NumPy matrices so adding a candle and dropping the oldest one is O(n^2)
+# vector work, with no rescans of history
+import numpy as np
+from utils.logger import logger
+
+CORRELATION_WINDOW = 96  # one day of 15m returns
+CANDLE_SECONDS = 15 * 60  # a return is only taken between consecutive candles of this length
+NO_TIME = np.iinfo(np.int64).min
+CORRELATION_THRESHOLD = 0.8
+MIN_OBSERVATIONS = 20
+INITIAL_CAPACITY = 256
+
+class CorrelationMatrix:
+    def __init__(self, window: int = CORRELATION_WINDOW, capacity: int = INITIAL_CAPACITY, candle_seconds: int = CANDLE_SECONDS):
+        self.window = window
+        self.candle_ns = candle_seconds * 10**9
+        self.slots = {}
+        self.last_time = None
+        self.pos = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        old = getattr(self, 'capacity', 0)
+        self.capacity = capacity
+
+        def grow(array, shape, fill=0.0, dtype=np.float64):
+            new = np.full(shape, fill, dtype=dtype)
+            if array is not None:
+                new[tuple(slice(0, s) for s in array.shape)] = array
+            return new
+
+        self.returns = grow(getattr(self, 'returns', None), (self.window, capacity))
+        self.mask = grow(getattr(self, 'mask', None), (self.window, capacity))
+        self.last_close = grow(getattr(self, 'last_close', None), (capacity,), np.nan)
+        # Candle time (ns) of each slot's last close
+        self.last_close_time = grow(getattr(self, 'last_close_time', None), (capacity,), NO_TIME, np.int64)
+        # n[i, j] co-observations, sx[i, j] sum of i's returns where j was also seen, etc.
+        for name in ('n', 'sx', 'sxx', 'sxy'):
+            setattr(self, name, grow(getattr(self, name, None), (capacity, capacity)))
+        if old:
+            logger.info(f"Correlation matrix grown from {old} to {capacity} symbols")
+
+    def _slot(self, symbol: str) -> int:
+        if symbol not in self.slots:
+            if len(self.slots) == self.capacity:
+                self._allocate(self.capacity * 2)
+            self.slots[symbol] = len(self.slots)
+        return self.slots[symbol]
+
+    def _accumulate(self, row: np.ndarray, mask: np.ndarray, sign: float):
+        values = row * mask
+        self.n += sign * np.outer(mask, mask)
+        self.sx += sign * np.outer(values, mask)
+        self.sxx += sign * np.outer(values * values, mask)
+        self.sxy += sign * np.outer(values, values)
+
+    def update(self, candle_time, symbols, closes):
+        # Add one candle of closes for the universe; later calls for the same candle are ignored
+        if self.last_time is not None and candle_time <= self.last_time:
+            return
+        slots = np.array([self._slot(s) for s in symbols], dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+        row = np.zeros(self.capacity)
+        mask = np.zeros(self.capacity)
+        previous = self.last_close[slots]
+        # A close from before a gap (cooldown, skipped cycle) would turn a multi-hour move into one return;
+        # such a symbol only restarts from this close and has no observation this candle
+        now = np.datetime64(candle_time, 'ns').astype(np.int64)
+        consecutive = self.last_close_time[slots] == now - self.candle_ns
+        seen = consecutive & np.isfinite(previous) & (previous > 0) & (closes > 0)
+        row[slots[seen]] = np.log(closes[seen] / previous[seen])
+        mask[slots[seen]] = 1.0
+        self.last_close[slots] = closes
+        self.last_close_time[slots] = now
+
+        # Drop the observation leaving the window, then add the new one
+        self._accumulate(self.returns[self.pos], self.mask[self.pos], -1.0)
+        self.returns[self.pos] = row
+        self.mask[self.pos] = mask
+        self._accumulate(row, mask, 1.0)
+        self.pos = (self.pos + 1) % self.window
+        self.last_time = candle_time
+
+    def correlation(self, symbols) -> np.ndarray:
+        # Pairwise correlation over co-observed returns, NaN where there is too little overlap
+        idx = np.array([self.slots.get(s, -1) for s in symbols], dtype=np.int64)
+        known = idx >= 0
+        result = np.full((len(symbols), len(symbols)), np.nan)
+        if not known.any():
+            return result
+        sel = np.ix_(idx[known], idx[known])
+        n, sx, sxx, sxy = self.n[sel], self.sx[sel], self.sxx[sel], self.sxy[sel]
+        sy, syy = sx.T, sxx.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * sxy - sx * sy
+            var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            corr = np.where((n >= MIN_OBSERVATIONS) & (var > 0), cov / np.sqrt(var), np.nan)
+        result[np.ix_(known, known)] = corr
+        return result
+
+def select_representatives(signals: list, matrix: CorrelationMatrix, sent: list = None, threshold: float = CORRELATION_THRESHOLD) -> list:
+    # Cluster signals whose symbols move together and keep only the strongest of each cluster
+    # Signals correlated with one already sent this cycle are dropped as well
+    sent = sent or []
+    ranked = sorted(signals, key=lambda s: s.confidence, reverse=True)
+    symbols = [s.symbol for s in sent] + [s.symbol for s in ranked]
+    corr = matrix.correlation(symbols)
+    kept_rows = list(range(len(sent)))
+    leaders = list(sent)
+    selected = []
+    for i, signal in enumerate(ranked):
+        row = len(sent) + i
+        # A LONG on one symbol and a SHORT on an inversely correlated one are the same trade
+        duplicate_of = next(
+            (leaders[k].symbol for k, r in enumerate(kept_rows)
+             if (corr[row, r] if leaders[k].direction == signal.direction else -corr[row, r]) >= threshold),
+            None
+        )
+        if duplicate_of:
+            logger.info(f"[{signal.symbol}] Skipped {signal.direction}, correlated with {duplicate_of}")
+            continue
+        kept_rows.append(row)
+        leaders.append(signal)
+        selected.append(signal)
+    return selected
+
+correlation_matrix = CorrelationMatrix()
@@ -29,12 +29,16 @@ def calculate_indicators(df):
         # ADX for trend strength with softened threshold
         df['adx'] = ta.trend.ADXIndicator(df['high'], df['low'], df['close'], window=14, fillna=True).adx()
 
+        # EMA 20/50 for multi-timeframe trend alignment
+        df['ema_20'] = ta.trend.EMAIndicator(df['close'], window=20, fillna=True).ema_indicator()
+        df['ema_50'] = ta.trend.EMAIndicator(df['close'], window=50, fillna=True).ema_indicator()
+
         # Handle NaN and Inf values
         df.replace([np.inf, -np.inf], np.nan, inplace=True)
         df.ffill(inplace=True)
         df.fillna(0.0, inplace=True)
 
-        logger.info("Indicators calculated: rsi, volume_sma_20, macd, atr, adx, macd_status")
+        logger.info("Indicators calculated: rsi, volume_sma_20, macd, atr, adx, ema_20, ema_50, macd_status")
         return df
     except Exception as e:
         logger.error(f"Error calculating indicators: {str(e)}")
@@ -1,9 +1,17 @@
+import numpy as np
 import pandas as pd
 import ccxt.async_support as ccxt
 from utils.logger import logger
 import asyncio
 import ta
 
+# Confluence settings: a timeframe passes when EMAs align with the direction, volume is elevated
+# and the latest candle is not a fake breakout; higher timeframes weigh more in the score
+MTF_VOLUME_MULTIPLIER = 1.5
+MTF_MIN_SCORE = 0.5
+MTF_WEIGHTS = {'15m': 1.0, '1h': 1.0, '4h': 1.5, '1d': 1.5}
+MTF_BOOST_PER_TIMEFRAME = 5
+
 async def fetch_ohlcv(exchange, symbol, timeframe, limit=100):
     try:
         ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
@@ -17,47 +25,81 @@ async def fetch_ohlcv(exchange, symbol, timeframe, limit=100):
         logger.error(f"[{symbol}] Failed to fetch OHLCV for {timeframe}: {e}")
         return None
 
-async def multi_timeframe_boost(symbol, exchange, direction):
-    try:
-        boost = 0
-        for timeframe in ['4h', '1d']:
-            df = await fetch_ohlcv(exchange, symbol, timeframe)
-            if df is None:
-                continue
-
-            # Calculate EMAs and volume SMA
-            df["ema_20"] = ta.trend.EMAIndicator(df["close"], window=20, fillna=True).ema_indicator()
-            df["ema_50"] = ta.trend.EMAIndicator(df["close"], window=50, fillna=True).ema_indicator()
-            df["volume_sma_20"] = df["volume"].rolling(window=20).mean()
-
-            latest = df.iloc[-1]
-            prev = df.iloc[-2]
-            if len(df) >= 3:
-                next_candle = df.iloc[-3]
+def _latest_values(df: pd.DataFrame) -> list:
+    # Last three candles' values needed by the checks; EMAs are reused when calculate_indicators already ran
+    if 'ema_20' in df and 'ema_50' in df:
+        ema_20, ema_50 = df['ema_20'].iat[-1], df['ema_50'].iat[-1]
+    else:
+        ema_20 = ta.trend.EMAIndicator(df['close'], window=20, fillna=True).ema_indicator().iat[-1]
+        ema_50 = ta.trend.EMAIndicator(df['close'], window=50, fillna=True).ema_indicator().iat[-1]
+    if 'volume_sma_20' in df:
+        volume_sma = df['volume_sma_20'].iat[-1]
+    else:
+        volume_sma = df['volume'].tail(20).mean()
+    return [
+        ema_20, ema_50, df['volume'].iat[-1], volume_sma,
+        df['high'].iat[-1], df['low'].iat[-1],
+        df['high'].iat[-2], df['low'].iat[-2], df['close'].iat[-3]
+    ]
 
-            # EMA alignment
-            if direction == "LONG" and latest["ema_20"] > latest["ema_50"]:
-                boost += 5
-            elif direction == "SHORT" and latest["ema_20"] < latest["ema_50"]:
-                boost += 5
-            else:
-                logger.warning(f"[{symbol}] {timeframe} EMA misalignment")
-                return 0
+def check_multi_timeframe_agreement(symbol: str, direction: str, frames: dict) -> dict:
+    # Score agreement across the frames already loaded for the symbol, with no extra fetches
+    # All timeframes are checked together on one small array instead of per-frame DataFrame ops
+    try:
+        timeframes = [tf for tf, df in frames.items() if df is not None and len(df) >= 3]
+        if not timeframes:
+            logger.warning(f"[{symbol}] No frames for multi-timeframe agreement")
+            return {'agree': False, 'score': 0.0, 'boost': 0, 'timeframes': {}}
 
-            # Volume filter
-            if latest["volume"] < 1.5 * latest["volume_sma_20"]:
-                logger.warning(f"[{symbol}] Low volume on {timeframe}")
-                return 0
+        values = np.array([_latest_values(frames[tf]) for tf in timeframes], dtype=np.float64)
+        ema_20, ema_50, volume, volume_sma, high, low, prev_high, prev_low, third_close = values.T
+        if direction == "LONG":
+            ema_aligned = ema_20 > ema_50
+            fake_breakout = (prev_high > high) & (third_close <= prev_high)
+        else:
+            ema_aligned = ema_20 < ema_50
+            fake_breakout = (prev_low < low) & (third_close >= prev_low)
+        volume_ok = volume >= MTF_VOLUME_MULTIPLIER * volume_sma
+        passed = ema_aligned & volume_ok & ~fake_breakout
 
-            # Fake breakout check
-            if direction == "LONG" and prev["high"] > latest["high"] and next_candle["close"] <= prev["high"]:
-                logger.warning(f"[{symbol}] Fake breakout detected on {timeframe}")
-                return 0
-            if direction == "SHORT" and prev["low"] < latest["low"] and next_candle["close"] >= prev["low"]:
-                logger.warning(f"[{symbol}] Fake breakout detected on {timeframe}")
-                return 0
+        weights = np.array([MTF_WEIGHTS.get(tf, 1.0) for tf in timeframes])
+        score = float(weights[passed].sum() / weights.sum())
+        details = {
+            tf: {
+                'ema_aligned': bool(ema_aligned[i]),
+                'volume_ok': bool(volume_ok[i]),
+                'fake_breakout': bool(fake_breakout[i]),
+                'passed': bool(passed[i])
+            }
+            for i, tf in enumerate(timeframes)
+        }
+        result = {
+            'agree': score >= MTF_MIN_SCORE,
+            'score': score,
+            'boost': MTF_BOOST_PER_TIMEFRAME * int(passed.sum()) if passed.all() else 0,
+            'timeframes': details
+        }
+        logger.info(f"[{symbol}] Multi-timeframe agreement for {direction}: {score:.2f} ({int(passed.sum())}/{len(timeframes)} timeframes)")
+        return result
+    except Exception as e:
+        logger.error(f"[{symbol}] Error in multi-timeframe agreement: {e}")
+        return {'agree': False, 'score': 0.0, 'boost': 0, 'timeframes': {}}
 
-        return boost
+async def multi_timeframe_boost(symbol, exchange, direction, frames=None):
+    # Boost of 5 per higher timeframe when 4h and 1d both confirm, 0 otherwise
+    # Frames already loaded for the symbol are reused; only missing timeframes are fetched
+    try:
+        frames = dict(frames or {})
+        higher = {}
+        for timeframe in ['4h', '1d']:
+            df = frames.get(timeframe)
+            if df is None:
+                df = await fetch_ohlcv(exchange, symbol, timeframe)
+            if df is not None:
+                higher[timeframe] = df
+        if not higher:
+            return 0
+        return check_multi_timeframe_agreement(symbol, direction, higher)['boost']
 
     except Exception as e:
         logger.error(f"[{symbol}] Error in multi_timeframe_boost: {e}")
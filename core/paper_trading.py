@@ -0,0 +1,402 @@
+# Paper trading: a virtual position for every sent signal, sized from its leverage and closed along its TP ladder
+# Positions live in a structure of arrays, so each price update checks TP/SL and revalues every open position in
+# one numpy pass; the same PaperBook runs live on streamed tickers and offline over replayed candles
+import asyncio
+import os
+import time
+import numpy as np
+import pandas as pd
+from data.orderbook import order_books
+from data.exchanges import get_adapter, venue_for, StreamClients, SCAN_VENUES, DEFAULT_VENUE
+from model.signal import Signal, read_signal_log
+from utils.logger import logger, SIGNALS_LOG
+
+# Opt-in: live paper trading streams tickers for every symbol with an open position
+PAPER_TRADING = os.getenv('PAPER_TRADING', '0') == '1'
+STARTING_EQUITY = float(os.getenv('PAPER_EQUITY', 10_000))
+MARGIN_PCT = 1.0  # % of current equity posted as margin per position
+TP_FRACTIONS = (0.5, 0.3, 0.2)  # share of the initial size closed at TP1, TP2 and TP3
+FEE_PCT = 0.04  # taker fee per side, on the filled notional
+DEFAULT_SPREAD_PCT = 0.05  # assumed when the symbol has no fresh streamed book (and in replays)
+DEFAULT_SLIPPAGE_PCT = 0.05
+MAX_HOLD_SECONDS = 24 * 3600  # positions still open after this are closed at market
+EQUITY_INTERVAL = 60  # seconds between points of the equity curve
+FLUSH_EVENTS = 100  # buffered trade events written at once; pending ones go out with the next equity point
+INITIAL_CAPACITY = 1024  # position rows allocated up front; doubled or compacted when full
+TRADES_LOG = os.path.join("logs", "paper_trades.csv")
+EQUITY_LOG = os.path.join("logs", "paper_equity.csv")
+REPLAY_TRADES_LOG = os.path.join("logs", "paper_replay_trades.csv")
+REPLAY_EQUITY_LOG = os.path.join("logs", "paper_replay_equity.csv")
+REPLAY_TIMEFRAME = "15m"
+REPLAY_BATCH = 1000  # candles per request when loading replay history
+
+FLOAT_COLUMNS = ('entry', 'qty', 'initial_qty', 'margin', 'tp1', 'tp2', 'tp3', 'sl', 'stop_slippage', 'opened_at', 'realized')
+
+def entry_fill(direction: str, reference: float, notional: float, book=None) -> tuple:
+    # Market entry: crosses the spread and walks the book for the notional
+    # Returns the fill price and the slippage in % a stop-out of the same size would pay on the other side
+    sign = 1 if direction == "LONG" else -1
+    if book is not None and book.is_fresh():
+        entry_slippage, stop_slippage = book.slippage(direction, notional)
+        if np.isfinite(entry_slippage) and np.isfinite(stop_slippage):
+            best = book.asks[0, 0] if sign > 0 else book.bids[0, 0]
+            return float(best * (1 + sign * entry_slippage / 100)), float(stop_slippage)
+    cost = DEFAULT_SPREAD_PCT / 2 + DEFAULT_SLIPPAGE_PCT
+    return float(reference * (1 + sign * cost / 100)), cost
+
+class PaperBook:
+    def __init__(self, trades_path: str = TRADES_LOG, equity_path: str = EQUITY_LOG,
+                 starting_equity: float = STARTING_EQUITY, capacity: int = INITIAL_CAPACITY):
+        self.trades_path = trades_path
+        self.equity_path = equity_path
+        self.starting_equity = starting_equity
+        self.size = 0  # rows in use; closed rows stay until the next compaction
+        for name in FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(capacity))
+        self.symbol_id = np.zeros(capacity, dtype=np.int32)
+        self.sign = np.zeros(capacity, dtype=np.int8)
+        self.stage = np.zeros(capacity, dtype=np.int8)  # targets already taken
+        self.leverage = np.zeros(capacity, dtype=np.int16)
+        self.open = np.zeros(capacity, dtype=bool)
+        self.keys = [None] * capacity  # signal timestamp per row, for the trade log
+        # Prices per symbol id; high/low are the extremes since the previous update
+        self.symbols = []
+        self.symbol_ids = {}
+        self.last = np.zeros(0)
+        self.high = np.zeros(0)
+        self.low = np.zeros(0)
+        self.realized_total = 0.0
+        self.unrealized_total = 0.0
+        self.fees_total = 0.0
+        self.last_equity_at = 0.0
+        self.trade_rows = []
+        self.equity_rows = []
+
+    def _symbol(self, symbol: str) -> int:
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.last, self.high, self.low = (np.append(a, np.nan) for a in (self.last, self.high, self.low))
+        return self.symbol_ids[symbol]
+
+    def _resize(self):
+        # Full: drop closed rows if that frees at least half of the space, otherwise double it
+        keep = np.flatnonzero(self.open[:self.size])
+        capacity = len(self.open)
+        if len(keep) > capacity // 2:
+            capacity *= 2
+        for name in (*FLOAT_COLUMNS, 'symbol_id', 'sign', 'stage', 'leverage', 'open'):
+            column = getattr(self, name)
+            resized = np.zeros(capacity, dtype=column.dtype)
+            resized[:len(keep)] = column[keep]
+            setattr(self, name, resized)
+        self.keys = [self.keys[i] for i in keep] + [None] * (capacity - len(keep))
+        self.size = len(keep)
+
+    def equity(self) -> float:
+        rows = np.flatnonzero(self.open[:self.size])
+        return self.starting_equity + self.realized_total + float(self._unrealized(rows).sum())
+
+    def _unrealized(self, rows: np.ndarray) -> np.ndarray:
+        last = self.last[self.symbol_id[rows]]
+        last = np.where(np.isnan(last), self.entry[rows], last)
+        return self.sign[rows] * (last - self.entry[rows]) * self.qty[rows]
+
+    def open_symbols(self) -> list:
+        return sorted({self.symbols[i] for i in np.unique(self.symbol_id[:self.size][self.open[:self.size]])})
+
+    def open_position(self, signal: Signal, book=None, now: float = None) -> bool:
+        # Margin is MARGIN_PCT of current equity; the position is margin x the signal's leverage
+        try:
+            now = time.time() if now is None else now
+            if self.size == len(self.open):
+                self._resize()
+            margin = self.equity() * MARGIN_PCT / 100
+            if margin <= 0:
+                logger.warning(f"[{signal.symbol}] Paper account has no equity left, position not opened")
+                return False
+            leverage = max(int(signal.leverage), 1)
+            price, stop_slippage = entry_fill(signal.direction, signal.entry, margin * leverage, book)
+            qty = margin * leverage / price
+            fee = margin * leverage * FEE_PCT / 100
+            row = self.size
+            self.size += 1
+            sid = self._symbol(signal.symbol)
+            values = {
+                'entry': price, 'qty': qty, 'initial_qty': qty, 'margin': margin, 'tp1': signal.tp1, 'tp2': signal.tp2,
+                'tp3': signal.tp3, 'sl': signal.sl, 'stop_slippage': stop_slippage, 'opened_at': now, 'realized': -fee
+            }
+            for name, value in values.items():
+                getattr(self, name)[row] = value
+            self.symbol_id[row] = sid
+            self.sign[row] = 1 if signal.direction == "LONG" else -1
+            self.stage[row] = 0
+            self.leverage[row] = leverage
+            self.open[row] = True
+            self.keys[row] = signal.timestamp
+            if np.isnan(self.last[sid]):
+                self.last[sid] = price
+            self.realized_total -= fee
+            self.fees_total += fee
+            self._log_trades(now, np.array([row]), 'open', np.array([price]), np.array([qty]), np.array([-fee]))
+            return True
+        except Exception as e:
+            logger.error(f"[{signal.symbol}] Error opening paper position: {str(e)}")
+            return False
+
+    def _set_prices(self, prices: dict, highs: dict = None, lows: dict = None):
+        known = [s for s in prices if s in self.symbol_ids]
+        if not known:
+            return
+        ids = np.array([self.symbol_ids[s] for s in known])
+        self.last[ids] = [prices[s] for s in known]
+        self.high[ids] = [highs[s] for s in known] if highs else self.last[ids]
+        self.low[ids] = [lows[s] for s in known] if lows else self.last[ids]
+
+    def _close(self, rows: np.ndarray, qty: np.ndarray, price: np.ndarray, event: str, now: float):
+        notional = price * qty
+        fee = notional * FEE_PCT / 100
+        pnl = self.sign[rows] * (price - self.entry[rows]) * qty - fee
+        self.realized[rows] += pnl
+        self.qty[rows] -= qty
+        self.open[rows] = self.qty[rows] > self.initial_qty[rows] * 1e-9
+        self.realized_total += float(pnl.sum())
+        self.fees_total += float(fee.sum())
+        self._log_trades(now, rows, event, price, qty, pnl)
+
+    def update(self, prices: dict, highs: dict = None, lows: dict = None, now: float = None):
+        # One pass over every open position: stops first (the conservative order within a candle), then
+        # TP1 -> TP2 -> TP3, then expiry; prices/highs/lows map symbol -> price since the previous update
+        now = time.time() if now is None else now
+        try:
+            self._set_prices(prices, highs, lows)
+            rows = np.flatnonzero(self.open[:self.size])
+            if len(rows):
+                sid = self.symbol_id[rows]
+                sign = self.sign[rows]
+                high, low = self.high[sid], self.low[sid]
+                priced = ~np.isnan(high)
+                favorable = np.where(sign > 0, high, low)
+                adverse = np.where(sign > 0, low, high)
+
+                stop = self.sl[rows]
+                stopped = priced & (sign * (adverse - stop) <= 0)
+                if stopped.any():
+                    hit = rows[stopped]
+                    # Stop-market exit, paying the slippage estimated from the book at entry
+                    price = stop[stopped] * (1 - sign[stopped] * self.stop_slippage[hit] / 100)
+                    self._close(hit, self.qty[hit].copy(), price, 'sl', now)
+
+                for stage, (target, fraction) in enumerate(zip(('tp1', 'tp2', 'tp3'), TP_FRACTIONS)):
+                    level = getattr(self, target)[rows]
+                    reached = priced & ~stopped & (self.stage[rows] == stage) & (sign * (favorable - level) >= 0)
+                    if not reached.any():
+                        continue
+                    hit = rows[reached]
+                    # Limit orders at the target; the last target closes whatever is left
+                    qty = self.qty[hit].copy() if stage == 2 else np.minimum(self.initial_qty[hit] * fraction, self.qty[hit])
+                    self._close(hit, qty, level[reached], target, now)
+                    self.stage[hit] = stage + 1
+                    if stage == 0:
+                        # Stop to break-even once TP1 is taken
+                        self.sl[hit] = self.entry[hit]
+
+                expired = self.open[rows] & (now - self.opened_at[rows] >= MAX_HOLD_SECONDS) & priced
+                if expired.any():
+                    hit = rows[expired]
+                    price = self.last[self.symbol_id[hit]] * (1 - self.sign[hit] * self.stop_slippage[hit] / 100)
+                    self._close(hit, self.qty[hit].copy(), price, 'expired', now)
+                self.unrealized_total = float(self._unrealized(rows[self.open[rows]]).sum())
+            # The extremes are used once; until a symbol's next update only its last price counts
+            self.high[:] = self.last
+            self.low[:] = self.last
+            if now - self.last_equity_at >= EQUITY_INTERVAL:
+                self._record_equity(now)
+            if len(self.trade_rows) >= FLUSH_EVENTS or self.equity_rows:
+                self.flush()
+        except Exception as e:
+            logger.error(f"Error marking paper positions: {str(e)}")
+
+    def _log_trades(self, now: float, rows: np.ndarray, event: str, price, qty, pnl):
+        # Buffered as column arrays; the frame is built once per flush
+        count = len(rows)
+        self.trade_rows.append({
+            'time': np.full(count, now),
+            'symbol': np.array([self.symbols[i] for i in self.symbol_id[rows]], dtype=object),
+            'signal_time': np.array([self.keys[i] for i in rows], dtype=object),
+            'direction': np.where(self.sign[rows] > 0, 'LONG', 'SHORT'),
+            'leverage': self.leverage[rows],
+            'event': np.full(count, event),
+            'price': np.asarray(price, dtype=np.float64),
+            'qty': np.asarray(qty, dtype=np.float64),
+            'pnl': np.asarray(pnl, dtype=np.float64),
+            'position_pnl': self.realized[rows].copy()
+        })
+
+    def _record_equity(self, now: float):
+        rows = np.flatnonzero(self.open[:self.size])
+        unrealized = float(self._unrealized(rows).sum())
+        self.equity_rows.append({
+            'time': pd.to_datetime(now, unit='s'),
+            'equity': self.starting_equity + self.realized_total + unrealized,
+            'realized': self.realized_total,
+            'unrealized': unrealized,
+            'fees': self.fees_total,
+            'open_positions': len(rows),
+            'margin_used': float(self.margin[rows].sum())
+        })
+        self.last_equity_at = now
+
+    def flush(self):
+        # Appends buffered trades and equity points to their CSVs
+        trades = None
+        if self.trade_rows:
+            trades = pd.DataFrame({name: np.concatenate([chunk[name] for chunk in self.trade_rows]) for name in self.trade_rows[0]})
+            trades['time'] = pd.to_datetime(trades['time'], unit='s')
+        equity = pd.DataFrame(self.equity_rows) if self.equity_rows else None
+        for path, frame in ((self.trades_path, trades), (self.equity_path, equity)):
+            if frame is None:
+                continue
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                frame.to_csv(path, mode='a', index=False, header=not os.path.exists(path))
+            except Exception as e:
+                logger.error(f"Error writing {path}: {str(e)}")
+        self.trade_rows, self.equity_rows = [], []
+
+class PaperTrader:
+    # Live side: opens positions for sent signals and marks them on ticker streams of the open symbols,
+    # one per venue so each position is marked on the venue its signal's candles came from
+    def __init__(self):
+        self.book = PaperBook()
+        self.streams = StreamClients()
+        self.tasks = []
+
+    def open_signal(self, signal: Signal):
+        # Filled against the candidate's streamed book when there is one
+        self.book.open_position(signal, order_books.books.get(signal.symbol))
+
+    async def _stream(self, venue: str):
+        exchange = self.streams.get(venue)
+        adapter = get_adapter(venue)
+        while True:
+            # Venue tickers are keyed by the venue's market symbol; the book by the scanner symbol
+            symbols = {adapter.market_symbol(s): s for s in self.book.open_symbols() if venue_for(s) == venue}
+            if not symbols:
+                # The default venue's stream keeps the equity curve going while nothing is open
+                if venue == DEFAULT_VENUE and not self.book.open_symbols():
+                    self.book.update({})
+                await asyncio.sleep(5)
+                continue
+            try:
+                tickers = await exchange.watch_tickers(list(symbols))
+                self.book.update({symbols[s]: t['last'] for s, t in tickers.items() if s in symbols and t.get('last')})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming {venue} paper trading prices: {str(e)}")
+                await asyncio.sleep(5)
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._stream(venue)) for venue in dict.fromkeys([DEFAULT_VENUE, *SCAN_VENUES])]
+            logger.info(f"Paper trading started with {self.book.starting_equity:,.2f} USDT")
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.book.flush()
+        await self.streams.close()
+
+paper_trader = PaperTrader()
+
+def replay(signals: list, candles: dict, book: PaperBook = None) -> PaperBook:
+    # Offline run of the same book: candles maps symbol -> frame with timestamp/high/low/close
+    # Each candle time is one update; a signal opens before the first candle starting at or after it
+    book = book or PaperBook(REPLAY_TRADES_LOG, REPLAY_EQUITY_LOG)
+    frames = [df.assign(symbol=symbol)[['timestamp', 'symbol', 'high', 'low', 'close']]
+              for symbol, df in candles.items() if df is not None and len(df)]
+    if not frames:
+        return book
+    bars = pd.concat(frames, ignore_index=True).sort_values('timestamp')
+    pending = sorted(signals, key=lambda s: s.timestamp)
+    opened = 0
+    now = None
+    for timestamp, group in bars.groupby('timestamp', sort=True):
+        now = timestamp.timestamp()
+        while opened < len(pending) and pd.Timestamp(pending[opened].timestamp) <= timestamp:
+            book.open_position(pending[opened], None, now)
+            opened += 1
+        symbols = group['symbol'].tolist()
+        book.update(
+            dict(zip(symbols, group['close'])), dict(zip(symbols, group['high'])), dict(zip(symbols, group['low'])), now
+        )
+    # Closing point of the curve at the last candle
+    if now != book.last_equity_at:
+        book._record_equity(now)
+    book.flush()
+    return book
+
+async def load_replay_candles(symbol: str, since: pd.Timestamp, timeframe: str = REPLAY_TIMEFRAME) -> pd.DataFrame:
+    # Candles from `since` to now, in REPLAY_BATCH pages from the symbol's venue
+    adapter = get_adapter(venue_for(symbol))
+    since_ms = int(since.timestamp() * 1000)
+    rows = []
+    try:
+        while True:
+            batch = await adapter.call('fetch_ohlcv', adapter.market_symbol(symbol), timeframe, since=since_ms, limit=REPLAY_BATCH)
+            rows.extend(batch)
+            if len(batch) < REPLAY_BATCH:
+                break
+            since_ms = batch[-1][0] + 1
+    except Exception as e:
+        logger.error(f"[{symbol}] Error loading replay candles: {str(e)}")
+    df = pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
+
+async def replay_signal_log(start=None, end=None, log_path: str = SIGNALS_LOG) -> PaperBook:
+    # Paper-trades every logged signal in [start, end) over the candles that followed it
+    try:
+        log = read_signal_log(log_path)
+        if log.empty:
+            logger.warning("Paper replay: signal log is empty")
+            return None
+        times = pd.to_datetime(log['timestamp'], errors='coerce')
+        keep = times.notna()
+        if start is not None:
+            keep &= times >= pd.Timestamp(start)
+        if end is not None:
+            keep &= times < pd.Timestamp(end)
+        log, times = log[keep], times[keep]
+        signals = [Signal.from_row(row) for row in log.to_dict('records')]
+        if not signals:
+            logger.warning("Paper replay: no signals in range")
+            return None
+        first = times.groupby(log['symbol']).min()
+        candles = {}
+        for symbol, since in first.items():
+            candles[symbol] = await load_replay_candles(symbol, since.floor(REPLAY_TIMEFRAME))
+        for path in (REPLAY_TRADES_LOG, REPLAY_EQUITY_LOG):
+            if os.path.exists(path):
+                os.remove(path)
+        book = replay(signals, candles)
+        logger.info(
+            f"Paper replay of {len(signals)} signals: equity {book.equity():,.2f} USDT "
+            f"(realized {book.realized_total:,.2f}, fees {book.fees_total:,.2f}), trades in {REPLAY_TRADES_LOG}"
+        )
+        return book
+    except Exception as e:
+        logger.error(f"Error replaying signal log: {str(e)}")
+        return None
+
+if __name__ == "__main__":
+    import sys
+    from data.exchanges import close_adapters
+
+    async def main():
+        await replay_signal_log(*sys.argv[1:3])
+        await close_adapters()
+
+    asyncio.run(main())
@@ -0,0 +1,330 @@
+# Staged scan pipeline: universe -> fetch -> indicators -> prediction -> validation -> dispatch -> tracking
+# Every stage runs as its own worker tasks joined by bounded queues; a full queue makes the stage before it
+# wait, so backpressure is explicit and a cycle takes as long as its slowest stage, not the sum of all of them
+import asyncio
+import numpy as np
+from core.indicators import calculate_indicators
+from core.multi_timeframe import check_multi_timeframe_agreement
+from core.prefilter import run_stage_one
+from core.correlation import correlation_matrix, select_representatives
+from core.regime import regimes, regime_timeframes
+from data.collector import fetch_multi_timeframe
+from data.exchanges import symbol_venues
+from data.cooldown_store import cooldowns
+from data.derivatives import derivatives, adjust_leverage
+from data.orderbook import order_books
+from data.trade_flow import trade_flow, attach_trade_flow
+from data.tracker import track_trade
+from core.paper_trading import paper_trader, PAPER_TRADING
+from model.predictor import SignalPredictor
+from model.rules import Condition, conditions_from_names
+from model.signal import Signal, STATUS_PENDING
+from telebot.sender import send_signal
+from api.broadcaster import broadcaster, EVENT_SIGNAL
+from telebot.command_cache import command_cache
+from utils.logger import logger, log_signal_to_csv
+from utils.rate_limiter import TokenBucket
+
+SIGNAL_TIMEFRAME = '15m'
+MIN_VOLUME = 500_000
+MIN_CONFIDENCE = 70.0
+MIN_CANDLES = 30
+COOLDOWN = 4 * 3600
+MAX_SIGNALS_PER_MINUTE = 10
+QUEUE_SIZE = 20  # items waiting between two stages
+# Workers per stage: fetching waits on the network, the other stages mostly on the CPU
+FETCH_WORKERS = 10
+INDICATOR_WORKERS = 2
+PREDICTION_WORKERS = 4
+VALIDATION_WORKERS = 2
+DISPATCH_BATCH = 5  # signals de-duplicated against each other at once
+MAX_TRACKED = 50  # signals tracked at the same time; tracking lasts hours and never holds up dispatch
+
+# Checked before a signal is sent so bursts never exceed the per-minute budget
+signal_limiter = TokenBucket(MAX_SIGNALS_PER_MINUTE / 60, MAX_SIGNALS_PER_MINUTE)
+
+def determine_leverage(conditions):
+    # conditions is the signal's Condition bitset; name lists from older logs are converted
+    if not isinstance(conditions, (int, np.integer)):
+        conditions = conditions_from_names(conditions)
+    score = 0
+    if conditions & (Condition.BULLISH_MACD | Condition.BEARISH_MACD):
+        score += 2
+    if conditions & Condition.STRONG_TREND:
+        score += 2
+    return 40 if score >= 5 else 30 if score >= 3 else 20 if score >= 1 else 10
+
+def without_cooldown(signals: list) -> list:
+    # Drops signals whose (symbol, direction, timeframe) is in cooldown, with one lookup for the batch
+    active = cooldowns.active((s.symbol, s.direction, s.timeframe) for s in signals)
+    for s in signals:
+        if (s.symbol, s.direction, s.timeframe) in active:
+            logger.info(f"[{s.symbol}] {s.direction} {s.timeframe} in cooldown")
+    return [s for s in signals if (s.symbol, s.direction, s.timeframe) not in active]
+
+async def dispatch_signal(signal: Signal) -> bool:
+    # Claim the signal's cooldown, then log, cache and send it
+    symbol = signal.symbol
+    key = (symbol, signal.direction, signal.timeframe)
+    claimed = False
+    try:
+        liquid, reason = await order_books.check_liquidity(signal)
+        if not liquid:
+            logger.info(f"[{symbol}] Rejected by liquidity gate: {reason}")
+            return False
+        # The claim is atomic across processes and restarts, so the same setup is never sent twice
+        if not cooldowns.claim(*key, ttl=COOLDOWN):
+            logger.info(f"[{symbol}] In cooldown, not sending")
+            return False
+        claimed = True
+        if not signal_limiter.try_acquire():
+            logger.info(f"[{symbol}] Max signals limit reached for this minute")
+            cooldowns.release(*key)
+            return False
+        log_signal_to_csv(signal)
+        command_cache.on_signal(signal)
+        await send_signal(signal)
+        broadcaster.publish_signal(EVENT_SIGNAL, signal)
+        return True
+    except Exception as e:
+        logger.error(f"[{symbol}] Error dispatching signal: {str(e)}")
+        if claimed:
+            cooldowns.release(*key)
+        return False
+
+class ScanPipeline:
+    def __init__(self):
+        self.predictor = SignalPredictor()
+        self.track_queue = None
+        self.track_slots = None
+        self.tracker = None
+        self.tracking = set()
+        # Per-cycle state, set by run_cycle
+        self.market = None
+        self.volumes = {}
+        self.sending = True
+        self.sent = []
+        self.collected = []
+
+    async def _stage(self, name: str, handler, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        # Generic stage worker: handler returns the item for the next stage, or None to drop it
+        while True:
+            item = await inbox.get()
+            symbol = item['symbol']
+            try:
+                item = await handler(item)
+                if item is not None:
+                    await outbox.put(item)
+            except Exception as e:
+                logger.error(f"[{symbol}] Error in {name} stage: {str(e)}")
+            finally:
+                inbox.task_done()
+
+    async def _universe(self, universe: list, outbox: asyncio.Queue):
+        # Stage 1 screens the whole universe at once; its survivors enter the queue as fast as fetching keeps up
+        # Trade flow is streamed for the most liquid part of the universe
+        trade_flow.watch(sorted(universe, key=lambda s: self.volumes.get(s, 0), reverse=True))
+        candidates, base_frames, snapshots = await run_stage_one(universe)
+        # Depth streams only for the symbols that go on to full analysis
+        order_books.watch(candidates)
+        if not snapshots.empty:
+            correlation_matrix.update(snapshots['closed_time'].max(), snapshots['symbol'], snapshots['closed_close'])
+        # Funding and open interest for the whole universe, refreshed at most every POLL_INTERVAL
+        await derivatives.refresh(universe)
+        for symbol in candidates:
+            volume = self.volumes.get(symbol, 0)
+            if volume < MIN_VOLUME:
+                logger.info(f"[{symbol}] Low volume: ${volume:,.2f}")
+                continue
+            await outbox.put({'symbol': symbol, 'base_frame': base_frames.get(symbol), 'volume': volume})
+        return None if snapshots.empty else snapshots[['closed_time', 'symbol', 'closed_close']]
+
+    async def _fetch(self, item: dict) -> dict:
+        # Only the timeframes that suit the symbol's regime are loaded and checked for agreement
+        symbol = item['symbol']
+        item['regime'] = regimes.get(symbol)
+        timeframes = list(regime_timeframes(item['regime']))
+        # The stage-1 screen already refreshed the base candles this cycle
+        frames = await fetch_multi_timeframe(symbol, timeframes, limit=50, refresh=item['base_frame'] is None)
+        for tf in timeframes:
+            if frames[tf] is None or len(frames[tf]) < MIN_CANDLES:
+                logger.warning(f"[{symbol}] Insufficient data for {tf}")
+                return None
+        item['frames'] = frames
+        return item
+
+    def _compute_indicators(self, item: dict) -> dict:
+        frames = item['frames']
+        for tf in frames:
+            if tf == SIGNAL_TIMEFRAME and item['base_frame'] is not None:
+                frames[tf] = item['base_frame']
+            else:
+                frames[tf] = calculate_indicators(frames[tf])
+        return item
+
+    async def _indicators(self, item: dict) -> dict:
+        # In a thread so fetch workers keep the event loop while indicators are computed
+        # Trade flow is attached back on the loop, where its streams are updated
+        item = await asyncio.to_thread(self._compute_indicators, item)
+        frames = item['frames']
+        frames[SIGNAL_TIMEFRAME] = attach_trade_flow(frames[SIGNAL_TIMEFRAME], item['symbol'])
+        return item
+
+    async def _predict(self, item: dict) -> dict:
+        symbol = item['symbol']
+        liquidity = await order_books.get_metrics(symbol)
+        signal = await self.predictor.predict_signal(
+            symbol, item['frames'][SIGNAL_TIMEFRAME], SIGNAL_TIMEFRAME,
+            market=self.market, liquidity=liquidity, regime=item['regime']
+        )
+        if not signal or signal.confidence < MIN_CONFIDENCE:
+            logger.info(f"[{symbol}] No signal or low confidence")
+            return None
+        item['signal'] = signal
+        return item
+
+    async def _validate(self, item: dict) -> dict:
+        symbol, signal = item['symbol'], item['signal']
+        if signal.tp1 == signal.tp2 == signal.tp3 == signal.entry:
+            logger.info(f"[{symbol}] Identical TP/entry values")
+            return None
+        # Reuses the frames and indicators loaded above instead of refetching
+        agreement = check_multi_timeframe_agreement(symbol, signal.direction, item['frames'])
+        if not agreement['agree']:
+            logger.info(f"[{symbol}] No multi-timeframe agreement ({agreement['score']:.2f})")
+            return None
+        signal.mtf_score = agreement['score']
+        signal.quote_volume_24h = item['volume']
+        signal.leverage = adjust_leverage(determine_leverage(signal.condition_flags), signal.direction, derivatives.get(symbol))
+        signal.status = STATUS_PENDING
+        logger.info(f"[{symbol}] Signal generated: {signal.direction}, Confidence: {signal.confidence:.2f}%")
+        return {'symbol': symbol, 'signal': signal}
+
+    async def _dispatch_stage(self, inbox: asyncio.Queue):
+        # Takes whatever has arrived (up to DISPATCH_BATCH) so correlated signals are de-duplicated together
+        while True:
+            batch = [await inbox.get()]
+            while len(batch) < DISPATCH_BATCH and not inbox.empty():
+                batch.append(inbox.get_nowait())
+            try:
+                signals = [item['signal'] for item in batch]
+                if self.sending:
+                    await self.dispatch(signals, self.sent)
+                else:
+                    await self._collect(signals)
+            except Exception as e:
+                logger.error(f"Error in dispatch stage: {str(e)}")
+            finally:
+                for _ in batch:
+                    inbox.task_done()
+
+    async def _collect(self, signals: list):
+        # Shard workers hand their signals to the coordinator instead of sending them
+        # The order books live in this process, so the liquidity gate runs before a signal leaves it
+        for signal in signals:
+            liquid, reason = await order_books.check_liquidity(signal)
+            if not liquid:
+                logger.info(f"[{signal.symbol}] Rejected by liquidity gate: {reason}")
+                continue
+            self.collected.append(signal)
+
+    async def dispatch(self, signals: list, sent: list) -> int:
+        # Cooldown filter, correlation de-duplication and sending; every sent signal is handed to tracking
+        # sent holds the signals already sent this cycle, which new ones are de-duplicated against
+        signals = without_cooldown(signals)
+        if not signals:
+            return 0
+        # Only the strongest signal of each group of correlated symbols goes out
+        selected = select_representatives(signals, correlation_matrix, sent)
+        count = 0
+        for signal in selected:
+            if await dispatch_signal(signal):
+                sent.append(signal)
+                self.track(signal)
+                if PAPER_TRADING:
+                    paper_trader.open_signal(signal)
+                count += 1
+        logger.info(f"Dispatched {len(signals)} signals, sent {count}")
+        return count
+
+    def track(self, signal: Signal):
+        # Never waits: when MAX_TRACKED signals are tracked and the queue is full, the signal goes untracked
+        self._start_tracker()
+        try:
+            self.track_queue.put_nowait(signal)
+        except asyncio.QueueFull:
+            logger.warning(f"[{signal.symbol}] Tracking queue full, signal not tracked")
+
+    def _start_tracker(self):
+        if self.tracker is None or self.tracker.done():
+            self.track_queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+            self.track_slots = asyncio.Semaphore(MAX_TRACKED)
+            self.tracker = asyncio.create_task(self._track_stage())
+
+    async def _track_stage(self):
+        # Long-lived across cycles: each signal is tracked in its own task, at most MAX_TRACKED at once
+        while True:
+            signal = await self.track_queue.get()
+            await self.track_slots.acquire()
+            task = asyncio.create_task(self._track(signal))
+            self.tracking.add(task)
+            task.add_done_callback(self.tracking.discard)
+            self.track_queue.task_done()
+
+    async def _track(self, signal: Signal):
+        try:
+            await track_trade(signal.symbol, signal)
+        finally:
+            self.track_slots.release()
+
+    async def wait_tracked(self):
+        # For one-shot runs: wait until every sent signal has been resolved or timed out
+        if self.track_queue is not None:
+            await self.track_queue.join()
+        if self.tracking:
+            await asyncio.gather(*self.tracking, return_exceptions=True)
+
+    async def run_cycle(self, universe: list, market, volumes: dict, send: bool = True) -> tuple:
+        # One scan of the universe through every stage; volumes maps symbol -> 24h quote volume
+        # With send=False signals are collected and returned instead of dispatched (shard workers)
+        # Returns the signals sent or collected and the stage-1 closed-candle closes
+        self.market, self.volumes, self.sending = market, volumes, send
+        self.sent, self.collected = [], []
+        fetch_queue, indicator_queue, predict_queue, validate_queue, dispatch_queue = (
+            asyncio.Queue(maxsize=QUEUE_SIZE) for _ in range(5)
+        )
+        stages = [
+            (fetch_queue, [self._stage('fetch', self._fetch, fetch_queue, indicator_queue) for _ in range(FETCH_WORKERS)]),
+            (indicator_queue, [self._stage('indicators', self._indicators, indicator_queue, predict_queue) for _ in range(INDICATOR_WORKERS)]),
+            (predict_queue, [self._stage('prediction', self._predict, predict_queue, validate_queue) for _ in range(PREDICTION_WORKERS)]),
+            (validate_queue, [self._stage('validation', self._validate, validate_queue, dispatch_queue) for _ in range(VALIDATION_WORKERS)]),
+            (dispatch_queue, [self._dispatch_stage(dispatch_queue)])
+        ]
+        stages = [(queue, [asyncio.create_task(worker) for worker in workers]) for queue, workers in stages]
+        try:
+            closes = await self._universe(universe, fetch_queue)
+            # Each queue drains only after everything upstream has been handed on, so joining in order ends the cycle
+            for queue, workers in stages:
+                await queue.join()
+                for worker in workers:
+                    worker.cancel()
+        finally:
+            for _, workers in stages:
+                for worker in workers:
+                    worker.cancel()
+        results = self.sent if send else self.collected
+        logger.info(f"Scan pipeline: {len(results)} signals {'sent' if send else 'collected'}")
+        return list(results), closes
+
+pipeline = ScanPipeline()
+
+# 24h quote volumes of a shard worker's symbols, as sent by the coordinator
+shard_volumes = {}
+
+async def scan_shard(symbols, market, assignments):
+    # The pipeline over one worker's shard (core.sharding); signals are returned to the coordinator, not sent
+    # assignments carries the coordinator's (venue, 24h quote volume) per symbol
+    for symbol, assignment in assignments.items():
+        if assignment:
+            symbol_venues[symbol], shard_volumes[symbol] = assignment
+    return await pipeline.run_cycle(symbols, market, shard_volumes, send=False)
@@ -0,0 +1,100 @@
+# Stage-1 candidate screen over the latest 15m indicator snapshot of every symbol
+# Mirrors the predictor's cheap early rejections so only symbols that can still produce a signal
+# go on to the full multi-timeframe analysis
+import asyncio
+import numpy as np
+import pandas as pd
+from data.collector import fetch_multi_timeframe
+from core.indicators import calculate_indicators
+from model.rules import DEFAULT_RULES
+from core.regime import regimes
+from utils.logger import logger
+
+STAGE1_TIMEFRAME = "15m"
+STAGE1_CONCURRENCY = 10
+# Same thresholds as the predictor's rule set
+_THRESHOLDS = DEFAULT_RULES['thresholds']
+ADX_MIN = _THRESHOLDS['adx_min']
+NEUTRAL_RSI = (_THRESHOLDS['rsi_neutral_low'], _THRESHOLDS['rsi_neutral_high'])
+NEUTRAL_ADX = _THRESHOLDS['neutral_adx']
+RSI_OVERSOLD = _THRESHOLDS['rsi_oversold']
+RSI_OVERBOUGHT = _THRESHOLDS['rsi_overbought']
+VOLUME_SPIKE = 1.5
+
+def build_snapshot(symbol: str, df: pd.DataFrame) -> dict:
+    # Latest indicator values of one symbol as a flat row
+    latest = df.iloc[-1]
+    prev = df.iloc[-2] if len(df) > 1 else latest
+    return {
+        'symbol': symbol,
+        # Last closed candle, used for the once-per-candle correlation update
+        'closed_time': prev['timestamp'],
+        'closed_close': float(prev['close']),
+        'close': float(latest['close']),
+        'rsi': float(latest['rsi']),
+        'adx': float(latest['adx']),
+        'macd_diff': float(latest['macd'] - latest['macd_signal']),
+        'prev_macd_diff': float(prev['macd'] - prev['macd_signal']),
+        'volume': float(latest['volume']),
+        'volume_sma_20': float(latest['volume_sma_20']),
+        # The predictor treats a missing ma50 as 0 and skips MA200 rules when ma200 is missing
+        'ma50': float(latest.get('ma50', 0)),
+        'ma200': float(latest.get('ma200', np.nan))
+    }
+
+def screen_candidates(snapshots: pd.DataFrame, max_candidates: int = None) -> list:
+    # Vectorised over the whole universe; returns surviving symbols, strongest setups first
+    if snapshots.empty:
+        return []
+    rsi = snapshots['rsi'].to_numpy()
+    adx = snapshots['adx'].to_numpy()
+    close = snapshots['close'].to_numpy()
+    macd_diff = snapshots['macd_diff'].to_numpy()
+    ma200 = snapshots['ma200'].to_numpy()
+
+    neutral = (rsi >= NEUTRAL_RSI[0]) & (rsi <= NEUTRAL_RSI[1])
+    neutral_ok = ~neutral | (adx > NEUTRAL_ADX) | (close > snapshots['ma50'].to_numpy())
+    # LONG needs a bullish MACD and price not below MA200, SHORT the mirror image
+    with np.errstate(invalid='ignore'):
+        long_possible = (macd_diff > 0) & ~(close < ma200)
+        short_possible = (macd_diff < 0) & ~(close > ma200)
+    passed = (adx > ADX_MIN) & neutral_ok & (long_possible | short_possible)
+
+    # Rank survivors by cheap setup quality: fresh MACD cross, volume spike, RSI at an extreme
+    macd_cross = np.sign(macd_diff) != np.sign(snapshots['prev_macd_diff'].to_numpy())
+    volume_spike = snapshots['volume'].to_numpy() > VOLUME_SPIKE * snapshots['volume_sma_20'].to_numpy()
+    rsi_extreme = (rsi < RSI_OVERSOLD) | (rsi > RSI_OVERBOUGHT)
+    score = 2 * macd_cross + volume_spike + rsi_extreme
+
+    order = np.argsort(-score[passed], kind='stable')
+    survivors = snapshots['symbol'].to_numpy()[passed][order].tolist()
+    if max_candidates is not None:
+        survivors = survivors[:max_candidates]
+    logger.info(f"Stage-1 screen: {len(survivors)}/{len(snapshots)} symbols passed")
+    return survivors
+
+async def run_stage_one(symbols: list, max_candidates: int = None):
+    # Fetch and index the base timeframe for the universe, then screen it in one vectorised pass
+    # Returns the surviving symbols, their indicator frames so stage 2 does not redo the work,
+    # and the snapshot table of the whole universe
+    semaphore = asyncio.Semaphore(STAGE1_CONCURRENCY)
+
+    async def load(symbol):
+        async with semaphore:
+            frames = await fetch_multi_timeframe(symbol, (STAGE1_TIMEFRAME,), limit=50)
+        df = frames.get(STAGE1_TIMEFRAME)
+        return calculate_indicators(df) if df is not None else None
+
+    results = await asyncio.gather(*(load(s) for s in symbols), return_exceptions=True)
+    frames = {}
+    snapshots = []
+    for symbol, df in zip(symbols, results):
+        if df is None or isinstance(df, Exception) or len(df) < 2:
+            continue
+        frames[symbol] = df
+        snapshots.append(build_snapshot(symbol, df))
+        # Every screened symbol's regime advances with its new closed candles
+        regimes.update(symbol, df)
+    snapshots = pd.DataFrame(snapshots)
+    survivors = screen_candidates(snapshots, max_candidates)
+    return survivors, {s: frames[s] for s in survivors}, snapshots
@@ -0,0 +1,121 @@
+# Per-symbol volatility regime (trending / ranging / high_vol), updated once per closed candle
+# Realised volatility is an EWMA of log returns and the ATR percentile comes from a sorted window kept with
+# bisect, so each new candle costs O(log n) instead of recomputing over the history
+from bisect import bisect_left, insort
+from collections import deque
+import cachetools
+import numpy as np
+from utils.logger import logger
+
+REGIME_TIMEFRAME = "15m"
+CANDLES_PER_DAY = 96  # 15m candles
+VOL_SPAN = CANDLES_PER_DAY  # EWMA span of the squared log returns
+ATR_WINDOW = 7 * CANDLES_PER_DAY  # candles the ATR percentile is ranked against
+MIN_CANDLES = 20  # closed candles seen before a regime is assigned
+HIGH_VOL_PERCENTILE = 80
+HIGH_VOL_DAILY_PCT = 6.0  # daily realised volatility in %
+TRENDING_ADX = 25
+
+TRENDING = 'trending'
+RANGING = 'ranging'
+HIGH_VOL = 'high_vol'
+ALL_TIMEFRAMES = ('15m', '1h', '4h', '1d')
+# Timeframes worth evaluating per regime; the 15m signal timeframe is always included
+REGIME_TIMEFRAMES = {
+    TRENDING: ALL_TIMEFRAMES,
+    RANGING: ('15m', '1h'),
+    HIGH_VOL: ('15m', '1h', '4h')
+}
+# Overrides of model.rules DEFAULT_RULES['targets'] per regime: trends run further, ranges revert early,
+# high volatility needs a wider stop
+REGIME_TARGETS = {
+    TRENDING: {'tp1_atr': 0.75, 'tp2_atr': 1.5, 'tp3_atr': 3.0, 'sl_atr': 1.0},
+    RANGING: {'tp2_pct': 0.01, 'tp2_atr': 0.8, 'tp3_pct': 0.02, 'tp3_atr': 1.2, 'sl_atr': 0.6},
+    HIGH_VOL: {'tp1_atr': 0.6, 'tp2_atr': 1.2, 'tp3_atr': 2.5, 'sl_pct': 0.012, 'sl_atr': 1.2}
+}
+
+def regime_timeframes(regime: str, default=ALL_TIMEFRAMES) -> tuple:
+    return REGIME_TIMEFRAMES.get(regime, default)
+
+def regime_targets(regime: str, base: dict) -> dict:
+    # Base targets with the regime's overrides; unknown regimes keep the base
+    return {**base, **REGIME_TARGETS.get(regime, {})}
+
+class RegimeState:
+    def __init__(self):
+        self.last_time = -1
+        self.last_close = None
+        self.variance = 0.0
+        self.returns = 0
+        self.atr_window = deque()
+        self.atr_sorted = []
+        self.atr_percentile = 0.0
+        self.adx = 0.0
+        self.regime = None
+
+    def _add_candle(self, close: float, atr: float, adx: float):
+        if self.last_close:
+            log_return = np.log(close / self.last_close)
+            alpha = 2 / (VOL_SPAN + 1)
+            self.variance = log_return ** 2 if not self.returns else (1 - alpha) * self.variance + alpha * log_return ** 2
+            self.returns += 1
+        self.last_close = close
+        # ATR relative to price so the ranking survives large price moves
+        atr_ratio = atr / close
+        if len(self.atr_window) == ATR_WINDOW:
+            oldest = self.atr_window.popleft()
+            del self.atr_sorted[bisect_left(self.atr_sorted, oldest)]
+        self.atr_window.append(atr_ratio)
+        insort(self.atr_sorted, atr_ratio)
+        self.atr_percentile = bisect_left(self.atr_sorted, atr_ratio) / len(self.atr_sorted) * 100
+        self.adx = adx
+
+    @property
+    def realized_vol(self) -> float:
+        # Daily realised volatility in %
+        return float(np.sqrt(self.variance * CANDLES_PER_DAY) * 100)
+
+    def update(self, timestamps, close, atr, adx) -> bool:
+        # Fold in the closed candles newer than the last one seen; True when anything changed
+        new = np.flatnonzero(timestamps > self.last_time)
+        for i in new:
+            if close[i] > 0:
+                self._add_candle(float(close[i]), float(atr[i]), float(adx[i]))
+        if not len(new):
+            return False
+        self.last_time = int(timestamps[new[-1]])
+        if len(self.atr_window) < MIN_CANDLES:
+            self.regime = None
+        elif self.atr_percentile >= HIGH_VOL_PERCENTILE or self.realized_vol >= HIGH_VOL_DAILY_PCT:
+            self.regime = HIGH_VOL
+        elif self.adx >= TRENDING_ADX:
+            self.regime = TRENDING
+        else:
+            self.regime = RANGING
+        return True
+
+class RegimeTracker:
+    def __init__(self, maxsize: int = 1000):
+        self.states = cachetools.LRUCache(maxsize=maxsize)
+
+    def update(self, symbol: str, df):
+        # df is the symbol's REGIME_TIMEFRAME indicator frame; its last, still forming candle is skipped
+        try:
+            if df is None or len(df) < 2:
+                return
+            closed = df.iloc[:-1]
+            state = self.states.get(symbol)
+            if state is None:
+                state = self.states[symbol] = RegimeState()
+            timestamps = closed['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+            if state.update(timestamps, closed['close'].to_numpy(), closed['atr'].to_numpy(), closed['adx'].to_numpy()):
+                logger.debug(f"[{symbol}] Regime {state.regime}: vol {state.realized_vol:.2f}%, ATR pct {state.atr_percentile:.0f}, ADX {state.adx:.1f}")
+        except Exception as e:
+            logger.error(f"[{symbol}] Error updating regime: {str(e)}")
+
+    def get(self, symbol: str) -> str:
+        # None until enough candles have been seen
+        state = self.states.get(symbol)
+        return state.regime if state else None
+
+regimes = RegimeTracker()
@@ -0,0 +1,154 @@
+# Sharded scanning: a coordinator splits the symbol universe over worker processes by consistent hashing
+# Workers run the scan pipeline on their shard and return signals over a multiprocessing queue; sending,
+# cooldowns and Telegram limits stay in the coordinator process, so a signal can only ever be sent once
+import asyncio
+import hashlib
+import multiprocessing
+import queue
+import time
+from bisect import bisect
+from utils.logger import logger
+
+RING_REPLICAS = 100  # virtual nodes per worker, evens out the shard sizes
+CYCLE_TIMEOUT = 600  # seconds the coordinator waits for all shards of a cycle
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+class HashRing:
+    def __init__(self, nodes=(), replicas: int = RING_REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            index = bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node: str):
+        keep = [i for i, owner in enumerate(self.owners) if owner != node]
+        self.points = [self.points[i] for i in keep]
+        self.owners = [self.owners[i] for i in keep]
+
+    def node_for(self, key: str) -> str:
+        # First virtual node clockwise from the key; adding or removing a node only moves its neighbours' keys
+        index = bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[index]
+
+    def split(self, keys) -> dict:
+        shards = {}
+        for key in keys:
+            shards.setdefault(self.node_for(key), []).append(key)
+        return shards
+
+def _worker_main(name: str, tasks, results):
+    # Process entry point; the scanner is imported here so only the worker loads its state
+    asyncio.run(_worker_loop(name, tasks, results))
+
+def _drain(tasks) -> list:
+    # Everything queued right now, without waiting
+    jobs = []
+    while True:
+        try:
+            jobs.append(tasks.get_nowait())
+        except queue.Empty:
+            return jobs
+
+async def _worker_loop(name: str, tasks, results):
+    # Only the scanner is imported, not main and its FastAPI app
+    from core.pipeline import scan_shard
+    from model.calibration import calibrator
+    logger.info(f"[{name}] Scanner worker started")
+    while True:
+        # A job left behind by a cycle that timed out is superseded by any newer one queued after it
+        jobs = [await asyncio.to_thread(tasks.get), *_drain(tasks)]
+        if None in jobs:
+            break
+        job = jobs[-1]
+        cycle, symbols, market, assignments, calibration = job
+        # Signals are resolved in the coordinator, so its calibration counts come with every job
+        calibrator.counts = calibration
+        calibrator.loaded = True
+        try:
+            signals, closes = await scan_shard(symbols, market, assignments)
+            results.put((name, cycle, signals, closes))
+        except Exception as e:
+            logger.error(f"[{name}] Error scanning shard: {str(e)}")
+            results.put((name, cycle, [], None))
+    logger.info(f"[{name}] Scanner worker stopped")
+
+class Coordinator:
+    def __init__(self, workers: int):
+        # spawn gives every worker a clean interpreter instead of a fork of the running event loop
+        self.context = multiprocessing.get_context('spawn')
+        self.names = [f"worker-{i}" for i in range(workers)]
+        self.ring = HashRing(self.names)
+        self.results = self.context.Queue()
+        # One task queue per worker, so each shard reaches the worker that owns it
+        self.tasks = {name: self.context.Queue() for name in self.names}
+        self.processes = {}
+        self.cycle = 0
+
+    def _spawn(self, name: str):
+        process = self.context.Process(target=_worker_main, args=(name, self.tasks[name], self.results), name=name, daemon=True)
+        process.start()
+        self.processes[name] = process
+
+    def start(self):
+        for name in self.names:
+            self._spawn(name)
+        logger.info(f"Started {len(self.names)} scanner workers")
+
+    def _check_workers(self):
+        # A worker that died is restarted under the same name and keeps its shard
+        for name, process in self.processes.items():
+            if not process.is_alive():
+                logger.warning(f"[{name}] Scanner worker exited ({process.exitcode}), restarting")
+                self._spawn(name)
+
+    async def scan(self, symbols: list, market, assignments: dict, calibration: dict, timeout: float = CYCLE_TIMEOUT) -> tuple:
+        # One scan cycle over all shards; returns the workers' signals and their closed-candle closes
+        # assignments maps each symbol to (venue, 24h quote volume) as resolved by the coordinator,
+        # calibration is the coordinator's calibrator.counts, kept current as its trackers resolve signals
+        self._check_workers()
+        self.cycle += 1
+        shards = self.ring.split(symbols)
+        for name, shard in shards.items():
+            # A worker still busy with a timed-out cycle gets only this cycle's job, not a backlog
+            _drain(self.tasks[name])
+            self.tasks[name].put((self.cycle, shard, market, {s: assignments.get(s) for s in shard}, calibration))
+        pending = set(shards)
+        signals, closes = [], []
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                name, cycle, shard_signals, shard_closes = await asyncio.to_thread(self.results.get, True, remaining)
+            except queue.Empty:
+                break
+            # Results of a cycle that already timed out are dropped
+            if cycle != self.cycle:
+                continue
+            pending.discard(name)
+            signals.extend(shard_signals)
+            if shard_closes is not None:
+                closes.append(shard_closes)
+        if pending:
+            logger.warning(f"Scan cycle {self.cycle}: no result from {', '.join(sorted(pending))}")
+        logger.info(f"Scan cycle {self.cycle}: {len(signals)} signals from {len(shards) - len(pending)}/{len(shards)} shards")
+        return signals, closes
+
+    def stop(self):
+        for name in self.names:
+            self.tasks[name].put(None)
+        for process in self.processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
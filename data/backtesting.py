@@ -1,10 +1,78 @@
 # Updated backtesting module to evaluate signals against market trend
+import numpy as np
 import pandas as pd
-import ccxt
+from numpy.lib.stride_tricks import sliding_window_view
 from model.predictor import SignalPredictor
+from model.rules import pattern_masks, target_levels
+from core.indicators import calculate_indicators
+from utils.support_resistance import support_resistance_series
 from data.collector import fetch_realtime_data
+from data.market_context import market_context
 from utils.logger import logger
 
+OUTCOME_HORIZON = 10  # candles a signal has to reach a target
+STATUSES = ("pending", "tp1_hit", "tp2_hit", "tp3_hit", "sl_hit")
+PENDING, TP1_HIT, TP2_HIT, TP3_HIT, SL_HIT = range(len(STATUSES))
+
+def prepare_history(df: pd.DataFrame, btc_trend: float = 0.0) -> dict:
+    # Everything that does not depend on rule parameters, computed once per symbol:
+    # indicators, per-row support/resistance as seen live, and candle patterns
+    df = calculate_indicators(df.copy())
+    support, resistance = support_resistance_series(df)
+    close = df['close'].to_numpy(dtype=np.float64)
+    return {
+        'df': df,
+        'context': {'support': support, 'resistance': resistance, 'btc_trend': btc_trend, 'patterns': pattern_masks(df)},
+        'close': close,
+        'high': df['high'].to_numpy(dtype=np.float64),
+        'low': df['low'].to_numpy(dtype=np.float64),
+        'atr': df['atr'].to_numpy(dtype=np.float64) if 'atr' in df.columns else np.maximum(0.1 * close, 0.02),
+        'ma200': df['ma200'].to_numpy(dtype=np.float64) if 'ma200' in df.columns else np.full(len(df), np.inf)
+    }
+
+def evaluate_outcomes(high, low, close, rows, sign, levels: dict, horizon: int = OUTCOME_HORIZON):
+    # Status and % return of every signal over the next `horizon` candles, all signals at once
+    # Levels resolve by first touch: SL wins when it is crossed on or before the candle of the first TP,
+    # a higher TP only counts when it is crossed before the SL; unresolved signals exit at the last close
+    n = len(close)
+    # Padding past the last candle can never reach a level
+    future_high = sliding_window_view(np.r_[high[1:], np.full(horizon + 1, -np.inf)], horizon)[:n][rows]
+    future_low = sliding_window_view(np.r_[low[1:], np.full(horizon + 1, np.inf)], horizon)[:n][rows]
+    entry = close[rows]
+    long = (sign > 0)[:, None]
+    first = {}
+    for name in ('tp1', 'tp2', 'tp3', 'sl'):
+        level = levels[name][:, None]
+        if name == 'sl':
+            crossed = np.where(long, future_low <= level, future_high >= level)
+        else:
+            crossed = np.where(long, future_high >= level, future_low <= level)
+        # Index of the first crossing candle, horizon when the level is never crossed
+        first[name] = np.where(crossed.any(axis=1), crossed.argmax(axis=1), horizon)
+
+    status = np.full(len(rows), PENDING, dtype=np.int8)
+    exit_price = close[np.minimum(rows + horizon, n - 1)]
+    stopped = (first['sl'] < horizon) & (first['sl'] <= first['tp1'])
+    status = np.where(stopped, SL_HIT, status)
+    exit_price = np.where(stopped, levels['sl'], exit_price)
+    # Assign in ascending order so the highest target reached before the SL wins
+    for name, code in (('tp1', TP1_HIT), ('tp2', TP2_HIT), ('tp3', TP3_HIT)):
+        reached = (first[name] < horizon) & (first[name] < first['sl'])
+        status = np.where(reached, code, status)
+        exit_price = np.where(reached, levels[name], exit_price)
+    pnl = sign * (exit_price - entry) / entry * 100
+    return status, pnl
+
+def simulate(history: dict, rules, start: int = 0, end: int = None, horizon: int = OUTCOME_HORIZON) -> dict:
+    # Evaluate a compiled rule set over a prepared history and resolve every signal it produces
+    result = rules.evaluate(history['df'], history['context'])
+    end = len(history['close']) - 1 if end is None else end
+    rows = np.flatnonzero(result.direction[start:end]) + start
+    sign = result.direction[rows].astype(np.float64)
+    levels = target_levels(sign, history['close'][rows], history['atr'][rows], rules.targets)
+    status, pnl = evaluate_outcomes(history['high'], history['low'], history['close'], rows, sign, levels, horizon)
+    return {'rows': rows, 'sign': sign, 'confidence': result.confidence[rows], 'status': status, 'pnl': pnl}
+
 async def backtest_signals(symbol: str, timeframe: str = "15m", limit: int = 1000):
     # Backtest signals to evaluate performance and trend bias
     # Added trend bias analysis to detect signals against market trend
@@ -16,70 +84,41 @@ async def backtest_signals(symbol: str, timeframe: str = "15m", limit: int = 100
             return None
 
         predictor = SignalPredictor()
-        signals = []
         results = {
             "tp1_hit": 0, "tp2_hit": 0, "tp3_hit": 0, "sl_hit": 0, "pending": 0,
             "total_signals": 0, "avg_confidence": 0, "against_trend": 0
         }
 
-        # Fetch BTC trend for market context
-        exchange = ccxt.binance({"enableRateLimit": True})
-        btc_ticker = await exchange.fetch_ticker('BTC/USDT')
-        btc_trend = btc_ticker.get('percentage', 0)
+        # Shared BTC market context instead of a separate ticker request
+        market = await market_context.get_snapshot()
+        btc_trend = market.btc_trend
         logger.info(f"[{symbol}] BTC trend for backtest: {btc_trend:.2f}%")
 
-        for i in range(len(df) - 50, len(df) - 1):
-            temp_df = df.iloc[:i+1]
-            signal = await predictor.predict_signal(symbol, temp_df, timeframe, btc_trend=btc_trend)
-            if signal:
-                signals.append(signal)
-                future_data = df.iloc[i+1:i+11]  # Next 10 candles
-                if future_data.empty:
-                    continue
-
-                # Check if signal is against market trend
-                is_against_trend = False
-                if signal['direction'] == "LONG" and signal['ma200_status'] == "bearish":
-                    is_against_trend = True
-                elif signal['direction'] == "SHORT" and signal['ma200_status'] == "bullish":
-                    is_against_trend = True
-                if is_against_trend:
-                    results['against_trend'] += 1
-
-                status = "pending"
-                if signal['direction'] == "LONG":
-                    future_highs = future_data['high']
-                    future_lows = future_data['low']
-                    if future_highs.max() >= signal['tp3']:
-                        status = "tp3_hit"
-                    elif future_highs.max() >= signal['tp2']:
-                        status = "tp2_hit"
-                    elif future_highs.max() >= signal['tp1']:
-                        status = "tp1_hit"
-                    elif future_lows.min() <= signal['sl']:
-                        status = "sl_hit"
-                else:  # SHORT
-                    future_highs = future_data['high']
-                    future_lows = future_data['low']
-                    if future_lows.min() <= signal['tp3']:
-                        status = "tp3_hit"
-                    elif future_lows.min() <= signal['tp2']:
-                        status = "tp2_hit"
-                    elif future_lows.min() <= signal['tp1']:
-                        status = "tp1_hit"
-                    elif future_highs.max() >= signal['sl']:
-                        status = "sl_hit"
+        # Indicators and rules are evaluated once over the whole history; each row only sees
+        # support/resistance from the candles before it, as it would have live
+        history = prepare_history(df, btc_trend)
+        start = max(len(df) - 50, predictor.min_data_points - 1)
+        outcome = simulate(history, predictor.rules, start=start)
 
-                results[status] += 1
-                results['total_signals'] += 1
+        # Check if signals are against market trend
+        close, ma200 = history['close'][outcome['rows']], history['ma200'][outcome['rows']]
+        bullish_ma200 = close > ma200
+        results['against_trend'] = int(np.sum((outcome['sign'] > 0) != bullish_ma200))
+        for code, status in enumerate(STATUSES):
+            results[status] = int(np.sum(outcome['status'] == code))
+        results['total_signals'] = len(outcome['rows'])
 
         if results['total_signals'] > 0:
-            results['avg_confidence'] = sum(s['confidence'] for s in signals) / len(signals)
+            results['avg_confidence'] = float(outcome['confidence'].mean())
+            results['expectancy'] = float(outcome['pnl'].mean())
             results['tp1_hit_rate'] = (results['tp1_hit'] + results['tp2_hit'] + results['tp3_hit']) / results['total_signals'] * 100
             results['tp2_hit_rate'] = (results['tp2_hit'] + results['tp3_hit']) / results['total_signals'] * 100
             results['tp3_hit_rate'] = results['tp3_hit'] / results['total_signals'] * 100
             results['sl_hit_rate'] = results['sl_hit'] / results['total_signals'] * 100
             results['against_trend_rate'] = results['against_trend'] / results['total_signals'] * 100
+        else:
+            logger.info(f"[{symbol}] Backtest produced no signals")
+            return results
 
         logger.info(
             f"[{symbol}] Backtest Results:\n"
@@ -89,6 +128,7 @@ async def backtest_signals(symbol: str, timeframe: str = "15m", limit: int = 100
             f"TP3 Hit Rate: {results['tp3_hit_rate']:.2f}%\n"
             f"SL Hit Rate: {results['sl_hit_rate']:.2f}%\n"
             f"Average Confidence: {results['avg_confidence']:.2f}%\n"
+            f"Expectancy: {results['expectancy']:.2f}% per signal\n"
             f"Against Trend Rate: {results['against_trend_rate']:.2f}%"
         )
         return results
@@ -1,58 +1,112 @@
 # Updated data/collector.py to add zero price/volume checks, increase candles to 50, and optimize caching
 import asyncio
-import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
 import pandas as pd
 from utils.logger import logger
 import cachetools
+from data.resampler import CandleResampler
+from data.exchanges import get_adapter, venue_for
 
-data_cache = cachetools.TTLCache(maxsize=100, ttl=300)  # 5-minute cache
+# Candles of every venue in one cache keyed by (venue, symbol, timeframe)
+data_cache = cachetools.TTLCache(maxsize=2000, ttl=300)  # 5-minute cache
+# Per-(venue, symbol) resamplers deriving higher timeframes from the base timeframe
+resamplers = cachetools.LRUCache(maxsize=1000)
+BASE_TIMEFRAME = "15m"
+BASE_UPDATE_LIMIT = 3  # the revised last candle plus anything new since the previous scan
 
-async def fetch_realtime_data(symbol, timeframe="15m", limit=50):
+def is_valid_frame(df):
+    # Zero/low price or volume anywhere makes the frame unusable
+    return not (df['close'].le(0.01).any() or df['volume'].le(1000).any())
+
+async def fetch_realtime_data(symbol, timeframe="15m", limit=50, venue=None):
+    venue = venue or venue_for(symbol)
+    key = (venue, symbol, timeframe)
     try:
-        if symbol in data_cache:
-            logger.info(f"[{symbol}] Using cached OHLCV data")
-            return data_cache[symbol]
+        if key in data_cache:
+            logger.info(f"[{symbol}] Using cached {venue} OHLCV data for {timeframe}")
+            return data_cache[key]
 
-        exchange = ccxt.binance({"enableRateLimit": True})
-        ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        ohlcv = await get_adapter(venue).fetch_ohlcv(symbol, timeframe, limit=limit)
         if not ohlcv or len(ohlcv) < 50:
             logger.warning(f"[{symbol}] Insufficient OHLCV data")
-            await exchange.close()
             return None
 
         df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"], dtype="float32")
         df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
         # Zero price/volume check
-        if df['close'].le(0.01).any() or df['volume'].le(1000).any():
+        if not is_valid_frame(df):
             logger.warning(f"[{symbol}] Invalid data: zero/low price or volume")
-            await exchange.close()
             return None
-        data_cache[symbol] = df
-        logger.info(f"[{symbol}] Fetched OHLCV data for {timeframe} with limit={limit}")
-        await exchange.close()
+        data_cache[key] = df
+        logger.info(f"[{symbol}] Fetched {venue} OHLCV data for {timeframe} with limit={limit}")
         return df
     except Exception as e:
         logger.error(f"[{symbol}] Error fetching OHLCV: {e}")
-        await exchange.close()
         return None
 
-async def websocket_collector(symbol, timeframe="15m", limit=50):
+async def websocket_collector(symbol, timeframe="15m", limit=50, venue=None):
+    venue = venue or venue_for(symbol)
+    adapter = get_adapter(venue)
+    # Streams need ccxt.pro; the REST adapter still supplies the venue's market symbol
+    exchange = getattr(ccxtpro, adapter.exchange.id)({"enableRateLimit": True})
     try:
-        exchange = ccxt.binance({"enableRateLimit": True})
         while True:
-            ohlcv = await exchange.watch_ohlcv(symbol, timeframe, limit=limit)
+            ohlcv = await exchange.watch_ohlcv(adapter.market_symbol(symbol), timeframe, limit=limit)
             if not ohlcv or len(ohlcv) < 50:
                 logger.warning(f"[{symbol}] Insufficient WebSocket OHLCV data")
                 continue
             df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"], dtype="float32")
             df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-            if df['close'].le(0.01).any() or df['volume'].le(1000).any():
+            if not is_valid_frame(df):
                 logger.warning(f"[{symbol}] Invalid WebSocket data: zero/low price or volume")
                 continue
-            data_cache[symbol] = df
+            data_cache[(venue, symbol, timeframe)] = df
             logger.info(f"[{symbol}] Updated WebSocket OHLCV data for {timeframe} with limit={limit}")
             await asyncio.sleep(60)
     except Exception as e:
         logger.error(f"[{symbol}] Error in WebSocket collector: {e}")
     finally:
         await exchange.close()
+
+async def fetch_multi_timeframe(symbol, timeframes=("15m", "1h", "4h", "1d"), limit=50, base_timeframe=BASE_TIMEFRAME, refresh=True, venue=None):
+    # Candles for several timeframes from one base-timeframe request per scan
+    # Higher timeframes are fetched from the exchange only to seed deep history (first use or after a gap)
+    # refresh=False reuses the base candles already fetched this cycle (e.g. by the stage-1 screen)
+    venue = venue or venue_for(symbol)
+    exchange = get_adapter(venue)
+    try:
+        resampler = resamplers.get((venue, symbol, base_timeframe))
+        if resampler is not None and refresh:
+            rows = await exchange.fetch_ohlcv(symbol, base_timeframe, limit=BASE_UPDATE_LIMIT)
+            if resampler.has_gap(rows):
+                logger.info(f"[{symbol}] Base candles have a gap, reseeding")
+                resampler = None
+            else:
+                resampler.update(rows)
+        if resampler is None:
+            resampler = CandleResampler(base_timeframe)
+            resampler.update(await exchange.fetch_ohlcv(symbol, base_timeframe, limit=limit))
+            resamplers[(venue, symbol, base_timeframe)] = resampler
+
+        missing = resampler.missing(timeframes)
+        if missing:
+            needed = resampler.base_candles_needed(missing)
+            if len(resampler.base) < needed:
+                rows = await exchange.fetch_ohlcv(symbol, base_timeframe, limit=max(limit, needed))
+                resampler.update(rows, replace=True)
+            for tf in missing:
+                resampler.seed(tf, await exchange.fetch_ohlcv(symbol, tf, limit=limit + 1))
+
+        frames = {}
+        for tf in timeframes:
+            df = resampler.frame(tf, limit)
+            if len(df) < 50 or not is_valid_frame(df):
+                logger.warning(f"[{symbol}] Insufficient or invalid {tf} candles")
+                frames[tf] = None
+                continue
+            frames[tf] = df
+        logger.info(f"[{symbol}] Candles ready for {', '.join(timeframes)} from {base_timeframe} base")
+        return frames
+    except Exception as e:
+        logger.error(f"[{symbol}] Error fetching multi-timeframe OHLCV: {e}")
+        return {tf: None for tf in timeframes}
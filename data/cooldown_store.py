@@ -0,0 +1,127 @@
+# Persistent signal cooldowns keyed by (symbol, direction, timeframe) in a small SQLite database
+# WAL mode lets every scanner process and the engine read while one writes; a key is claimed with a
+# single upsert, so two processes can never both send the same setup, and cooldowns survive restarts
+import os
+import sqlite3
+import threading
+import time
+from utils.logger import logger
+
+COOLDOWN_DB = os.getenv('COOLDOWN_DB', os.path.join("logs", "cooldowns.db"))
+COOLDOWN_TTL = 4 * 3600
+MAX_PARAMS = 500  # symbols per IN (...) query, below SQLite's variable limit
+ANY = '*'  # direction/timeframe wildcard in lookups
+
+class CooldownStore:
+    def __init__(self, path: str = COOLDOWN_DB, ttl: float = COOLDOWN_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; a forked or spawned worker opens its own
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cooldowns ("
+                "symbol TEXT NOT NULL, direction TEXT NOT NULL, timeframe TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (symbol, direction, timeframe)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cooldowns_expiry ON cooldowns (expires_at)")
+            self.conn, self.pid = conn, os.getpid()
+        return self.conn
+
+    def _active_rows(self, symbols: list, now: float) -> list:
+        rows = []
+        conn = self._connection()
+        for i in range(0, len(symbols), MAX_PARAMS):
+            chunk = symbols[i:i + MAX_PARAMS]
+            rows.extend(conn.execute(
+                f"SELECT symbol, direction, timeframe FROM cooldowns "
+                f"WHERE expires_at > ? AND symbol IN ({','.join('?' * len(chunk))})",
+                (now, *chunk)
+            ).fetchall())
+        return rows
+
+    def active(self, keys) -> set:
+        # Batch lookup: the (symbol, direction, timeframe) keys of `keys` still in cooldown
+        # ANY as direction or timeframe matches every stored value for that part
+        keys = list(keys)
+        if not keys:
+            return set()
+        try:
+            with self.lock:
+                rows = self._active_rows(list({k[0] for k in keys}), time.time())
+            stored = {}
+            for symbol, direction, timeframe in rows:
+                stored.setdefault(symbol, []).append((direction, timeframe))
+            return {
+                (symbol, direction, timeframe) for symbol, direction, timeframe in keys
+                if any(direction in (ANY, d) and timeframe in (ANY, tf) for d, tf in stored.get(symbol, ()))
+            }
+        except Exception as e:
+            logger.error(f"Error reading cooldowns: {str(e)}")
+            return set()
+
+    def active_symbols(self, symbols) -> set:
+        # Symbols with any direction/timeframe in cooldown, one query for the whole list
+        try:
+            with self.lock:
+                return {row[0] for row in self._active_rows(list(symbols), time.time())}
+        except Exception as e:
+            logger.error(f"Error reading cooldowns: {str(e)}")
+            return set()
+
+    def claim(self, symbol: str, direction: str, timeframe: str, ttl: float = None) -> bool:
+        # Start a cooldown unless one is running; True only for the single caller that started it
+        now = time.time()
+        try:
+            with self.lock:
+                cursor = self._connection().execute(
+                    "INSERT INTO cooldowns (symbol, direction, timeframe, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (symbol, direction, timeframe) DO UPDATE SET "
+                    "created_at = excluded.created_at, expires_at = excluded.expires_at "
+                    "WHERE cooldowns.expires_at <= excluded.created_at",
+                    (symbol, direction, timeframe, now, now + (ttl or self.ttl))
+                )
+                return cursor.rowcount == 1
+        except Exception as e:
+            logger.error(f"[{symbol}] Error claiming cooldown: {str(e)}")
+            return False
+
+    def release(self, symbol: str, direction: str, timeframe: str):
+        # Drop a claim whose signal was not sent after all
+        try:
+            with self.lock:
+                self._connection().execute(
+                    "DELETE FROM cooldowns WHERE symbol = ? AND direction = ? AND timeframe = ?",
+                    (symbol, direction, timeframe)
+                )
+        except Exception as e:
+            logger.error(f"[{symbol}] Error releasing cooldown: {str(e)}")
+
+    def count_active(self) -> int:
+        try:
+            with self.lock:
+                return self._connection().execute(
+                    "SELECT COUNT(*) FROM cooldowns WHERE expires_at > ?", (time.time(),)
+                ).fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error counting cooldowns: {str(e)}")
+            return 0
+
+    def purge(self):
+        # Expired rows are only skipped by lookups; this keeps the table small
+        try:
+            with self.lock:
+                self._connection().execute("DELETE FROM cooldowns WHERE expires_at <= ?", (time.time(),))
+        except Exception as e:
+            logger.error(f"Error purging cooldowns: {str(e)}")
+
+cooldowns = CooldownStore()
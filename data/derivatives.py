@@ -0,0 +1,103 @@
+# Funding rates and open interest of USDT-M perpetuals, refreshed at a fixed interval and kept in memory
+# Predictions look their symbol up in a dict, so no request is ever made per signal
+import asyncio
+import time
+from collections import deque, namedtuple
+from data.exchanges import get_adapter
+from utils.logger import logger
+
+POLL_INTERVAL = 300  # seconds between refreshes
+OI_WINDOW = 12  # polls the open-interest change is measured over (1h at the default interval)
+FUNDING_CROWDED = 0.0005  # 0.05% per funding period: the side paying it is crowded, leverage is cut
+FUNDING_EXTREME = 0.001  # 0.1%: no new signals on the paying side
+OI_SURGE_PCT = 10.0  # open interest growth over the window that counts as a positioning surge
+MIN_LEVERAGE = 10
+
+DerivativesSnapshot = namedtuple('DerivativesSnapshot', ['funding_rate', 'open_interest', 'oi_change_pct'])
+
+def spot_symbol(symbol: str) -> str:
+    # 'BTC/USDT:USDT' -> 'BTC/USDT', the key the scanner uses
+    return symbol.split(':')[0]
+
+class DerivativesContext:
+    def __init__(self):
+        self.funding = {}
+        self.open_interest = {}  # spot symbol -> deque of the last OI_WINDOW + 1 polls
+        self.snapshots = {}
+        self.updated_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def _fetch_open_interest(self, exchange, symbols: list) -> dict:
+        # Binance has no all-symbol open-interest endpoint, so the listed perpetuals are polled concurrently,
+        # paced by the adapter's rate limiter and concurrency limit
+        results = await asyncio.gather(*(exchange.call('fetch_open_interest', s) for s in symbols), return_exceptions=True)
+        return {
+            spot_symbol(s): float(r['openInterestAmount'])
+            for s, r in zip(symbols, results)
+            if not isinstance(r, Exception) and r and r.get('openInterestAmount') is not None
+        }
+
+    async def _refresh(self, symbols):
+        # Shares the binanceusdm adapter's rate limiter with any futures candle requests
+        exchange = get_adapter('binanceusdm')
+        rates = await exchange.call('fetch_funding_rates', weight=10)
+        self.funding = {
+            spot_symbol(s): float(r['fundingRate'])
+            for s, r in rates.items()
+            if s.endswith(':USDT') and r.get('fundingRate') is not None
+        }
+        wanted = set(symbols) if symbols is not None else set(self.funding)
+        perpetuals = [s for s in rates if spot_symbol(s) in wanted and s.endswith(':USDT')]
+        for symbol, amount in (await self._fetch_open_interest(exchange, perpetuals)).items():
+            self.open_interest.setdefault(symbol, deque(maxlen=OI_WINDOW + 1)).append(amount)
+        self.snapshots = {symbol: self._snapshot(symbol) for symbol in self.funding}
+        self.updated_at = time.time()
+        logger.info(f"Derivatives context: funding for {len(self.funding)}, open interest for {len(perpetuals)} perpetuals")
+
+    def _snapshot(self, symbol: str) -> DerivativesSnapshot:
+        history = self.open_interest.get(symbol)
+        open_interest = history[-1] if history else None
+        oi_change = None
+        if history and len(history) > 1 and history[0] > 0:
+            oi_change = (history[-1] / history[0] - 1) * 100
+        return DerivativesSnapshot(self.funding[symbol], open_interest, oi_change)
+
+    async def refresh(self, symbols=None):
+        # Refresh when older than POLL_INTERVAL; symbols limits open-interest polling to the scan universe
+        if time.time() - self.updated_at < POLL_INTERVAL:
+            return
+        async with self.lock:
+            if time.time() - self.updated_at < POLL_INTERVAL:
+                return
+            try:
+                await self._refresh(symbols)
+            except Exception as e:
+                logger.error(f"Error refreshing derivatives context: {str(e)}")
+
+    def get(self, symbol: str) -> DerivativesSnapshot:
+        # None for symbols without a perpetual or before the first refresh
+        return self.snapshots.get(symbol)
+
+derivatives = DerivativesContext()
+
+def _paying_side(funding_rate: float, threshold: float) -> str:
+    # Positive funding is paid by longs, negative by shorts
+    if funding_rate >= threshold:
+        return "LONG"
+    if funding_rate <= -threshold:
+        return "SHORT"
+    return None
+
+def crowded_direction(direction: str, snapshot: DerivativesSnapshot) -> bool:
+    # True when the signal would join a side already paying extreme funding
+    return snapshot is not None and _paying_side(snapshot.funding_rate, FUNDING_EXTREME) == direction
+
+def adjust_leverage(leverage: int, direction: str, snapshot: DerivativesSnapshot) -> int:
+    # Halve leverage on the crowded side and step it down once more while open interest is surging
+    if snapshot is None:
+        return leverage
+    if _paying_side(snapshot.funding_rate, FUNDING_CROWDED) == direction:
+        leverage //= 2
+    if snapshot.oi_change_pct is not None and snapshot.oi_change_pct > OI_SURGE_PCT:
+        leverage -= 10
+    return max(leverage, MIN_LEVERAGE)
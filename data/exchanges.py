@@ -0,0 +1,143 @@
+# Exchange adapters: one long-lived ccxt client per venue behind its own rate limiter and concurrency limit
+# The scanner keeps plain 'BASE/USDT' symbols; each symbol is assigned to one of the venues listing it,
+# so the candle requests of a scan are spread over every venue's request budget
+import asyncio
+import os
+import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
+from utils.rate_limiter import TokenBucket
+from utils.logger import logger
+
+DEFAULT_VENUE = "binance"
+# requests_per_second stays under each venue's public limit; suffix maps 'BTC/USDT' to the venue's market
+VENUES = {
+    'binance': {'exchange': 'binance', 'requests_per_second': 20, 'concurrency': 10, 'suffix': '',
+                'credentials': ('BINANCE_API_KEY', 'BINANCE_API_SECRET')},
+    'binanceusdm': {'exchange': 'binanceusdm', 'requests_per_second': 20, 'concurrency': 10, 'suffix': ':USDT',
+                    'credentials': ('BINANCE_API_KEY', 'BINANCE_API_SECRET')},
+    'bybit': {'exchange': 'bybit', 'requests_per_second': 10, 'concurrency': 5, 'suffix': '',
+              'options': {'defaultType': 'spot'}}
+}
+# Venues the scanner takes candles from, e.g. SCAN_VENUES=binance,bybit
+SCAN_VENUES = [v.strip() for v in os.getenv('SCAN_VENUES', DEFAULT_VENUE).split(',') if v.strip() in VENUES]
+
+class ExchangeAdapter:
+    def __init__(self, venue: str):
+        config = VENUES[venue]
+        self.venue = venue
+        self.suffix = config['suffix']
+        params = {'options': config.get('options', {})}
+        key_var, secret_var = config.get('credentials', (None, None))
+        if key_var and os.getenv(key_var):
+            params.update({'apiKey': os.getenv(key_var), 'secret': os.getenv(secret_var)})
+        # Requests are paced here, per venue, instead of by ccxt's one-request-at-a-time throttle
+        params['enableRateLimit'] = False
+        self.exchange = getattr(ccxt, config['exchange'])(params)
+        self.rate = config['requests_per_second']
+        self.limiter = TokenBucket(self.rate, self.rate)
+        self.semaphore = asyncio.Semaphore(config['concurrency'])
+
+    def market_symbol(self, symbol: str) -> str:
+        return symbol if symbol.endswith(self.suffix) else f"{symbol}{self.suffix}"
+
+    def scanner_symbol(self, symbol: str) -> str:
+        return symbol.split(':')[0]
+
+    async def call(self, method: str, *args, weight: float = 1, **kwargs):
+        # Heavy requests (e.g. all tickers) cost more; anything above one second's budget waits for a full bucket
+        async with self.semaphore:
+            await self.limiter.acquire(min(weight, self.limiter.capacity))
+            return await getattr(self.exchange, method)(*args, **kwargs)
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 50):
+        return await self.call('fetch_ohlcv', self.market_symbol(symbol), timeframe, limit=limit)
+
+    async def fetch_ticker(self, symbol: str) -> dict:
+        return await self.call('fetch_ticker', self.market_symbol(symbol))
+
+    async def usdt_volumes(self) -> dict:
+        # 24h quote volume of every USDT market of the venue, from one bulk ticker request
+        markets = await self.call('load_markets')
+        symbols = [s for s, m in markets.items() if m.get('quote') == 'USDT' and m.get('active', True) and s.endswith(f"/USDT{self.suffix}")]
+        tickers = await self.call('fetch_tickers', symbols, weight=40)
+        return {
+            self.scanner_symbol(s): float(tickers[s].get('quoteVolume') or 0)
+            for s in symbols if s in tickers
+        }
+
+    async def close(self):
+        await self.exchange.close()
+
+_adapters = {}
+# Scanner symbol -> venue it is fetched from; unassigned symbols use DEFAULT_VENUE
+symbol_venues = {}
+
+def get_adapter(venue: str = DEFAULT_VENUE) -> ExchangeAdapter:
+    if venue not in _adapters:
+        _adapters[venue] = ExchangeAdapter(venue)
+    return _adapters[venue]
+
+def venue_for(symbol: str) -> str:
+    return symbol_venues.get(symbol, DEFAULT_VENUE)
+
+def assign_venues(listings: dict) -> dict:
+    # listings: venue -> {symbol: quote volume}; every symbol goes to the least loaded venue listing it,
+    # load being symbols already assigned relative to the venue's request rate. Returns the best volume per symbol
+    volumes = {}
+    for listed in listings.values():
+        for symbol, volume in listed.items():
+            volumes[symbol] = max(volume, volumes.get(symbol, 0))
+    load = {venue: 0 for venue in listings}
+    symbol_venues.clear()
+    for symbol in sorted(volumes, key=volumes.get, reverse=True):
+        candidates = [venue for venue in listings if symbol in listings[venue]]
+        venue = min(candidates, key=lambda v: load[v] / VENUES[v]['requests_per_second'])
+        symbol_venues[symbol] = venue
+        load[venue] += 1
+    logger.info(f"Symbols per venue: {load}")
+    return volumes
+
+async def fetch_listings(venues=None) -> dict:
+    # USDT volumes of every scan venue; a venue that fails is left out of this cycle
+    venues = venues or SCAN_VENUES
+    results = await asyncio.gather(*(get_adapter(v).usdt_volumes() for v in venues), return_exceptions=True)
+    listings = {}
+    for venue, result in zip(venues, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error loading {venue} markets: {str(result)}")
+            continue
+        listings[venue] = result
+    return listings
+
+class StreamClients:
+    # ccxt.pro clients per venue for websocket streams, opened on first use
+    # Each stream owner (order books, trade flow, paper trading) keeps its own set and closes it
+    def __init__(self):
+        self.clients = {}
+
+    def get(self, venue: str):
+        if venue not in self.clients:
+            config = VENUES[venue]
+            self.clients[venue] = getattr(ccxtpro, config['exchange'])({'enableRateLimit': True, 'options': config.get('options', {})})
+        return self.clients[venue]
+
+    def for_symbol(self, symbol: str) -> tuple:
+        # Client of the venue the symbol is scanned on and the symbol as that venue names it
+        venue = venue_for(symbol)
+        return self.get(venue), get_adapter(venue).market_symbol(symbol)
+
+    async def close(self):
+        for venue, client in list(self.clients.items()):
+            try:
+                await client.close()
+            except Exception as e:
+                logger.error(f"Error closing {venue} stream client: {str(e)}")
+        self.clients.clear()
+
+async def close_adapters():
+    for adapter in list(_adapters.values()):
+        try:
+            await adapter.close()
+        except Exception as e:
+            logger.error(f"Error closing {adapter.venue}: {str(e)}")
+    _adapters.clear()
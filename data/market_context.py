@@ -0,0 +1,84 @@
+# Shared market context (BTC trend, volatility and regime) computed once per candle
+# Every prediction receives the same read-only snapshot instead of fetching BTC on its own
+import asyncio
+import time
+from collections import namedtuple
+import numpy as np
+from data.collector import fetch_multi_timeframe
+from data.resampler import TIMEFRAME_MS
+from core.indicators import calculate_indicators
+from utils.logger import logger
+
+CONTEXT_TIMEFRAME = "1h"
+REFRESH_TIMEFRAME = "15m"  # recompute when a new candle of this timeframe opens
+TREND_CANDLES = 24  # 24h change, same horizon as the ticker percentage used before
+VOLATILE_THRESHOLD = 5.0  # daily realised volatility in % above which the regime is 'volatile'
+BTC_SYMBOL = "BTC/USDT"
+ETH_SYMBOL = "ETH/USDT"
+
+MarketSnapshot = namedtuple('MarketSnapshot', [
+    'btc_trend', 'btc_volatility', 'btc_regime', 'eth_trend', 'market_trend', 'candle_time', 'updated_at'
+])
+EMPTY_SNAPSHOT = MarketSnapshot(0.0, 0.0, 'unknown', 0.0, 0.0, None, 0.0)
+
+def _trend_metrics(df):
+    # 24h change and daily realised volatility in %, plus EMA-based regime
+    close = df['close'].to_numpy(dtype=np.float64)
+    window = min(TREND_CANDLES, len(close) - 1)
+    trend = (close[-1] / close[-1 - window] - 1) * 100
+    returns = np.diff(np.log(close[-window - 1:]))
+    volatility = float(returns.std() * np.sqrt(TREND_CANDLES) * 100)
+    latest = df.iloc[-1]
+    if volatility > VOLATILE_THRESHOLD:
+        regime = 'volatile'
+    elif latest['ema_20'] > latest['ema_50'] and trend > 0:
+        regime = 'bullish'
+    elif latest['ema_20'] < latest['ema_50'] and trend < 0:
+        regime = 'bearish'
+    else:
+        regime = 'ranging'
+    return float(trend), volatility, regime
+
+class MarketContext:
+    def __init__(self, include_eth: bool = True):
+        self.include_eth = include_eth
+        self.snapshot = EMPTY_SNAPSHOT
+        self.lock = asyncio.Lock()
+
+    def _candle_time(self) -> int:
+        tf_ms = TIMEFRAME_MS[REFRESH_TIMEFRAME]
+        now = int(time.time() * 1000)
+        return now - now % tf_ms
+
+    async def _compute(self, candle_time: int) -> MarketSnapshot:
+        symbols = [BTC_SYMBOL] + ([ETH_SYMBOL] if self.include_eth else [])
+        results = await asyncio.gather(*(fetch_multi_timeframe(s, (REFRESH_TIMEFRAME, CONTEXT_TIMEFRAME), limit=50) for s in symbols))
+        metrics = {}
+        for symbol, frames in zip(symbols, results):
+            df = frames.get(CONTEXT_TIMEFRAME)
+            if df is None or len(df) < 2:
+                logger.warning(f"[{symbol}] No candles for market context")
+                continue
+            metrics[symbol] = _trend_metrics(calculate_indicators(df))
+        if BTC_SYMBOL not in metrics:
+            return self.snapshot
+        btc_trend, btc_volatility, btc_regime = metrics[BTC_SYMBOL]
+        eth_trend = metrics[ETH_SYMBOL][0] if ETH_SYMBOL in metrics else 0.0
+        market_trend = float(np.mean([m[0] for m in metrics.values()]))
+        return MarketSnapshot(btc_trend, btc_volatility, btc_regime, eth_trend, market_trend, candle_time, time.time())
+
+    async def get_snapshot(self) -> MarketSnapshot:
+        # Cached until the next candle opens; concurrent callers wait for the single refresh
+        candle_time = self._candle_time()
+        if self.snapshot.candle_time == candle_time:
+            return self.snapshot
+        async with self.lock:
+            if self.snapshot.candle_time != candle_time:
+                try:
+                    self.snapshot = await self._compute(candle_time)
+                    logger.info(f"Market context: BTC trend {self.snapshot.btc_trend:.2f}%, volatility {self.snapshot.btc_volatility:.2f}%, regime {self.snapshot.btc_regime}")
+                except Exception as e:
+                    logger.error(f"Error computing market context: {str(e)}")
+        return self.snapshot
+
+market_context = MarketContext()
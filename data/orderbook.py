@@ -0,0 +1,151 @@
+# Streamed top-N order books for stage-1 candidates
+# ccxt.pro keeps each book in sync from the exchange's diff-depth stream; every update copies only the best
+# BOOK_DEPTH levels into float arrays, which is all spread, depth and slippage need
+import asyncio
+import time
+import numpy as np
+from data.exchanges import StreamClients
+from utils.logger import logger
+
+BOOK_DEPTH = 50  # price levels kept per side
+DEPTH_RANGE_PCT = 0.5  # depth is the quote notional within this % of the mid price
+STALE_SECONDS = 30  # a book without updates for this long is ignored
+READY_TIMEOUT = 3  # seconds a candidate waits for its first book
+MAX_BOOKS = 60  # streams open at once; the oldest candidates are dropped first
+REFERENCE_NOTIONAL = 10_000  # USDT filled at entry and SL when estimating slippage
+MAX_SPREAD_PCT = 0.15
+MAX_SLIPPAGE_PCT = 0.2
+
+def _levels(side, depth: int) -> np.ndarray:
+    # (price, amount) rows of one book side
+    levels = np.array(side[:depth], dtype=np.float64)
+    return levels[:, :2] if levels.size else np.empty((0, 2))
+
+def _depth_notional(levels: np.ndarray, limit: float, below: bool) -> float:
+    prices = levels[:, 0]
+    inside = prices >= limit if below else prices <= limit
+    return float((prices[inside] * levels[inside, 1]).sum())
+
+def _slippage_pct(levels: np.ndarray, notional: float) -> float:
+    # Average fill price of a market order for `notional` against the best price, in %
+    if not len(levels):
+        return float('inf')
+    prices, amounts = levels[:, 0], levels[:, 1]
+    cumulative = np.cumsum(prices * amounts)
+    if cumulative[-1] < notional:
+        return float('inf')
+    last = int(np.searchsorted(cumulative, notional))
+    filled = amounts[:last].sum() + (notional - (cumulative[last - 1] if last else 0.0)) / prices[last]
+    return float(abs(notional / filled / prices[0] - 1) * 100)
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        # Bids highest first, asks lowest first
+        self.bids = np.empty((0, 2))
+        self.asks = np.empty((0, 2))
+        self.updated_at = 0.0
+        self.ready = asyncio.Event()
+
+    def update(self, book: dict):
+        self.bids = _levels(book['bids'], BOOK_DEPTH)
+        self.asks = _levels(book['asks'], BOOK_DEPTH)
+        self.updated_at = time.time()
+        if len(self.bids) and len(self.asks):
+            self.ready.set()
+
+    def is_fresh(self) -> bool:
+        return self.ready.is_set() and time.time() - self.updated_at < STALE_SECONDS
+
+    def metrics(self) -> dict:
+        best_bid, best_ask = self.bids[0, 0], self.asks[0, 0]
+        mid = (best_bid + best_ask) / 2
+        bid_depth = _depth_notional(self.bids, mid * (1 - DEPTH_RANGE_PCT / 100), below=True)
+        ask_depth = _depth_notional(self.asks, mid * (1 + DEPTH_RANGE_PCT / 100), below=False)
+        return {
+            'spread_pct': float((best_ask - best_bid) / mid * 100),
+            'bid_depth': bid_depth,
+            'ask_depth': ask_depth,
+            # The thinner side limits both entry and exit
+            'depth_usd': min(bid_depth, ask_depth)
+        }
+
+    def slippage(self, direction: str, notional: float = REFERENCE_NOTIONAL) -> tuple:
+        # Expected slippage in % for entering and for being stopped out; LONG buys asks and sells bids at SL
+        if direction == "LONG":
+            return _slippage_pct(self.asks, notional), _slippage_pct(self.bids, notional)
+        return _slippage_pct(self.bids, notional), _slippage_pct(self.asks, notional)
+
+class OrderBookManager:
+    def __init__(self):
+        self.streams = StreamClients()
+        self.books = {}
+        self.tasks = {}
+
+    async def _stream(self, symbol: str):
+        # Streamed from the venue the symbol's candles come from
+        book = self.books[symbol]
+        exchange, market_symbol = self.streams.for_symbol(symbol)
+        while True:
+            try:
+                book.update(await exchange.watch_order_book(market_symbol, BOOK_DEPTH))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{symbol}] Error streaming order book: {str(e)}")
+                await asyncio.sleep(5)
+
+    def watch(self, symbols):
+        # Stream the given candidates only; streams for symbols that dropped out are stopped
+        wanted = list(dict.fromkeys(symbols))[:MAX_BOOKS]
+        for symbol in [s for s in self.tasks if s not in wanted]:
+            self.tasks.pop(symbol).cancel()
+            self.books.pop(symbol, None)
+        for symbol in wanted:
+            if symbol not in self.tasks:
+                self.books[symbol] = OrderBook(symbol)
+                self.tasks[symbol] = asyncio.create_task(self._stream(symbol))
+        logger.info(f"Streaming order books for {len(self.tasks)} candidates")
+
+    async def get(self, symbol: str, timeout: float = READY_TIMEOUT) -> OrderBook:
+        # The symbol's book once its first update has arrived, None if it is not streamed or stale
+        book = self.books.get(symbol)
+        if book is None:
+            return None
+        try:
+            await asyncio.wait_for(book.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"[{symbol}] No order book after {timeout}s")
+            return None
+        return book if book.is_fresh() else None
+
+    async def get_metrics(self, symbol: str) -> dict:
+        book = await self.get(symbol)
+        return book.metrics() if book else None
+
+    async def check_liquidity(self, signal) -> tuple:
+        # Pre-send gate: (passed, reason); without a book the 24h volume check is all there is
+        symbol = signal.symbol
+        try:
+            book = await self.get(symbol)
+            if book is None:
+                return True, "no order book"
+            spread = book.metrics()['spread_pct']
+            if spread > MAX_SPREAD_PCT:
+                return False, f"spread {spread:.3f}% > {MAX_SPREAD_PCT}%"
+            entry_slippage, sl_slippage = book.slippage(signal.direction)
+            if max(entry_slippage, sl_slippage) > MAX_SLIPPAGE_PCT:
+                return False, f"slippage entry {entry_slippage:.3f}% / SL {sl_slippage:.3f}% for ${REFERENCE_NOTIONAL:,}"
+            return True, f"spread {spread:.3f}%, slippage entry {entry_slippage:.3f}% / SL {sl_slippage:.3f}%"
+        except Exception as e:
+            logger.error(f"[{symbol}] Error checking liquidity: {str(e)}")
+            return True, "liquidity check failed"
+
+    async def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.books.clear()
+        await self.streams.close()
+
+order_books = OrderBookManager()
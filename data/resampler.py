@@ -0,0 +1,150 @@
+# Higher-timeframe candles derived from a base timeframe
+# Buckets are aligned to UTC epoch boundaries like Binance klines, so 1h/4h/1d bars match the exchange exactly
+from collections import deque
+import numpy as np
+import pandas as pd
+
+TIMEFRAME_MS = {
+    '1m': 60_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '30m': 1_800_000,
+    '1h': 3_600_000,
+    '2h': 7_200_000,
+    '4h': 14_400_000,
+    '1d': 86_400_000
+}
+HISTORY_SIZE = 500
+
+def _candle(row):
+    return (int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+
+def _merge(first, second):
+    # Combine two consecutive candles (timestamp, open, high, low, close, volume)
+    if first is None:
+        return second
+    return (first[0], first[1], max(first[2], second[2]), min(first[3], second[3]), second[4], first[5] + second[5])
+
+def rows_to_frame(rows) -> pd.DataFrame:
+    # Same layout as data.collector.fetch_realtime_data
+    df = pd.DataFrame(list(rows), columns=["timestamp", "open", "high", "low", "close", "volume"], dtype="float64")
+    df = df.astype({"open": "float32", "high": "float32", "low": "float32", "close": "float32", "volume": "float32"})
+    df["timestamp"] = pd.to_datetime(df["timestamp"].astype("int64"), unit="ms")
+    return df
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    # Vectorised aggregation of a whole base frame into the target timeframe
+    timestamps = df['timestamp']
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        ms = timestamps.to_numpy().astype('datetime64[ms]').astype(np.int64)
+    else:
+        ms = timestamps.to_numpy().astype(np.int64)
+    tf_ms = TIMEFRAME_MS[timeframe]
+    buckets = ms - ms % tf_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    rows = np.column_stack([
+        buckets[starts],
+        df['open'].to_numpy()[starts],
+        np.maximum.reduceat(df['high'].to_numpy(), starts),
+        np.minimum.reduceat(df['low'].to_numpy(), starts),
+        df['close'].to_numpy()[ends],
+        np.add.reduceat(df['volume'].to_numpy(dtype=np.float64), starts)
+    ])
+    return rows_to_frame(rows.tolist())
+
+class _Series:
+    # Completed bars plus the still-forming bar of one timeframe
+    def __init__(self, tf_ms: int, size: int):
+        self.tf_ms = tf_ms
+        self.history = deque(maxlen=size)
+        self.forming_start = None
+        self.settled = None  # aggregate of closed base candles in the forming bucket
+        self.current = None  # latest base candle, may still be revised
+
+    def forming(self):
+        if self.forming_start is None:
+            return None
+        bar = _merge(self.settled, self.current)
+        return (self.forming_start,) + tuple(bar[1:])
+
+    def apply(self, candle):
+        ts = candle[0]
+        bucket = ts - ts % self.tf_ms
+        # Bars already known exactly (seeded from the exchange) are never rebuilt from partial data
+        if self.history and bucket <= self.history[-1][0]:
+            return
+        if self.forming_start is None or bucket > self.forming_start:
+            if self.forming_start is not None:
+                self.history.append(self.forming())
+            self.forming_start, self.settled, self.current = bucket, None, candle
+        elif bucket == self.forming_start:
+            if ts == self.current[0]:
+                self.current = candle
+            elif ts > self.current[0]:
+                self.settled = _merge(self.settled, self.current)
+                self.current = candle
+
+class CandleResampler:
+    def __init__(self, base_timeframe: str, size: int = HISTORY_SIZE):
+        # Higher timeframes are added when first seeded, so a symbol can start with base candles only
+        self.base_timeframe = base_timeframe
+        self.base_ms = TIMEFRAME_MS[base_timeframe]
+        self.size = size
+        self.base = deque(maxlen=size)
+        self.series = {}
+
+    @property
+    def last_base_timestamp(self):
+        return self.base[-1][0] if self.base else None
+
+    def missing(self, timeframes) -> list:
+        return [tf for tf in timeframes if tf != self.base_timeframe and tf not in self.series]
+
+    def base_candles_needed(self, timeframes) -> int:
+        # Base candles required to rebuild the largest forming bucket from its start
+        largest = max((TIMEFRAME_MS[tf] for tf in timeframes), default=self.base_ms)
+        return largest // self.base_ms + 1
+
+    def seed(self, timeframe: str, rows):
+        # Deep history from the exchange; the last (forming) bar is rebuilt from the base candles held
+        series = _Series(TIMEFRAME_MS[timeframe], self.size)
+        series.history.extend(_candle(row) for row in rows[:-1])
+        for candle in self.base:
+            series.apply(candle)
+        self.series[timeframe] = series
+
+    def update(self, rows, replace: bool = False):
+        # Apply base candles (ccxt rows); only new candles and the revised last one change anything
+        # replace=True swaps in a longer base history; already applied candles are ignored by the series
+        if replace:
+            self.base.clear()
+        last = self.last_base_timestamp
+        for row in rows:
+            candle = _candle(row)
+            if last is not None and candle[0] < last:
+                continue
+            if last is not None and candle[0] == last:
+                self.base[-1] = candle
+            else:
+                self.base.append(candle)
+            last = candle[0]
+            for series in self.series.values():
+                series.apply(candle)
+
+    def has_gap(self, rows) -> bool:
+        # True when fetched base candles do not connect to what we already hold
+        last = self.last_base_timestamp
+        return last is None or not rows or int(rows[0][0]) > last + self.base_ms
+
+    def frame(self, timeframe: str, limit: int = 50) -> pd.DataFrame:
+        if timeframe == self.base_timeframe:
+            rows = list(self.base)[-limit:]
+        else:
+            series = self.series[timeframe]
+            rows = list(series.history)
+            forming = series.forming()
+            if forming is not None:
+                rows.append(forming)
+            rows = rows[-limit:]
+        return rows_to_frame(rows)
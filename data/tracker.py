@@ -1,69 +1,66 @@
-import polars as pl
-from utils.logger import logger
-import ccxt.async_support as ccxt
+from utils.logger import logger, log_signal_to_csv
+from telebot.command_cache import command_cache
+from model.calibration import calibrator
+from api.broadcaster import broadcaster, EVENT_STATUS
+from data.exchanges import get_adapter, venue_for
+from model.signal import Signal, normalize_timestamp, STATUS_PENDING, STATUS_TP1, STATUS_TP2, STATUS_TP3, STATUS_SL
 import asyncio
+import pandas as pd
 
-async def track_trade(symbol, signal):
+async def track_trade(symbol, signal: Signal):
+    # Priced on the venue the signal's candles came from
+    exchange = get_adapter(venue_for(symbol))
     try:
-        exchange = ccxt.binance({"enableRateLimit": True})
-        direction = signal["direction"]
-        price = signal["price"]
-        tp1 = signal["tp1"]
-        tp2 = signal["tp2"]
-        tp3 = signal["tp3"]
-        sl = signal["sl"]
+        direction = signal.direction
+        tp1, tp2, tp3, sl = signal.tp1, signal.tp2, signal.tp3, signal.sl
 
-        status = "pending"
+        status = STATUS_PENDING
         for _ in range(720):  # Check for ~3 hours (720 * 15s)
             ticker = await exchange.fetch_ticker(symbol)
             current_price = ticker["last"]
 
             if direction == "LONG":
                 if current_price >= tp3:
-                    status = "tp3"
+                    status = STATUS_TP3
                     break
                 elif current_price >= tp2:
-                    status = "tp2"
+                    status = STATUS_TP2
                 elif current_price >= tp1:
-                    status = "tp1"
+                    status = STATUS_TP1
                 elif current_price <= sl:
-                    status = "sl"
+                    status = STATUS_SL
                     break
             else:  # SHORT
                 if current_price <= tp3:
-                    status = "tp3"
+                    status = STATUS_TP3
                     break
                 elif current_price <= tp2:
-                    status = "tp2"
+                    status = STATUS_TP2
                 elif current_price <= tp1:
-                    status = "tp1"
+                    status = STATUS_TP1
                 elif current_price >= sl:
-                    status = "sl"
+                    status = STATUS_SL
                     break
 
             await asyncio.sleep(15)  # Check every 15 seconds
 
-        log(f"[{symbol}] Trade status: {status}")
+        logger.info(f"[{symbol}] Trade status: {status}")
         update_signal_log(symbol, signal, status)
-        await exchange.close()
         return status
     except Exception as e:
-        log(f"[{symbol}] Error tracking trade: {e}", level='ERROR')
-        await exchange.close()
+        logger.error(f"[{symbol}] Error tracking trade: {e}")
         return "error"
 
-def update_signal_log(symbol, signal, status):
+def update_signal_log(symbol, signal: Signal, status):
+    # The log is append-only: the status change is written as a new row for the same signal
     try:
-        csv_path = "logs/signals_log.csv"
-        df = pl.read_csv(csv_path)
-        df = df.with_columns(pl.col("status").cast(pl.Utf8))
-        df = df.with_columns(
-            pl.when((pl.col("symbol") == symbol) & (pl.col("timestamp") == signal["timestamp"]))
-            .then(status)
-            .otherwise(pl.col("status"))
-            .alias("status")
-        )
-        df.write_csv(csv_path)
-        log(f"[{symbol}] Signal log updated with status: {status}")
+        signal.status = status
+        if status != STATUS_PENDING:
+            signal.hit_timestamp = normalize_timestamp(pd.Timestamp.now())
+        log_signal_to_csv(signal)
+        command_cache.on_status_change(signal)
+        broadcaster.publish_signal(EVENT_STATUS, signal)
+        calibrator.record(signal)
+        logger.info(f"[{symbol}] Signal log updated with status: {status}")
     except Exception as e:
-        log(f"[{symbol}] Error updating signal log: {e}", level='ERROR')
+        logger.error(f"[{symbol}] Error updating signal log: {e}")
@@ -0,0 +1,156 @@
+# Per-candle trade flow (buy/sell volume, volume delta, CVD, large trades) from streamed aggregated trades
+# Each symbol has a fixed ring of FLOW_CANDLES candles indexed by candle open time, so memory stays flat
+# however many trades arrive; a batch of trades is folded in with a few vectorised adds
+import asyncio
+import numpy as np
+import pandas as pd
+from data.exchanges import StreamClients
+from data.resampler import TIMEFRAME_MS
+from utils.logger import logger
+
+FLOW_TIMEFRAME = "15m"
+FLOW_CANDLES = 200
+LARGE_TRADE_USD = 50_000  # quote notional from which a single trade counts as large
+MAX_STREAMS = 100  # symbols streamed at once, highest quote volume first
+FLOW_COLUMNS = ['buy_volume', 'sell_volume', 'volume_delta', 'cvd', 'large_buys', 'large_sells']
+
+class TradeFlow:
+    def __init__(self, symbol: str, timeframe: str = FLOW_TIMEFRAME, size: int = FLOW_CANDLES):
+        self.symbol = symbol
+        self.tf_ms = TIMEFRAME_MS[timeframe]
+        self.size = size
+        self.open_time = np.full(size, -1, dtype=np.int64)
+        self.buy_volume = np.zeros(size)
+        self.sell_volume = np.zeros(size)
+        # Running volume delta since the stream started, as of the last trade of each candle
+        self.cvd = np.zeros(size)
+        self.large_buys = np.zeros(size, dtype=np.int32)
+        self.large_sells = np.zeros(size, dtype=np.int32)
+        self.cvd_total = 0.0
+        self.current = -1  # open time of the newest candle
+        self.last_id = -1  # aggregate trade ids increase, so anything at or below this was already counted
+
+    def _open(self, bucket: int):
+        # Start a candle, recycling the slot of the candle FLOW_CANDLES back
+        slot = bucket // self.tf_ms % self.size
+        self.open_time[slot] = bucket
+        self.buy_volume[slot] = self.sell_volume[slot] = 0.0
+        self.large_buys[slot] = self.large_sells[slot] = 0
+        self.cvd[slot] = self.cvd_total
+        self.current = bucket
+
+    def ingest(self, trades: list):
+        # trades in ccxt's unified format; repeats and trades older than the ring are dropped
+        n = len(trades)
+        if not n:
+            return
+        ids = np.fromiter((int(t['id']) for t in trades), np.int64, n)
+        timestamps = np.fromiter((t['timestamp'] for t in trades), np.int64, n)
+        amounts = np.fromiter((t['amount'] for t in trades), np.float64, n)
+        prices = np.fromiter((t['price'] for t in trades), np.float64, n)
+        is_buy = np.fromiter((t['side'] == 'buy' for t in trades), bool, n)
+
+        buckets = timestamps - timestamps % self.tf_ms
+        keep = (ids > self.last_id) & (buckets > self.current - self.size * self.tf_ms)
+        if not keep.any():
+            return
+        self.last_id = int(ids.max())
+        buckets, amounts, is_buy = buckets[keep], amounts[keep], is_buy[keep]
+        large = amounts * prices[keep] >= LARGE_TRADE_USD
+        signed = np.where(is_buy, amounts, -amounts)
+
+        # A batch spans one or two candles at most, so looping over them is cheap
+        for bucket in np.unique(buckets):
+            bucket = int(bucket)
+            if bucket > self.current:
+                # Candles without trades in between still get a (zero) row
+                if self.current >= 0:
+                    for gap in range(max(self.current + self.tf_ms, bucket - (self.size - 1) * self.tf_ms), bucket, self.tf_ms):
+                        self._open(gap)
+                self._open(bucket)
+            elif self.open_time[bucket // self.tf_ms % self.size] != bucket:
+                continue
+            slot = bucket // self.tf_ms % self.size
+            in_bucket = buckets == bucket
+            buys = in_bucket & is_buy
+            sells = in_bucket & ~is_buy
+            self.buy_volume[slot] += amounts[buys].sum()
+            self.sell_volume[slot] += amounts[sells].sum()
+            self.large_buys[slot] += np.count_nonzero(large & buys)
+            self.large_sells[slot] += np.count_nonzero(large & sells)
+            delta = signed[in_bucket].sum()
+            self.cvd_total += delta
+            # Late trades for an older candle move its CVD and every later one
+            later = self.open_time >= bucket
+            self.cvd[later] += delta
+
+    def frame(self, timestamps) -> pd.DataFrame:
+        # Flow columns aligned to candle open times; NaN for candles the ring has not seen
+        ms = np.asarray(timestamps).astype('datetime64[ms]').astype(np.int64)
+        slots = ms // self.tf_ms % self.size
+        seen = self.open_time[slots] == ms
+        buy = np.where(seen, self.buy_volume[slots], np.nan)
+        sell = np.where(seen, self.sell_volume[slots], np.nan)
+        return pd.DataFrame({
+            'buy_volume': buy,
+            'sell_volume': sell,
+            'volume_delta': buy - sell,
+            'cvd': np.where(seen, self.cvd[slots], np.nan),
+            'large_buys': np.where(seen, self.large_buys[slots], np.nan),
+            'large_sells': np.where(seen, self.large_sells[slots], np.nan)
+        })
+
+class TradeFlowManager:
+    def __init__(self):
+        self.streams = StreamClients()
+        self.flows = {}
+        self.tasks = {}
+
+    async def _stream(self, symbol: str):
+        # Streamed from the venue the symbol's candles come from
+        flow = self.flows[symbol]
+        exchange, market_symbol = self.streams.for_symbol(symbol)
+        while True:
+            try:
+                flow.ingest(await exchange.watch_trades(market_symbol))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{symbol}] Error streaming trades: {str(e)}")
+                await asyncio.sleep(5)
+
+    def watch(self, symbols):
+        # Stream the given symbols, most liquid first; streams for symbols no longer listed are stopped
+        wanted = list(dict.fromkeys(symbols))[:MAX_STREAMS]
+        for symbol in [s for s in self.tasks if s not in wanted]:
+            self.tasks.pop(symbol).cancel()
+            self.flows.pop(symbol, None)
+        for symbol in wanted:
+            if symbol not in self.tasks:
+                self.flows[symbol] = TradeFlow(symbol)
+                self.tasks[symbol] = asyncio.create_task(self._stream(symbol))
+        logger.info(f"Streaming trades for {len(self.tasks)} symbols")
+
+    async def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.flows.clear()
+        await self.streams.close()
+
+trade_flow = TradeFlowManager()
+
+def attach_trade_flow(df: pd.DataFrame, symbol: str, timeframe: str = FLOW_TIMEFRAME) -> pd.DataFrame:
+    # Adds the flow columns to an indicator frame of the streamed timeframe; other frames are returned unchanged
+    flow = trade_flow.flows.get(symbol)
+    if flow is None or timeframe != FLOW_TIMEFRAME or df is None:
+        return df
+    try:
+        df = df.copy()
+        columns = flow.frame(df['timestamp'].to_numpy())
+        for name in FLOW_COLUMNS:
+            df[name] = columns[name].to_numpy()
+        return df
+    except Exception as e:
+        logger.error(f"[{symbol}] Error attaching trade flow: {str(e)}")
+        return df
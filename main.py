@@ -1,25 +1,30 @@
-import telegram
 import asyncio
 import pandas as pd
 import os
 import pytz
-import requests
-import numpy as np
 from datetime import datetime, timedelta
 from telegram.ext import Application, CommandHandler
 from telegram.error import TelegramError
 from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
 from typing import Set, Dict
-import ccxt.async_support as ccxt
 from dotenv import load_dotenv
 from utils.logger import logger
-from utils.helpers import get_timestamp, format_timestamp, is_cooldown_active, scan_pause
-from model.predictor import SignalPredictor
-from telebot.sender import send_signal, update_signal_log
+from model.calibration import calibrator
+from telebot.command_cache import command_cache
 from telebot.report_generator import generate_daily_summary
-from data.collector import fetch_realtime_data
-from core.indicators import calculate_indicators
-from core.multi_timeframe import check_multi_timeframe_agreement
+from telebot.dispatcher import get_dispatcher, PRIORITY_ALERT
+from telebot.webhook import webhook_enabled, mount_webhook, start_webhook
+from api.routes import register_api
+from data.exchanges import fetch_listings, assign_venues, close_adapters, venue_for
+from core.sharding import Coordinator
+from data.cooldown_store import cooldowns
+from core.correlation import correlation_matrix
+from core.pipeline import pipeline, MIN_VOLUME
+from core.paper_trading import paper_trader, PAPER_TRADING
+from data.market_context import market_context
+from data.orderbook import order_books
+from data.trade_flow import trade_flow
 import uvicorn
 
 load_dotenv()
@@ -28,16 +33,27 @@ CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', '')
 API_KEY = os.getenv('BINANCE_API_KEY')
 API_SECRET = os.getenv('BINANCE_API_SECRET')
 PORT = int(os.getenv('PORT', 8080))
-MIN_VOLUME = 500_000
-MAX_SIGNALS_PER_MINUTE = 10
 CYCLE_INTERVAL = 300
-BATCH_SIZE = 5
-COOLDOWN = 4 * 3600
+# Scanner processes; above 1 the universe is sharded over worker processes (core.sharding)
+SCANNER_WORKERS = int(os.getenv('SCANNER_WORKERS', 1))
 
 scanned_symbols: Set[str] = set()
-last_signal_time: Dict[str, datetime] = {}
-
-app = FastAPI()
+quote_volumes: Dict[str, float] = {}
+application = None
+coordinator = None
+
+@asynccontextmanager
+async def lifespan(app):
+    # Run the scanner and Telegram bot inside uvicorn's loop so `uvicorn main:app` starts everything
+    task = asyncio.create_task(start_bot())
+    yield
+    # Cancelling runs start_bot's cleanup; wait for it so streams and workers are closed before exit
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+app = FastAPI(lifespan=lifespan)
+register_api(app)
 
 @app.get("/")
 async def root():
@@ -53,102 +69,35 @@ def format_timestamp_to_pk(utc_timestamp_str):
         logger.error(f"Error converting timestamp: {str(e)}")
         return utc_timestamp_str
 
-def determine_leverage(indicators):
-    score = 0
-    if isinstance(indicators, str):
-        indicators = indicators.split(', ')
-    if 'MACD' in indicators:
-        score += 2
-    if 'Strong Trend' in indicators:
-        score += 2
-    if 'VWAP' in indicators:
-        score += 1
-    if 'Stochastic' in indicators:
-        score -= 1
-    return '40x' if score >= 5 else '30x' if score >= 3 else '20x' if score >= 1 else '10x'
-
-def get_24h_volume(symbol):
-    try:
-        symbol_clean = symbol.replace('/', '').upper()
-        url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={symbol_clean}"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        quote_volume = float(data.get('quoteVolume', 0))
-        return quote_volume, f"${quote_volume:,.2f}"
-    except Exception as e:
-        logger.error(f"Error fetching volume for {symbol}: {str(e)}")
-        return 0, '$0.00'
-
-async def fetch_usdt_pairs(exchange):
+async def fetch_usdt_pairs():
     try:
-        markets = await exchange.load_markets()
-        symbols = [symbol for symbol in markets if symbol.endswith('USDT')]
-        high_volume_symbols = []
-        for symbol in symbols:
-            volume, _ = get_24h_volume(symbol)
-            if volume > MIN_VOLUME:
-                high_volume_symbols.append(symbol)
+        # One bulk ticker request per scan venue; each symbol is then fetched from one venue listing it
+        listings = await fetch_listings()
+        if not listings:
+            raise RuntimeError("no scan venue reachable")
+        quote_volumes.clear()
+        quote_volumes.update(assign_venues(listings))
+        high_volume_symbols = [s for s, volume in quote_volumes.items() if volume > MIN_VOLUME]
         logger.info(f"Found {len(high_volume_symbols)} USDT pairs with volume > ${MIN_VOLUME:,}")
         return high_volume_symbols
     except Exception as e:
         logger.error(f"Error fetching USDT pairs: {str(e)}")
-        bot = telegram.Bot(token=BOT_TOKEN)
-        await bot.send_message(chat_id=CHAT_ID, text=f"⚠ Binance API error: {str(e)}")
+        get_dispatcher().enqueue(f"⚠ Exchange API error: {str(e)}", priority=PRIORITY_ALERT, coalesce=False)
         return []
 
-async def process_symbol(exchange, symbol):
-    try:
-        logger.info(f"[{symbol}] Scanning for signal")
-        current_time = datetime.now(pytz.UTC)
-        if is_cooldown_active(symbol, last_signal_time, COOLDOWN):
-            logger.info(f"[{symbol}] In cooldown")
-            return None
-
-        volume, volume_str = get_24h_volume(symbol)
-        if volume < MIN_VOLUME:
-            logger.info(f"[{symbol}] Low volume: {volume_str}")
-            return None
-
-        ticker = await exchange.fetch_ticker(symbol)
-        if ticker['quoteVolume'] < MIN_VOLUME:
-            logger.info(f"[{symbol}] Low ticker volume: ${ticker['quoteVolume']:.2f}")
-            return None
-
-        timeframes = ['15m', '1h', '4h', '1d']
-        ohlcv_data = []
-        for tf in timeframes:
-            ohlcv = await fetch_realtime_data(symbol, tf, limit=50)
-            if ohlcv is None or len(ohlcv) < 30:
-                logger.warning(f"[{symbol}] Insufficient data for {tf}")
-                return None
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']).astype(np.float32)
-            df = calculate_indicators(df)
-            ohlcv_data.append(df)
-
-        predictor = SignalPredictor()
-        signal = await predictor.predict_signal(symbol, ohlcv_data[0], '15m')
-        if not signal or signal['confidence'] < 70.0:
-            logger.info(f"[{symbol}] No signal or low confidence")
-            return None
+async def scan_local(universe, market):
+    # Single-process cycle: every stage of the pipeline runs here and signals are sent as they come through
+    await pipeline.run_cycle(universe, market, quote_volumes)
 
-        if signal['tp1'] == signal['tp2'] == signal['tp3'] == signal['entry']:
-            logger.info(f"[{symbol}] Identical TP/entry values")
-            return None
-
-        if not await check_multi_timeframe_agreement(symbol, signal['direction'], timeframes):
-            logger.info(f"[{symbol}] No multi-timeframe agreement")
-            return None
-
-        signal['quote_volume_24h'] = volume_str
-        signal['leverage'] = determine_leverage(signal['conditions'])
-        logger.info(f"[{symbol}] Signal generated: {signal['direction']}, Confidence: {signal['confidence']:.2f}%")
-        update_signal_log(symbol, signal, 'pending')
-        await send_signal(symbol, signal, CHAT_ID)
-        last_signal_time[symbol] = current_time
-        return signal
-    except Exception as e:
-        logger.error(f"[{symbol}] Error processing: {str(e)}")
-        return None
+async def scan_sharded(universe, market):
+    # Coordinator side of a sharded cycle: workers scan, this process de-duplicates and sends
+    assignments = {s: (venue_for(s), quote_volumes.get(s, 0)) for s in universe}
+    signals, closes = await coordinator.scan(universe, market, assignments, calibrator.counts)
+    if closes:
+        closes = pd.concat(closes, ignore_index=True)
+        correlation_matrix.update(closes['closed_time'].max(), closes['symbol'], closes['closed_close'])
+    if signals:
+        await pipeline.dispatch(signals, [])
 
 async def start(update, context):
     try:
@@ -183,67 +132,22 @@ async def test(update, context):
 
 async def status(update, context):
     try:
-        bot = telegram.Bot(token=BOT_TOKEN)
-        bot_info = await bot.get_me()
-        status_text = (
-            f"🟬 Bot running\n"
-            f"🤖 @{bot_info.username}\n"
-            f"📡 Symbols scanned: {len(scanned_symbols)}\n"
-            f"📈 Active signals: {len(last_signal_time)}"
-        )
-        await update.message.reply_text(status_text, parse_mode='Markdown')
+        await update.message.reply_text(command_cache.reply('status', 'Status not available yet.'))
         logger.info('Status command executed')
     except Exception as e:
         logger.error(f"Error in status: {str(e)}")
 
 async def signal(update, context):
+    # Replies with the message rendered when the latest signal was generated
     try:
-        if not hasattr(update_signal_log, 'signals_data') or not update_signal_log.signals_data:
-            await update.message.reply_text('No signals available.')
-            return
-        latest_signal = update_signal_log.signals_data[-1]
-        conditions_str = ', '.join(latest_signal['conditions'])
-        volume, volume_str = get_24h_volume(latest_signal['symbol'])
-        if volume < MIN_VOLUME:
-            logger.warning(f"[{latest_signal['symbol']}] Low volume: {volume_str}")
-            await update.message.reply_text('Insufficient signal volume.')
-            return
-
-        latest_signal['leverage'] = determine_leverage(latest_signal['conditions'])
-        latest_signal['quote_volume_24h'] = volume_str
-        latest_signal['timestamp'] = format_timestamp_to_pk(latest_signal['timestamp'])
-
-        message = (
-            f"📈 Trading Signal\n"
-            f"💱 Symbol: {latest_signal['symbol']}\n"
-            f"📊 Direction: {latest_signal['direction']}\n"
-            f"⏰ Timeframe: {latest_signal['timeframe']}\n"
-            f"⏳ Duration: {latest_signal['trade_duration']}\n"
-            f"💰 Entry: ${latest_signal['entry_price']:.2f}\n"
-            f"🎯 TP1: ${latest_signal['tp1']:.2f} ({latest_signal['tp1_possibility']:.2f}%)\n"
-            f"🎯 TP2: ${latest_signal['tp2']:.2f} ({latest_signal['tp2_possibility']:.2f}%)\n"
-            f"🎯 TP3: ${latest_signal['tp3']:.2f} ({latest_signal['tp3_possibility']:.2f}%)\n"
-            f"🛑 SL: ${latest_signal['sl']:.2f}\n"
-            f"🔍 Confidence: {latest_signal['confidence']:.2f}%\n"
-            f"⚡ Type: {latest_signal['trade_type']}\n"
-            f"⚖ Leverage: {latest_signal.get('leverage', 'N/A')}\n"
-            f"📈 Volume: ${latest_signal['volume']:,.2f}\n"
-            f"📈 24h Volume: ${latest_signal['quote_volume_24h']}\n"
-            f"🔎 Indicators: {conditions_str}\n"
-            f"🕒 Timestamp: {latest_signal['timestamp']}"
-        )
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text(command_cache.reply('signal'))
         logger.info('Signal command executed')
     except Exception as e:
         logger.error(f"Error handling signal: {str(e)}")
 
 async def summary(update, context):
     try:
-        report = await generate_daily_summary()
-        if report:
-            await update.message.reply_text(report, parse_mode='Markdown')
-        else:
-            await update.message.reply_text('No signals available.')
+        await update.message.reply_text(command_cache.reply('summary'))
         logger.info('Summary command executed')
     except Exception as e:
         logger.error(f"Error in summary: {str(e)}")
@@ -259,26 +163,53 @@ async def report(update, context):
     except Exception as e:
         logger.error(f"Error in report: {str(e)}")
 
+async def _shutdown_step(name: str, action):
+    # One cleanup step; a failure is logged so the remaining steps still run
+    try:
+        await action()
+    except Exception as e:
+        logger.error(f"Error shutting down {name}: {str(e)}")
+
+async def _stop_telegram():
+    global application
+    if application is None:
+        return
+    if application.updater is not None and application.updater.running:
+        await _shutdown_step("Telegram updater", application.updater.stop)
+    if application.running:
+        await _shutdown_step("Telegram application", application.stop)
+    await _shutdown_step("Telegram application shutdown", application.shutdown)
+    application = None
+
+async def _stop_coordinator():
+    global coordinator
+    if coordinator is not None:
+        await asyncio.to_thread(coordinator.stop)
+        coordinator = None
+
+async def shutdown():
+    # Sends what is still queued for Telegram, stops the bot and the scanner workers,
+    # flushes paper trades and closes every stream and exchange client
+    await _shutdown_step("Telegram queue", lambda: get_dispatcher().flush())
+    await _stop_telegram()
+    await _shutdown_step("scanner workers", _stop_coordinator)
+    await _shutdown_step("paper trading", paper_trader.close)
+    await _shutdown_step("order book streams", order_books.close)
+    await _shutdown_step("trade flow streams", trade_flow.close)
+    await _shutdown_step("exchanges", close_adapters)
+
 async def start_bot():
-    global application, last_signal_time
+    global application, coordinator
     try:
         if not API_KEY or not API_SECRET:
             logger.error("Binance API key/secret missing")
-            bot = telegram.Bot(token=BOT_TOKEN)
-            await bot.send_message(chat_id=CHAT_ID, text="⚠️ API key/secret missing")
+            dispatcher = get_dispatcher(BOT_TOKEN, CHAT_ID)
+            dispatcher.enqueue("⚠️ API key/secret missing", priority=PRIORITY_ALERT, coalesce=False)
+            await dispatcher.flush()
             return
 
-        exchange = ccxt.binance({
-            'apiKey': API_KEY,
-            'secret': API_SECRET,
-            'enableRateLimit': True
-        })
-
-        last_signal_time = {}
-        signal_count = 0
-        last_signal_minute = get_timestamp() // 60
-
-        application = Application.builder().token(BOT_TOKEN).build()
+        # Commands and outbound messages share the dispatcher's Bot session
+        application = Application.builder().bot(get_dispatcher(BOT_TOKEN, CHAT_ID).bot).build()
         application.add_handler(CommandHandler('start', start))
         application.add_handler(CommandHandler('help', help))
         application.add_handler(CommandHandler('test', test))
@@ -288,58 +219,58 @@ async def start_bot():
         application.add_handler(CommandHandler('report', report))
         await application.initialize()
         await application.start()
-        await application.updater.start_polling(allowed_updates=["message"])
+        command_cache.start(application.bot)
+        # Seed TP possibilities from resolved signals before the first scan
+        await asyncio.to_thread(calibrator.load)
+        if PAPER_TRADING:
+            paper_trader.start()
+        if SCANNER_WORKERS > 1:
+            coordinator = Coordinator(SCANNER_WORKERS)
+            coordinator.start()
+        if webhook_enabled():
+            mount_webhook(app, application)
+            await start_webhook(application)
+        else:
+            await application.bot.delete_webhook()
+            await application.updater.start_polling(allowed_updates=["message"])
 
         while True:
             try:
-                symbols = await fetch_usdt_pairs(exchange)
+                symbols = await fetch_usdt_pairs()
                 if not symbols:
                     logger.warning("No USDT pairs, retrying in 60s")
                     await asyncio.sleep(60)
                     continue
 
                 logger.info(f"Starting scan cycle for {len(symbols)} symbols")
-                for i in range(0, len(symbols), BATCH_SIZE):
-                    batch = symbols[i:i + BATCH_SIZE]
-                    logger.debug(f"Processing batch: {batch}")
-                    tasks = [process_symbol(exchange, symbol) for symbol in batch if not is_cooldown_active(symbol, last_signal_time, COOLDOWN)]
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    scanned_symbols.update(batch)
-
-                    valid_signals = [r for r in results if r and not isinstance(r, Exception)]
-                    if valid_signals:
-                        current_time = get_timestamp()
-                        current_minute = current_time // 60
-
-                        if current_minute > last_signal_minute:
-                            signal_count = 0
-                            last_signal_minute = current_minute
-
-                        if signal_count >= MAX_SIGNALS_PER_MINUTE:
-                            logger.info("Max signals limit reached for this minute")
-                            continue
-
-                        signal_count += len(valid_signals)
-                        logger.info(f"Processed {len(valid_signals)} signals in batch")
-
-                    await asyncio.sleep(5)
+                # One cooldown lookup for the whole universe; symbols that signalled recently are not rescanned
+                cooldowns.purge()
+                cooling = cooldowns.active_symbols(symbols)
+                universe = [s for s in symbols if s not in cooling]
+                # BTC context is computed once per candle and shared by every prediction this cycle
+                market = await market_context.get_snapshot()
+                scanned_symbols.update(universe)
+                command_cache.update_scan_state(len(scanned_symbols), cooldowns.count_active())
+                if coordinator is not None:
+                    await scan_sharded(universe, market)
+                else:
+                    await scan_local(universe, market)
 
                 scanned_symbols.clear()
                 logger.info("Scan cycle completed, pausing for 5 minutes")
-                await scan_pause(CYCLE_INTERVAL)
+                await asyncio.sleep(CYCLE_INTERVAL)
 
             except Exception as e:
                 logger.error(f"Main loop error: {str(e)}")
                 await asyncio.sleep(60)
 
-        await exchange.close()
-
     except Exception as e:
         logger.error(f"Bot startup error: {str(e)}")
         await asyncio.sleep(60)
         raise
+    finally:
+        # Also runs when the task is cancelled on shutdown, which the except above does not catch
+        await shutdown()
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.create_task(start_bot())
     uvicorn.run(app, host="0.0.0.0", port=PORT, workers=1)
@@ -0,0 +1,80 @@
+# Measured TP1/TP2/TP3 probabilities for outgoing signals
+# Resolved outcomes are counted per (confidence bucket, timeframe, condition set); a lookup walks from the
+# most specific level to the coarsest one with enough samples and blends it with the old hand-set prior
+from report.analytics import outcome_counts, CONFIDENCE_BUCKET
+from model.signal import Signal, STATUS_PENDING, SUCCESS_STATUSES, STATUS_TP2, STATUS_TP3
+from utils.logger import logger
+
+MIN_SAMPLES = 30  # resolved signals a level needs before it is trusted over a coarser one
+PRIOR_WEIGHT = 20  # pseudo-observations given to the prior
+HIGH_CONFIDENCE = 75
+
+def prior_possibilities(confidence: float) -> tuple:
+    # The fixed values the predictor used before calibration existed
+    if confidence > HIGH_CONFIDENCE:
+        return (70.0, 50.0, 30.0)
+    return (60.0, 40.0, 20.0)
+
+class Calibrator:
+    def __init__(self, min_samples: int = MIN_SAMPLES, prior_weight: float = PRIOR_WEIGHT, bucket: int = CONFIDENCE_BUCKET):
+        self.min_samples = min_samples
+        self.prior_weight = prior_weight
+        self.bucket = bucket
+        # key -> [resolved, tp1 hits, tp2 hits, tp3 hits]
+        self.counts = {}
+        self.loaded = False
+
+    def _keys(self, confidence: float, timeframe: str, flags: int) -> tuple:
+        # Most specific first
+        bucket = int(confidence // self.bucket * self.bucket)
+        return ((bucket, timeframe, int(flags)), (bucket, timeframe), (bucket,))
+
+    def add(self, confidence: float, timeframe: str, flags: int, resolved: int, tp1: int, tp2: int, tp3: int):
+        for key in self._keys(confidence, timeframe, flags):
+            counts = self.counts.setdefault(key, [0, 0, 0, 0])
+            counts[0] += resolved
+            counts[1] += tp1
+            counts[2] += tp2
+            counts[3] += tp3
+
+    def record(self, signal: Signal):
+        # Called once when a tracker resolves a signal
+        if signal.status == STATUS_PENDING:
+            return
+        self.add(
+            signal.confidence, signal.timeframe, signal.condition_flags, 1,
+            int(signal.status in SUCCESS_STATUSES),
+            int(signal.status in (STATUS_TP2, STATUS_TP3)),
+            int(signal.status == STATUS_TP3)
+        )
+
+    def lookup(self, confidence: float, timeframe: str, flags: int = 0) -> tuple:
+        # Calibrated (tp1, tp2, tp3) possibilities in %, the prior while there is no history
+        prior = prior_possibilities(confidence)
+        counts = None
+        for key in self._keys(confidence, timeframe, flags):
+            counts = self.counts.get(key, counts)
+            if counts is not None and counts[0] >= self.min_samples:
+                break
+        if counts is None:
+            return prior
+        resolved = counts[0] + self.prior_weight
+        return tuple(
+            (hits + p / 100 * self.prior_weight) / resolved * 100
+            for hits, p in zip(counts[1:], prior)
+        )
+
+    def load(self, start=None, end=None):
+        # Seed the counts from the signal log and archives; replaces anything counted so far
+        try:
+            table = outcome_counts(start, end, self.bucket)
+            self.counts = {}
+            for row in table.iter_rows(named=True):
+                self.add(row['confidence_bucket'], row['timeframe'], row['condition_flags'],
+                         row['resolved'], row['tp1_hit'], row['tp2_hit'], row['tp3_hit'])
+            self.loaded = True
+            logger.info(f"Calibration loaded from {int(table['resolved'].sum()) if len(table) else 0} resolved signals")
+        except Exception as e:
+            logger.error(f"Error loading calibration: {str(e)}")
+
+calibrator = Calibrator()
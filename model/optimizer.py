@@ -0,0 +1,137 @@
+# Parameter search for the predictor's rule set over historical candles
+# Indicators, support/resistance and candle patterns are computed once per symbol; each parameter set
+# only recompiles the rules and re-evaluates the masks, spread over a pool of worker processes
+import asyncio
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from model.rules import compile_rules, merge_rules
+from data.backtesting import prepare_history, simulate, STATUSES, TP1_HIT, TP2_HIT, TP3_HIT, SL_HIT
+from data.collector import fetch_realtime_data
+from utils.logger import logger
+
+# Values tried per parameter; keys follow model.rules.merge_rules naming
+PARAM_SPACE = {
+    'rsi_oversold': [36, 38, 40, 42, 44],
+    'rsi_overbought': [56, 58, 60, 62, 64],
+    'adx_min': [12, 15, 18, 20, 25],
+    'min_conditions': [3, 4, 5, 6],
+    'weight_macd': [10, 15, 20],
+    'weight_volume': [5, 10, 15],
+    'weight_support_resistance': [5, 10, 15],
+    'tp1_atr': [0.5, 0.75, 1.0],
+    'sl_atr': [0.6, 0.8, 1.0, 1.2]
+}
+WARMUP_CANDLES = 200  # MA200 needs this much history, as in the live predictor
+MIN_SIGNALS = 30  # parameter sets with fewer signals are ranked after all others
+MIN_CONFIDENCE = 70.0  # same confidence gate the scan pipeline applies before sending
+RESULTS_PATH = "logs/optimizer_results.csv"
+
+def grid_search(space: dict = None) -> list:
+    # Every combination of the space; fine for a few parameters, explodes quickly beyond that
+    space = space or PARAM_SPACE
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+def random_search(space: dict = None, n_iter: int = 200, seed: int = None) -> list:
+    # n_iter distinct random combinations of the space
+    space = space or PARAM_SPACE
+    rng = random.Random(seed)
+    total = int(np.prod([len(v) for v in space.values()]))
+    seen = set()
+    params = []
+    while len(params) < min(n_iter, total):
+        candidate = tuple((key, rng.choice(values)) for key, values in space.items())
+        if candidate not in seen:
+            seen.add(candidate)
+            params.append(dict(candidate))
+    return params
+
+# Prepared histories of the current worker process, set once by the pool initializer
+_histories = {}
+
+def _init_worker(histories: dict):
+    global _histories
+    _histories = histories
+
+def score_params(params: dict, histories: dict = None, min_confidence: float = MIN_CONFIDENCE) -> dict:
+    # Hit rates and expectancy of one parameter set across all symbols
+    histories = histories if histories is not None else _histories
+    rules = compile_rules(merge_rules(params))
+    statuses, pnls, confidences = [], [], []
+    for history in histories.values():
+        outcome = simulate(history, rules, start=WARMUP_CANDLES - 1)
+        keep = outcome['confidence'] >= min_confidence
+        statuses.append(outcome['status'][keep])
+        pnls.append(outcome['pnl'][keep])
+        confidences.append(outcome['confidence'][keep])
+    status = np.concatenate(statuses) if statuses else np.zeros(0, dtype=np.int8)
+    pnl = np.concatenate(pnls) if pnls else np.zeros(0)
+    total = len(status)
+    score = dict(params)
+    score['signals'] = total
+    counts = np.bincount(status, minlength=len(STATUSES)) if total else np.zeros(len(STATUSES), dtype=int)
+    for code, name in enumerate(STATUSES):
+        score[name] = int(counts[code])
+    score['hit_rate'] = float(np.isin(status, (TP1_HIT, TP2_HIT, TP3_HIT)).mean() * 100) if total else 0.0
+    score['sl_rate'] = float((status == SL_HIT).mean() * 100) if total else 0.0
+    score['expectancy'] = float(pnl.mean()) if total else 0.0
+    score['avg_confidence'] = float(np.concatenate(confidences).mean()) if total else 0.0
+    return score
+
+def rank_results(scores: list, min_signals: int = MIN_SIGNALS) -> pd.DataFrame:
+    # Best expectancy first, hit rate as tie-breaker; thin samples go to the bottom
+    ranked = pd.DataFrame(scores)
+    if ranked.empty:
+        return ranked
+    ranked['enough_signals'] = ranked['signals'] >= min_signals
+    ranked = ranked.sort_values(['enough_signals', 'expectancy', 'hit_rate'], ascending=False, kind='stable')
+    return ranked.reset_index(drop=True)
+
+def optimize(histories: dict, param_sets: list, workers: int = None, min_signals: int = MIN_SIGNALS) -> pd.DataFrame:
+    # Score every parameter set in parallel; histories are shipped to each worker once
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Optimizer: {len(param_sets)} parameter sets over {len(histories)} symbols with {workers} workers")
+    if workers == 1:
+        scores = [score_params(params, histories) for params in param_sets]
+    else:
+        chunksize = max(1, len(param_sets) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(histories,)) as pool:
+            scores = list(pool.map(score_params, param_sets, chunksize=chunksize))
+    return rank_results(scores, min_signals)
+
+async def load_histories(symbols: list, timeframe: str = "15m", limit: int = 1000, btc_trend: float = 0.0) -> dict:
+    # Fetch candles and precompute everything parameter-independent
+    histories = {}
+    for symbol in symbols:
+        df = await fetch_realtime_data(symbol, timeframe, limit=limit)
+        if df is None or len(df) < WARMUP_CANDLES + 10:
+            logger.warning(f"[{symbol}] Insufficient data for optimization")
+            continue
+        histories[symbol] = prepare_history(df, btc_trend)
+    return histories
+
+async def run_optimization(symbols: list, timeframe: str = "15m", limit: int = 1000, mode: str = "random",
+                           n_iter: int = 200, space: dict = None, workers: int = None, top: int = 10) -> pd.DataFrame:
+    # Fetch, search and save the ranked parameter sets to RESULTS_PATH
+    try:
+        histories = await load_histories(symbols, timeframe, limit)
+        if not histories:
+            logger.warning("Optimizer: no usable histories")
+            return pd.DataFrame()
+        param_sets = grid_search(space) if mode == "grid" else random_search(space, n_iter)
+        ranked = await asyncio.to_thread(optimize, histories, param_sets, workers)
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        ranked.to_csv(RESULTS_PATH, index=False)
+        logger.info(f"Optimizer results saved to {RESULTS_PATH}, best:\n{ranked.head(top).to_string()}")
+        return ranked
+    except Exception as e:
+        logger.error(f"Error running optimization: {str(e)}")
+        return pd.DataFrame()
+
+if __name__ == "__main__":
+    symbols = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "BNB/USDT", "XRP/USDT"]
+    asyncio.run(run_optimization(symbols))
@@ -0,0 +1,323 @@
+# Declarative signal rules for SignalPredictor
+# Thresholds, confidence weights and direction requirements live in a config dict that is compiled into
+# bitmasks and integer weight vectors; the same compiled rules score one live candle or a whole history
+import copy
+from collections import namedtuple
+from enum import IntFlag
+import numpy as np
+import pandas as pd
+from core.candle_patterns import (
+    is_bullish_engulfing, is_bearish_engulfing, is_doji,
+    is_hammer, is_shooting_star, is_three_white_soldiers, is_three_black_crows
+)
+
+class Condition(IntFlag):
+    OVERSOLD_RSI = 1 << 0
+    OVERBOUGHT_RSI = 1 << 1
+    NEUTRAL_RSI_TREND = 1 << 2
+    BULLISH_MACD = 1 << 3
+    BEARISH_MACD = 1 << 4
+    STRONG_TREND = 1 << 5
+    BEARISH_MA200 = 1 << 6
+    BULLISH_MA200 = 1 << 7
+    BULLISH_ENGULFING = 1 << 8
+    BEARISH_ENGULFING = 1 << 9
+    DOJI = 1 << 10
+    HAMMER = 1 << 11
+    SHOOTING_STAR = 1 << 12
+    THREE_WHITE_SOLDIERS = 1 << 13
+    THREE_BLACK_CROWS = 1 << 14
+    NEAR_SUPPORT = 1 << 15
+    NEAR_RESISTANCE = 1 << 16
+    HIGH_VOLUME = 1 << 17
+    TIGHT_SPREAD = 1 << 18
+    DEEP_BOOK = 1 << 19
+
+# Display names, unchanged from the strings the predictor used to build
+CONDITION_LABELS = {
+    Condition.OVERSOLD_RSI: "Oversold RSI",
+    Condition.OVERBOUGHT_RSI: "Overbought RSI",
+    Condition.NEUTRAL_RSI_TREND: "Neutral RSI with Strong Trend",
+    Condition.BULLISH_MACD: "Bullish MACD",
+    Condition.BEARISH_MACD: "Bearish MACD",
+    Condition.STRONG_TREND: "Strong Trend",
+    Condition.BEARISH_MA200: "Bearish MA200",
+    Condition.BULLISH_MA200: "Bullish MA200",
+    Condition.BULLISH_ENGULFING: "Bullish Engulfing",
+    Condition.BEARISH_ENGULFING: "Bearish Engulfing",
+    Condition.DOJI: "Doji",
+    Condition.HAMMER: "Hammer",
+    Condition.SHOOTING_STAR: "Shooting Star",
+    Condition.THREE_WHITE_SOLDIERS: "Three White Soldiers",
+    Condition.THREE_BLACK_CROWS: "Three Black Crows",
+    Condition.NEAR_SUPPORT: "Near Support",
+    Condition.NEAR_RESISTANCE: "Near Resistance",
+    Condition.HIGH_VOLUME: "High Volume",
+    Condition.TIGHT_SPREAD: "Tight Spread",
+    Condition.DEEP_BOOK: "Deep Book"
+}
+LABEL_CONDITIONS = {label: flag for flag, label in CONDITION_LABELS.items()}
+
+def condition_names(flags: int) -> list:
+    return [label for flag, label in CONDITION_LABELS.items() if flags & flag]
+
+def conditions_from_names(names) -> int:
+    # Convert condition strings (e.g. from older CSV logs) back to a bitset
+    if isinstance(names, str):
+        names = names.split(', ')
+    flags = 0
+    for name in names or []:
+        flags |= LABEL_CONDITIONS.get(str(name).strip(), 0)
+    return flags
+
+DEFAULT_RULES = {
+    'thresholds': {
+        'rsi_oversold': 42,
+        'rsi_overbought': 58,
+        'rsi_neutral_low': 45,
+        'rsi_neutral_high': 55,
+        'neutral_adx': 20,
+        'adx_min': 15,
+        'volume_multiplier': 1.05,
+        'sr_proximity': 0.1,
+        'min_conditions': 4,
+        'base_confidence': 40,
+        'min_direction_confidence': 40,
+        'btc_trend_limit': 5,
+        'btc_override_confidence': 80,
+        # Order-book conditions, only set when the live book is streamed (never in backtests)
+        'max_tight_spread_pct': 0.05,
+        'min_book_depth_usd': 50_000
+    },
+    # Each group adds its weight once when any of its conditions is present
+    'weights': {
+        'macd': (['BULLISH_MACD', 'BEARISH_MACD'], 15),
+        'reversal_pattern': (['BULLISH_ENGULFING', 'BEARISH_ENGULFING', 'HAMMER', 'SHOOTING_STAR'], 10),
+        'trend': (['STRONG_TREND'], 8),
+        'support_resistance': (['NEAR_SUPPORT', 'NEAR_RESISTANCE'], 10),
+        'volume': (['HIGH_VOLUME'], 10),
+        'rsi': (['OVERSOLD_RSI', 'OVERBOUGHT_RSI'], 5),
+        'three_candles': (['THREE_WHITE_SOLDIERS', 'THREE_BLACK_CROWS'], 10),
+        'doji': (['DOJI'], 5),
+        'liquidity': (['TIGHT_SPREAD', 'DEEP_BOOK'], 5)
+    },
+    # TP/SL distance from entry: the larger of a fixed percentage and an ATR multiple
+    'targets': {
+        'tp1_pct': 0.005, 'tp1_atr': 0.5,
+        'tp2_pct': 0.015, 'tp2_atr': 1.0,
+        'tp3_pct': 0.03, 'tp3_atr': 2.0,
+        'sl_pct': 0.008, 'sl_atr': 0.8,
+        # TP1 outside this % range is reset to tp1_fallback_pct
+        'tp1_min_pct': 0.5, 'tp1_max_pct': 3.0, 'tp1_fallback_pct': 0.015
+    },
+    # any: at least one present, require: all present, forbid: none present,
+    # veto: any of these combinations fully present rejects the signal
+    'directions': {
+        'LONG': {
+            'any': ['BULLISH_MACD', 'OVERSOLD_RSI', 'BULLISH_ENGULFING', 'HAMMER', 'NEAR_SUPPORT', 'THREE_WHITE_SOLDIERS'],
+            'require': ['BULLISH_MACD'],
+            'forbid': ['BEARISH_MA200'],
+            'veto': [['OVERBOUGHT_RSI', 'NEAR_RESISTANCE']]
+        },
+        'SHORT': {
+            'any': ['BEARISH_MACD', 'OVERBOUGHT_RSI', 'BEARISH_ENGULFING', 'SHOOTING_STAR', 'NEAR_RESISTANCE', 'THREE_BLACK_CROWS'],
+            'require': ['BEARISH_MACD'],
+            'forbid': ['BULLISH_MA200'],
+            'veto': []
+        }
+    }
+}
+
+# Rejection reasons, in the order the predictor checks them
+REJECT_NONE = 0
+REJECT_NEUTRAL_RSI = 1
+REJECT_WEAK_TREND = 2
+REJECT_FEW_CONDITIONS = 3
+REJECT_VETO = 4
+REJECT_BTC_TREND = 5
+REJECT_NO_DIRECTION = 6
+
+RuleResult = namedtuple('RuleResult', ['conditions', 'condition_count', 'confidence', 'direction', 'reject'])
+
+def merge_rules(overrides: dict = None, base: dict = None) -> dict:
+    # Copy of the rule config with overrides applied
+    # Flat keys are routed by name: 'weight_<group>' sets a group weight, target keys go to targets,
+    # anything else is a threshold; nested 'thresholds'/'targets'/'weights'/'directions' dicts also work
+    config = copy.deepcopy(base or DEFAULT_RULES)
+    for key, value in (overrides or {}).items():
+        if key in ('thresholds', 'targets'):
+            config[key].update(value)
+        elif key in ('weights', 'directions'):
+            config[key] = copy.deepcopy(value)
+        elif key.startswith('weight_'):
+            conditions, _ = config['weights'][key[len('weight_'):]]
+            config['weights'][key[len('weight_'):]] = (conditions, value)
+        elif key in config['targets']:
+            config['targets'][key] = value
+        else:
+            config['thresholds'][key] = value
+    return config
+
+def target_levels(sign, entry, atr, targets: dict = None) -> dict:
+    # TP/SL prices for scalars or arrays; sign is +1 for LONG and -1 for SHORT
+    t = targets or DEFAULT_RULES['targets']
+    sign = np.asarray(sign, dtype=np.float64)
+    entry = np.asarray(entry, dtype=np.float64)
+    atr = np.asarray(atr, dtype=np.float64)
+    levels = {}
+    for name in ('tp1', 'tp2', 'tp3'):
+        levels[name] = entry + sign * np.maximum(t[f'{name}_pct'] * entry, t[f'{name}_atr'] * atr)
+    levels['sl'] = entry - sign * np.maximum(t['sl_pct'] * entry, t['sl_atr'] * atr)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tp1_percent = np.abs(levels['tp1'] - entry) / entry * 100
+    levels['tp1_adjusted'] = ~((tp1_percent >= t['tp1_min_pct']) & (tp1_percent <= t['tp1_max_pct']))
+    levels['tp1'] = np.where(levels['tp1_adjusted'], entry + sign * t['tp1_fallback_pct'] * entry, levels['tp1'])
+    return levels
+
+def _mask(names) -> int:
+    flags = 0
+    for name in names:
+        flags |= Condition[name]
+    return int(flags)
+
+def _column(df: pd.DataFrame, name: str, default: float = np.nan) -> np.ndarray:
+    if name in df.columns:
+        return df[name].to_numpy(dtype=np.float64)
+    return np.full(len(df), default)
+
+def _pattern(func, df: pd.DataFrame) -> np.ndarray:
+    values = func(df)
+    return np.asarray(pd.Series(values, dtype='object').fillna(False).to_numpy(), dtype=bool)
+
+def pattern_masks(df: pd.DataFrame) -> dict:
+    # Candle patterns do not depend on any threshold, so callers scoring many rule sets
+    # over the same frame can compute them once and pass them in the context
+    return {
+        Condition.BULLISH_ENGULFING: _pattern(is_bullish_engulfing, df),
+        Condition.BEARISH_ENGULFING: _pattern(is_bearish_engulfing, df),
+        Condition.DOJI: _pattern(is_doji, df),
+        Condition.HAMMER: _pattern(is_hammer, df),
+        Condition.SHOOTING_STAR: _pattern(is_shooting_star, df),
+        Condition.THREE_WHITE_SOLDIERS: _pattern(is_three_white_soldiers, df),
+        Condition.THREE_BLACK_CROWS: _pattern(is_three_black_crows, df)
+    }
+
+class CompiledRules:
+    def __init__(self, config: dict = None):
+        self.config = config or DEFAULT_RULES
+        self.thresholds = self.config['thresholds']
+        self.targets = self.config['targets']
+        groups = list(self.config['weights'].values())
+        self.group_masks = np.array([_mask(names) for names, _ in groups], dtype=np.int64)
+        self.group_weights = np.array([weight for _, weight in groups], dtype=np.int64)
+        self.directions = []
+        for sign, name in ((1, 'LONG'), (-1, 'SHORT')):
+            spec = self.config['directions'][name]
+            self.directions.append((
+                sign, name,
+                _mask(spec.get('any', [])),
+                _mask(spec.get('require', [])),
+                _mask(spec.get('forbid', [])),
+                [_mask(combo) for combo in spec.get('veto', [])]
+            ))
+
+    def condition_masks(self, df: pd.DataFrame, context: dict = None) -> dict:
+        # Boolean mask per condition over every row; context supplies support/resistance and order-book
+        # spread_pct/depth_usd (scalars or arrays)
+        context = context or {}
+        t = self.thresholds
+        close = _column(df, 'close')
+        rsi = _column(df, 'rsi')
+        adx = _column(df, 'adx')
+        macd = _column(df, 'macd')
+        macd_signal = _column(df, 'macd_signal')
+        ma200 = _column(df, 'ma200')
+        volume_sma = _column(df, 'volume_sma_20')
+        patterns = context.get('patterns') or pattern_masks(df)
+        support = np.broadcast_to(np.asarray(context.get('support', 0.0), dtype=np.float64), close.shape)
+        resistance = np.broadcast_to(np.asarray(context.get('resistance', 0.0), dtype=np.float64), close.shape)
+        # Order-book metrics of the latest book; missing ones leave both conditions unset
+        spread = np.broadcast_to(np.asarray(context.get('spread_pct', np.nan), dtype=np.float64), close.shape)
+        depth = np.broadcast_to(np.asarray(context.get('depth_usd', np.nan), dtype=np.float64), close.shape)
+
+        # RSI bands are exclusive in this order: oversold, overbought, neutral
+        oversold = rsi < t['rsi_oversold']
+        overbought = ~oversold & (rsi > t['rsi_overbought'])
+        neutral = ~oversold & ~overbought & (rsi >= t['rsi_neutral_low']) & (rsi <= t['rsi_neutral_high'])
+        # A missing ma50 counts as 0, as in the original predictor
+        neutral_trend = neutral & ((adx > t['neutral_adx']) | (close > _column(df, 'ma50', 0.0)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            near_support = np.abs(close - support) / close < t['sr_proximity']
+            near_resistance = np.abs(close - resistance) / close < t['sr_proximity']
+        return {
+            Condition.OVERSOLD_RSI: oversold,
+            Condition.OVERBOUGHT_RSI: overbought,
+            Condition.NEUTRAL_RSI_TREND: neutral_trend,
+            Condition.BULLISH_MACD: macd > macd_signal,
+            Condition.BEARISH_MACD: macd < macd_signal,
+            Condition.STRONG_TREND: adx > t['adx_min'],
+            Condition.BEARISH_MA200: close < ma200,
+            Condition.BULLISH_MA200: close > ma200,
+            **patterns,
+            Condition.NEAR_SUPPORT: near_support,
+            Condition.NEAR_RESISTANCE: near_resistance,
+            Condition.HIGH_VOLUME: _column(df, 'volume') > volume_sma * t['volume_multiplier'],
+            Condition.TIGHT_SPREAD: spread <= t['max_tight_spread_pct'],
+            Condition.DEEP_BOOK: depth >= t['min_book_depth_usd'],
+            '_neutral_rejected': neutral & ~neutral_trend
+        }
+
+    def evaluate(self, df: pd.DataFrame, context: dict = None) -> RuleResult:
+        # Score every row at once; context may also carry btc_trend (scalar or array) and precomputed patterns
+        context = context or {}
+        t = self.thresholds
+        masks = self.condition_masks(df, context)
+        neutral_rejected = masks.pop('_neutral_rejected')
+        conditions = np.zeros(len(df), dtype=np.int64)
+        count = np.zeros(len(df), dtype=np.int64)
+        for flag, mask in masks.items():
+            conditions |= mask.astype(np.int64) * int(flag)
+            count += mask
+        hits = (conditions[:, None] & self.group_masks[None, :]) != 0
+        confidence = np.clip(t['base_confidence'] + hits.astype(np.int64) @ self.group_weights, 0, 100).astype(np.float64)
+
+        btc_trend = np.broadcast_to(np.asarray(context.get('btc_trend', 0.0), dtype=np.float64), confidence.shape)
+        direction = np.zeros(len(df), dtype=np.int8)
+        vetoed = np.zeros(len(df), dtype=bool)
+        btc_blocked = np.zeros(len(df), dtype=bool)
+        undecided = np.ones(len(df), dtype=bool)
+        for sign, name, any_mask, require_mask, forbid_mask, vetoes in self.directions:
+            eligible = (
+                undecided
+                & ((conditions & any_mask) != 0)
+                & ((conditions & require_mask) == require_mask)
+                & ((conditions & forbid_mask) == 0)
+                & (confidence >= t['min_direction_confidence'])
+            )
+            for veto in vetoes:
+                vetoed |= eligible & ((conditions & veto) == veto)
+            # Strong BTC moves against the direction need high confidence
+            against_btc = (btc_trend < -t['btc_trend_limit']) if sign > 0 else (btc_trend > t['btc_trend_limit'])
+            btc_blocked |= eligible & against_btc & (confidence < t['btc_override_confidence'])
+            direction[eligible] = sign
+            undecided &= ~eligible
+
+        reject = np.full(len(df), REJECT_NONE, dtype=np.int8)
+        reject[direction == 0] = REJECT_NO_DIRECTION
+        reject[btc_blocked] = REJECT_BTC_TREND
+        reject[vetoed] = REJECT_VETO
+        reject[count < t['min_conditions']] = REJECT_FEW_CONDITIONS
+        reject[~masks[Condition.STRONG_TREND]] = REJECT_WEAK_TREND
+        reject[neutral_rejected] = REJECT_NEUTRAL_RSI
+        direction[reject != REJECT_NONE] = 0
+        return RuleResult(conditions, count, confidence, direction, reject)
+
+_compiled = {}
+
+def compile_rules(config: dict = None) -> CompiledRules:
+    # Compiled default rules are shared; custom configs (e.g. from the optimizer) compile on demand
+    if config is None:
+        if 'default' not in _compiled:
+            _compiled['default'] = CompiledRules(DEFAULT_RULES)
+        return _compiled['default']
+    return CompiledRules(config)
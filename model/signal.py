@@ -0,0 +1,144 @@
+# Compact signal record passed from the predictor to the sender, trackers, logger and reports
+# Conditions travel as a Condition bitset and are only turned into names for display; one row layout
+# (COLUMNS) is used for the CSV log and for reading it back
+import pandas as pd
+from model.rules import condition_names, conditions_from_names
+
+STATUS_PENDING = 'pending'
+STATUS_TP1 = 'tp1_hit'
+STATUS_TP2 = 'tp2_hit'
+STATUS_TP3 = 'tp3_hit'
+STATUS_SL = 'sl_hit'
+STATUSES = (STATUS_PENDING, STATUS_TP1, STATUS_TP2, STATUS_TP3, STATUS_SL)
+SUCCESS_STATUSES = (STATUS_TP1, STATUS_TP2, STATUS_TP3)
+STATUS_ALIASES = {
+    'tp1': STATUS_TP1, 'tp2': STATUS_TP2, 'tp3': STATUS_TP3, 'sl': STATUS_SL,
+    'tp1 hit': STATUS_TP1, 'tp2 hit': STATUS_TP2, 'tp3 hit': STATUS_TP3, 'sl hit': STATUS_SL
+}
+# Names older code and logs used for the entry price
+ENTRY_ALIASES = ('entry', 'price', 'entry_price')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def normalize_status(status) -> str:
+    # Trackers used to report statuses as tp1, TP1 Hit or tp1_hit; everything is stored as tp1_hit
+    if status is None or (isinstance(status, float) and pd.isna(status)):
+        return STATUS_PENDING
+    status = str(status).strip().lower() or STATUS_PENDING
+    return STATUS_ALIASES.get(status, status)
+
+def normalize_timestamp(timestamp) -> str:
+    return pd.Timestamp(timestamp if timestamp is not None else pd.Timestamp.now()).strftime(TIMESTAMP_FORMAT)
+
+def parse_leverage(leverage) -> int:
+    # Accepts 30, 30.0 and '30x'
+    try:
+        return int(float(str(leverage).strip().rstrip('x')))
+    except (TypeError, ValueError):
+        return 10
+
+class Signal:
+    # CSV column order; fib_levels is kept in memory only
+    COLUMNS = (
+        'symbol', 'direction', 'entry', 'tp1', 'tp2', 'tp3', 'sl', 'confidence', 'timeframe', 'trade_type',
+        'trade_duration', 'timestamp', 'tp1_possibility', 'tp2_possibility', 'tp3_possibility', 'condition_flags',
+        'volume', 'quote_volume_24h', 'leverage', 'btc_trend', 'ma200_status', 'macd_status', 'mtf_score',
+        'status', 'hit_timestamp'
+    )
+    __slots__ = COLUMNS + ('fib_levels',)
+    FLOAT_FIELDS = (
+        'entry', 'tp1', 'tp2', 'tp3', 'sl', 'confidence', 'tp1_possibility', 'tp2_possibility', 'tp3_possibility',
+        'volume', 'quote_volume_24h', 'btc_trend', 'mtf_score'
+    )
+
+    def __init__(self, symbol: str, direction: str, entry: float, tp1: float, tp2: float, tp3: float, sl: float,
+                 confidence: float, timeframe: str = '15m', condition_flags: int = 0, trade_type: str = 'Scalp',
+                 trade_duration: str = 'Unknown', timestamp=None, tp1_possibility: float = 0.0,
+                 tp2_possibility: float = 0.0, tp3_possibility: float = 0.0, volume: float = 0.0,
+                 quote_volume_24h: float = 0.0, leverage: int = 10, btc_trend: float = 0.0,
+                 ma200_status: str = 'unknown', macd_status: str = 'unknown', mtf_score: float = 0.0,
+                 status: str = STATUS_PENDING, hit_timestamp=None, fib_levels: dict = None):
+        self.symbol = symbol
+        self.direction = direction
+        self.entry = float(entry)
+        self.tp1 = float(tp1)
+        self.tp2 = float(tp2)
+        self.tp3 = float(tp3)
+        self.sl = float(sl)
+        self.confidence = float(confidence)
+        self.timeframe = timeframe
+        self.condition_flags = int(condition_flags)
+        self.trade_type = trade_type
+        self.trade_duration = trade_duration
+        self.timestamp = normalize_timestamp(timestamp)
+        self.tp1_possibility = float(tp1_possibility)
+        self.tp2_possibility = float(tp2_possibility)
+        self.tp3_possibility = float(tp3_possibility)
+        self.volume = float(volume)
+        self.quote_volume_24h = float(quote_volume_24h)
+        self.leverage = parse_leverage(leverage)
+        self.btc_trend = float(btc_trend)
+        self.ma200_status = ma200_status
+        self.macd_status = macd_status
+        self.mtf_score = float(mtf_score)
+        self.status = normalize_status(status)
+        self.hit_timestamp = hit_timestamp
+        self.fib_levels = fib_levels or {}
+
+    @property
+    def conditions(self) -> list:
+        return condition_names(self.condition_flags)
+
+    @property
+    def key(self) -> tuple:
+        # Identifies a signal across the log, the trackers and the command cache
+        return (self.symbol, self.timestamp)
+
+    def to_row(self) -> list:
+        return [getattr(self, column) for column in self.COLUMNS]
+
+    def to_dict(self) -> dict:
+        data = {column: getattr(self, column) for column in self.COLUMNS}
+        data['conditions'] = self.conditions
+        data['fib_levels'] = self.fib_levels
+        return data
+
+    @classmethod
+    def from_row(cls, row: dict) -> 'Signal':
+        # Build from a CSV/dict row, including logs written before this layout
+        row = {k: v for k, v in row.items() if not (isinstance(v, float) and pd.isna(v))}
+        entry = next((row[k] for k in ENTRY_ALIASES if k in row), 0.0)
+        flags = row.get('condition_flags')
+        if flags is None:
+            flags = conditions_from_names(row.get('conditions'))
+        kwargs = {k: row[k] for k in cls.COLUMNS if k in row and k not in ('entry', 'condition_flags')}
+        for field in cls.FLOAT_FIELDS:
+            if field in kwargs:
+                try:
+                    kwargs[field] = float(kwargs[field])
+                except (TypeError, ValueError):
+                    kwargs[field] = 0.0
+        for field in ('tp1', 'tp2', 'tp3', 'sl', 'confidence'):
+            kwargs.setdefault(field, 0.0)
+        kwargs.setdefault('symbol', '')
+        kwargs.setdefault('direction', '')
+        return cls(entry=entry, condition_flags=flags, fib_levels=row.get('fib_levels'), **kwargs)
+
+    def __repr__(self):
+        return f"Signal({self.symbol} {self.direction} {self.timeframe} @ {self.entry}, {self.confidence:.1f}%, {self.status})"
+
+def read_signal_log(path: str) -> pd.DataFrame:
+    # Signal log as a frame with the current column names and one row per signal
+    # Status updates are appended as new rows, so the last row of each signal wins
+    df = pd.read_csv(path)
+    if df.empty:
+        return df
+    if 'entry' not in df:
+        for alias in ENTRY_ALIASES[1:]:
+            if alias in df:
+                df = df.rename(columns={alias: 'entry'})
+                break
+    if 'status' in df:
+        df['status'] = df['status'].map(normalize_status)
+    if 'symbol' in df and 'timestamp' in df:
+        df = df.drop_duplicates(['symbol', 'timestamp'], keep='last')
+    return df.reset_index(drop=True)
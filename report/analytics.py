@@ -0,0 +1,244 @@
+# Columnar analytics over the signal log and its archives using polars lazy scans
+# Every query filters on the timestamp before anything is collected, so only the rows of the
+# requested range are materialised, whatever the size of the history
+import glob
+import os
+from datetime import datetime, timedelta
+import polars as pl
+from model.signal import normalize_status, TIMESTAMP_FORMAT, STATUS_ALIASES, STATUS_PENDING, STATUS_TP1, STATUS_TP2, STATUS_TP3, STATUS_SL, SUCCESS_STATUSES
+from utils.logger import logger, SIGNALS_LOG
+
+ARCHIVE_PATTERN = os.path.join("logs", "archive", "signals_log_*.csv")
+CONFIDENCE_BUCKET = 5  # width of a calibration bucket in confidence points
+# Columns the analytics need, with the type each is read as
+ANALYTICS_COLUMNS = {
+    'symbol': pl.Utf8,
+    'direction': pl.Utf8,
+    'entry': pl.Float64,
+    'confidence': pl.Float64,
+    'timeframe': pl.Utf8,
+    'timestamp': pl.Utf8,
+    'status': pl.Utf8,
+    'tp1_possibility': pl.Float64,
+    'tp2_possibility': pl.Float64,
+    'tp3_possibility': pl.Float64,
+    'condition_flags': pl.Int64,
+    'quote_volume_24h': pl.Float64,
+    'tp1': pl.Float64,
+    'tp2': pl.Float64,
+    'tp3': pl.Float64,
+    'sl': pl.Float64,
+    'leverage': pl.Int64,
+    'trade_type': pl.Utf8,
+    'mtf_score': pl.Float64,
+    'hit_timestamp': pl.Utf8
+}
+
+def signal_sources() -> list:
+    # Archived logs first so the live log's later status rows win the de-duplication
+    paths = sorted(glob.glob(ARCHIVE_PATTERN))
+    if os.path.exists(SIGNALS_LOG):
+        paths.append(SIGNALS_LOG)
+    return paths
+
+def _scan_file(path: str) -> pl.LazyFrame:
+    # Old logs used 'price' for the entry and lack some columns; every file is brought to one schema
+    lf = pl.scan_csv(path, infer_schema=False)
+    names = lf.collect_schema().names()
+    if 'entry' not in names and 'price' in names:
+        lf = lf.rename({'price': 'entry'})
+        names = [('entry' if n == 'price' else n) for n in names]
+    return lf.select([
+        (pl.col(name) if name in names else pl.lit(None)).cast(dtype, strict=False).alias(name)
+        for name, dtype in ANALYTICS_COLUMNS.items()
+    ])
+
+def scan_signals(start=None, end=None) -> pl.LazyFrame:
+    # Lazy frame of signals with start <= timestamp < end, one row per signal with its latest status
+    paths = signal_sources()
+    if not paths:
+        return pl.LazyFrame(schema={**ANALYTICS_COLUMNS, 'timestamp': pl.Datetime})
+    lf = pl.concat([_scan_file(path) for path in paths], how='vertical')
+    lf = lf.with_columns(
+        pl.col('timestamp').str.strip_chars().str.to_datetime(strict=False),
+        pl.col('status').fill_null(STATUS_PENDING).str.strip_chars().str.to_lowercase().replace(STATUS_ALIASES)
+    )
+    if start is not None:
+        lf = lf.filter(pl.col('timestamp') >= pl.lit(datetime.fromisoformat(str(start))))
+    if end is not None:
+        lf = lf.filter(pl.col('timestamp') < pl.lit(datetime.fromisoformat(str(end))))
+    # Status changes are appended as new rows, the last one per signal is current
+    return lf.unique(subset=['symbol', 'timestamp'], keep='last', maintain_order=True)
+
+def _outcome_columns() -> list:
+    status = pl.col('status')
+    return [
+        pl.len().alias('signals'),
+        (status != STATUS_PENDING).sum().alias('resolved'),
+        status.is_in(SUCCESS_STATUSES).sum().alias('tp1_hit'),
+        status.is_in([STATUS_TP2, STATUS_TP3]).sum().alias('tp2_hit'),
+        (status == STATUS_TP3).sum().alias('tp3_hit'),
+        (status == STATUS_SL).sum().alias('sl_hit'),
+        pl.col('confidence').mean().alias('avg_confidence')
+    ]
+
+def _with_rates(lf: pl.LazyFrame) -> pl.LazyFrame:
+    # Rates are over resolved signals; pending ones have no outcome yet
+    resolved = pl.when(pl.col('resolved') > 0).then(pl.col('resolved'))
+    return lf.with_columns(
+        (pl.col('tp1_hit') / resolved * 100).alias('hit_rate'),
+        (pl.col('sl_hit') / resolved * 100).alias('sl_rate')
+    )
+
+def hit_rates(by=('symbol',), start=None, end=None) -> pl.DataFrame:
+    # Hit and SL rates grouped by any signal columns, e.g. ('symbol',), ('timeframe',) or both
+    try:
+        lf = scan_signals(start, end).group_by(list(by)).agg(_outcome_columns())
+        return _with_rates(lf).sort('signals', descending=True).collect()
+    except Exception as e:
+        logger.error(f"Error computing hit rates: {str(e)}")
+        return pl.DataFrame()
+
+def calibration_curve(start=None, end=None, by=(), bucket: int = CONFIDENCE_BUCKET) -> pl.DataFrame:
+    # Predicted TP possibilities against realised hit rates per confidence bucket of resolved signals
+    try:
+        status = pl.col('status')
+        lf = (
+            scan_signals(start, end)
+            .filter(status != STATUS_PENDING)
+            .with_columns(((pl.col('confidence') // bucket) * bucket).alias('confidence_bucket'))
+            .group_by(['confidence_bucket', *by])
+            .agg(
+                pl.len().alias('resolved'),
+                pl.col('tp1_possibility').mean().alias('predicted_tp1'),
+                (status.is_in(SUCCESS_STATUSES).mean() * 100).alias('realized_tp1'),
+                pl.col('tp2_possibility').mean().alias('predicted_tp2'),
+                (status.is_in([STATUS_TP2, STATUS_TP3]).mean() * 100).alias('realized_tp2'),
+                pl.col('tp3_possibility').mean().alias('predicted_tp3'),
+                ((status == STATUS_TP3).mean() * 100).alias('realized_tp3')
+            )
+        )
+        return lf.sort(['confidence_bucket', *by]).collect()
+    except Exception as e:
+        logger.error(f"Error computing calibration curve: {str(e)}")
+        return pl.DataFrame()
+
+def outcome_counts(start=None, end=None, bucket: int = CONFIDENCE_BUCKET) -> pl.DataFrame:
+    # Resolved signals and TP hits per (confidence bucket, timeframe, condition set), used to seed calibration
+    try:
+        status = pl.col('status')
+        return (
+            scan_signals(start, end)
+            .filter(status != STATUS_PENDING)
+            .with_columns(
+                ((pl.col('confidence') // bucket) * bucket).cast(pl.Int64).alias('confidence_bucket'),
+                pl.col('timeframe').fill_null('unknown'),
+                pl.col('condition_flags').fill_null(0)
+            )
+            .group_by(['confidence_bucket', 'timeframe', 'condition_flags'])
+            .agg(
+                pl.len().alias('resolved'),
+                status.is_in(SUCCESS_STATUSES).sum().alias('tp1_hit'),
+                status.is_in([STATUS_TP2, STATUS_TP3]).sum().alias('tp2_hit'),
+                (status == STATUS_TP3).sum().alias('tp3_hit')
+            )
+            .drop_nulls('confidence_bucket')
+            .collect()
+        )
+    except Exception as e:
+        logger.error(f"Error computing outcome counts: {str(e)}")
+        return pl.DataFrame()
+
+def rolling_performance(start=None, end=None, every: str = '1d', period: str = '7d') -> pl.DataFrame:
+    # Hit rate over a trailing `period`, sampled every `every`
+    try:
+        lf = (
+            scan_signals(start, end)
+            .drop_nulls('timestamp')
+            .sort('timestamp')
+            .group_by_dynamic('timestamp', every=every, period=period, offset=f"-{period}", label='right')
+            .agg(_outcome_columns())
+        )
+        return _with_rates(lf).collect()
+    except Exception as e:
+        logger.error(f"Error computing rolling performance: {str(e)}")
+        return pl.DataFrame()
+
+def signal_page(limit: int = 50, before=None, symbol=None, status=None, direction=None, start=None, end=None) -> tuple:
+    # One page of signals, newest first, with their current status; before is the cursor of the previous page
+    # Keyset pagination on (timestamp, symbol): a page costs the same however deep it is
+    # Returns (rows, cursor of the next page or None)
+    try:
+        lf = scan_signals(start, end).drop_nulls('timestamp')
+        if symbol:
+            lf = lf.filter(pl.col('symbol') == symbol)
+        if status:
+            lf = lf.filter(pl.col('status') == normalize_status(status))
+        if direction:
+            lf = lf.filter(pl.col('direction') == direction.upper())
+        if before:
+            timestamp, _, after_symbol = before.partition('|')
+            timestamp = pl.lit(datetime.fromisoformat(timestamp))
+            lf = lf.filter(
+                (pl.col('timestamp') < timestamp)
+                | ((pl.col('timestamp') == timestamp) & (pl.col('symbol') < after_symbol))
+            )
+        page = (
+            lf.sort(['timestamp', 'symbol'], descending=True)
+            .head(limit + 1)
+            .with_columns(pl.col('timestamp').dt.strftime(TIMESTAMP_FORMAT))
+            .collect()
+        )
+        rows = page.head(limit).to_dicts()
+        cursor = None
+        if page.height > limit:
+            last = rows[-1]
+            cursor = f"{last['timestamp']}|{last['symbol']}"
+        return rows, cursor
+    except Exception as e:
+        logger.error(f"Error reading signal page: {str(e)}")
+        return [], None
+
+def period_summary(start, end) -> dict:
+    # Totals for one range in the shape telebot.formatting.format_daily_summary expects
+    try:
+        lf = scan_signals(start, end)
+        totals = lf.select(
+            *_outcome_columns(),
+            (pl.col('direction') == 'LONG').sum().alias('long'),
+            (pl.col('direction') == 'SHORT').sum().alias('short'),
+            (pl.col('status') == STATUS_TP1).sum().alias('tp1_only'),
+            (pl.col('status') == STATUS_TP2).sum().alias('tp2_only'),
+            (pl.col('status') == STATUS_PENDING).sum().alias('pending'),
+            pl.col('quote_volume_24h').sum().alias('volume'),
+            pl.col('symbol').drop_nulls().mode().first().alias('top_symbol'),
+            pl.col('timeframe').drop_nulls().mode().first().alias('timeframe')
+        ).collect().row(0, named=True)
+        if not totals['signals']:
+            return {}
+        return {
+            'total': totals['signals'],
+            'long': totals['long'],
+            'short': totals['short'],
+            'successful': totals['tp1_hit'],
+            'avg_confidence': totals['avg_confidence'] or 0,
+            'top_symbol': totals['top_symbol'] or 'None',
+            'timeframe': totals['timeframe'] or 'None',
+            'volume': totals['volume'] or 0,
+            # Breakdown by final status, each signal counted once
+            'tp1_hit': totals['tp1_only'],
+            'tp2_hit': totals['tp2_only'],
+            'tp3_hit': totals['tp3_hit'],
+            'sl_hit': totals['sl_hit'],
+            'pending': totals['pending']
+        }
+    except Exception as e:
+        logger.error(f"Error computing period summary: {str(e)}")
+        return {}
+
+def day_summary(day) -> dict:
+    # period_summary for one UTC day, plus the previous day's count used by the daily report
+    start = datetime.combine(day, datetime.min.time())
+    stats = period_summary(start, start + timedelta(days=1))
+    stats['yesterday'] = period_summary(start - timedelta(days=1), start).get('total', 0)
+    return stats
@@ -0,0 +1,187 @@
+# Precomputed replies for the /signal, /status and /summary commands
+# The scanner and tracker push updates here so command handlers answer from memory without I/O
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+import pandas as pd
+import psutil
+from utils.logger import logger, SIGNALS_LOG
+from model.signal import Signal, read_signal_log, SUCCESS_STATUSES
+from telebot.formatting import format_signal_message, format_daily_summary
+
+STATUS_REFRESH_SECONDS = 15
+
+def _signal_date(timestamp):
+    try:
+        return pd.Timestamp(timestamp).date()
+    except Exception:
+        return datetime.utcnow().date()
+
+class DailyStats:
+    # Running counters for one day of signals, adjusted in place as signals arrive and resolve
+    def __init__(self):
+        self.total = 0
+        self.long = 0
+        self.short = 0
+        self.confidence_sum = 0.0
+        self.volume = 0.0
+        self.statuses = Counter()
+        self.symbols = Counter()
+        self.timeframes = Counter()
+
+    def add(self, signal: Signal):
+        self.total += 1
+        if signal.direction == 'LONG':
+            self.long += 1
+        elif signal.direction == 'SHORT':
+            self.short += 1
+        self.confidence_sum += signal.confidence
+        self.volume += signal.quote_volume_24h
+        self.statuses[signal.status] += 1
+        self.symbols[signal.symbol] += 1
+        self.timeframes[signal.timeframe] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'long': self.long,
+            'short': self.short,
+            'successful': sum(self.statuses[s] for s in SUCCESS_STATUSES),
+            'avg_confidence': self.confidence_sum / self.total if self.total else 0,
+            'top_symbol': self.symbols.most_common(1)[0][0] if self.total else 'None',
+            'timeframe': self.timeframes.most_common(1)[0][0] if self.total else 'None',
+            'volume': self.volume,
+            'tp1_hit': self.statuses['tp1_hit'],
+            'tp2_hit': self.statuses['tp2_hit'],
+            'tp3_hit': self.statuses['tp3_hit'],
+            'sl_hit': self.statuses['sl_hit'],
+            'pending': self.statuses['pending']
+        }
+
+class CommandCache:
+    def __init__(self):
+        self.replies = {'signal': None, 'status': None, 'summary': None}
+        self.days = {}
+        self.signal_status = {}
+        self.last_signal_time = None
+        self.scanned = 0
+        self.active = 0
+        self.bot_username = None
+        self.task = None
+
+    def reply(self, command: str, default: str = 'No signals available.') -> str:
+        # O(1) lookup used by the command handlers
+        return self.replies.get(command) or default
+
+    def _day(self, day) -> DailyStats:
+        if day not in self.days:
+            self.days[day] = DailyStats()
+            # Only today and yesterday are ever reported
+            for old in [d for d in self.days if d < datetime.utcnow().date() - timedelta(days=1)]:
+                del self.days[old]
+        return self.days[day]
+
+    def _add(self, signal: Signal):
+        day = _signal_date(signal.timestamp)
+        self._day(day).add(signal)
+        self.signal_status[signal.key] = (day, signal.status)
+
+    def on_signal(self, signal: Signal):
+        # Called once per generated signal, after it has been logged
+        try:
+            self.replies['signal'] = format_signal_message(signal)
+            self._add(signal)
+            self.last_signal_time = signal.timestamp
+            self.render_summary()
+            self.render_status()
+        except Exception as e:
+            logger.error(f"Error updating command cache for signal: {str(e)}")
+
+    def on_status_change(self, signal: Signal):
+        # Move a tracked signal from its previous status bucket to its current one
+        try:
+            if signal.key not in self.signal_status:
+                return
+            day, previous = self.signal_status[signal.key]
+            if day in self.days:
+                stats = self.days[day]
+                stats.statuses[previous] -= 1
+                stats.statuses[signal.status] += 1
+            self.signal_status[signal.key] = (day, signal.status)
+            self.render_summary()
+        except Exception as e:
+            logger.error(f"[{signal.symbol}] Error updating command cache status: {str(e)}")
+
+    def update_scan_state(self, scanned: int, active: int):
+        self.scanned = scanned
+        self.active = active
+        self.render_status()
+
+    def render_summary(self):
+        today = datetime.utcnow().date()
+        stats = self.days[today].as_dict() if today in self.days else {}
+        yesterday = self.days.get(today - timedelta(days=1))
+        stats['yesterday'] = yesterday.total if yesterday else 0
+        self.replies['summary'] = format_daily_summary(today, stats)
+
+    def render_status(self, cpu: float = None):
+        memory = psutil.Process().memory_info().rss / 1024 / 1024
+        if cpu is None:
+            cpu = psutil.cpu_percent(interval=None)
+        lines = ["🩺 Bot Status"]
+        if self.bot_username:
+            lines.append(f"🤖 @{self.bot_username}")
+        lines += [
+            f"📊 Memory Usage: {memory:.2f} MB",
+            f"⚡ CPU Usage: {cpu:.1f}%",
+            f"📡 Symbols scanned: {self.scanned}",
+            f"📈 Active signals: {self.active}",
+            f"🕒 Last Signal: {self.last_signal_time or 'No signals yet'}"
+        ]
+        self.replies['status'] = "\n".join(lines)
+
+    def load_history(self, path: str = SIGNALS_LOG):
+        # Seed today's and yesterday's counters and the latest signal from the log, once at startup
+        try:
+            if not os.path.exists(path):
+                return
+            df = read_signal_log(path)
+            if df.empty or 'timestamp' not in df:
+                return
+            timestamps = pd.to_datetime(df['timestamp'], errors='coerce')
+            since = datetime.utcnow().date() - timedelta(days=1)
+            for row in df[timestamps.dt.date >= since].to_dict('records'):
+                self._add(Signal.from_row(row))
+            # Status updates are appended, so the newest signal is not necessarily the last row
+            latest = Signal.from_row(df.loc[timestamps.idxmax()].to_dict())
+            self.last_signal_time = latest.timestamp
+            try:
+                self.replies['signal'] = format_signal_message(latest)
+            except Exception as e:
+                logger.warning(f"Latest logged signal could not be rendered: {str(e)}")
+            logger.info(f"Command cache loaded {len(df)} logged signals")
+        except Exception as e:
+            logger.error(f"Error loading command cache history: {str(e)}")
+
+    async def run(self, bot=None):
+        # Background refresh: history once, then CPU/memory and the day rollover every few seconds
+        await asyncio.to_thread(self.load_history)
+        if bot is not None:
+            try:
+                self.bot_username = (await bot.get_me()).username
+            except Exception as e:
+                logger.warning(f"Could not fetch bot username: {str(e)}")
+        while True:
+            try:
+                self.render_status()
+                self.render_summary()
+            except Exception as e:
+                logger.error(f"Error refreshing command cache: {str(e)}")
+            await asyncio.sleep(STATUS_REFRESH_SECONDS)
+
+    def start(self, bot=None):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run(bot))
+
+command_cache = CommandCache()
@@ -0,0 +1,127 @@
+# Outbound Telegram dispatcher owning a single Bot session
+# Messages are queued by priority, rate limited per chat and globally, and bursts are merged into digests
+import asyncio
+import itertools
+import os
+import telegram
+from telegram.error import RetryAfter, NetworkError, TelegramError
+from utils.logger import logger
+from utils.rate_limiter import TokenBucket
+
+PRIORITY_ALERT = 0
+PRIORITY_SIGNAL = 1
+PRIORITY_REPORT = 2
+
+# Telegram limits: ~30 messages/s overall, 1 message/s per private chat, 20 messages/min per group
+GLOBAL_RATE = 30.0
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+MAX_SEND_ATTEMPTS = 5
+QUEUE_SIZE = 1000
+
+class TelegramDispatcher:
+    def __init__(self, token: str, default_chat_id: str):
+        self.bot = telegram.Bot(token=token)
+        self.default_chat_id = str(default_chat_id)
+        self.queue = asyncio.PriorityQueue(maxsize=QUEUE_SIZE)
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.counter = itertools.count()
+        self.worker = None
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        # Group chats (negative ids) get the stricter per-minute budget
+        if chat_id not in self.chat_buckets:
+            rate = GROUP_CHAT_RATE if chat_id.startswith('-') else PRIVATE_CHAT_RATE
+            self.chat_buckets[chat_id] = TokenBucket(rate, 1)
+        return self.chat_buckets[chat_id]
+
+    def _ensure_worker(self):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, text: str, chat_id: str = None, priority: int = PRIORITY_SIGNAL, coalesce: bool = True) -> bool:
+        # Queue a message without waiting for it to be delivered
+        # Returns False when the queue is full and the message was dropped
+        chat_id = str(chat_id or self.default_chat_id)
+        try:
+            self.queue.put_nowait((priority, next(self.counter), chat_id, text, coalesce))
+        except asyncio.QueueFull:
+            logger.error(f"Telegram queue full, dropping message for {chat_id}")
+            return False
+        self._ensure_worker()
+        return True
+
+    def _collect_digest(self, priority: int, chat_id: str, text: str) -> list:
+        # Pull queued messages for the same chat and priority into one digest
+        parts = [text]
+        length = len(text)
+        deferred = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            self.queue.task_done()
+            item_priority, _, item_chat, item_text, item_coalesce = item
+            fits = length + len(DIGEST_SEPARATOR) + len(item_text) <= MAX_MESSAGE_LENGTH
+            if item_coalesce and item_chat == chat_id and item_priority == priority and fits:
+                parts.append(item_text)
+                length += len(DIGEST_SEPARATOR) + len(item_text)
+            else:
+                deferred.append(item)
+        for item in deferred:
+            self.queue.put_nowait(item)
+        return parts
+
+    async def _send(self, chat_id: str, text: str) -> bool:
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text[:MAX_MESSAGE_LENGTH])
+                return True
+            except RetryAfter as e:
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                logger.warning(f"Telegram flood control for {chat_id}, retrying in {wait:.0f}s")
+                await asyncio.sleep(wait)
+            except NetworkError as e:
+                logger.warning(f"Telegram network error (attempt {attempt + 1}): {str(e)}")
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                logger.error(f"Error sending Telegram message to {chat_id}: {str(e)}")
+                return False
+        logger.error(f"Giving up on Telegram message to {chat_id} after {MAX_SEND_ATTEMPTS} attempts")
+        return False
+
+    async def _run(self):
+        while True:
+            priority, _, chat_id, text, coalesce = await self.queue.get()
+            try:
+                await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire()
+                # Anything that queued up while waiting for the rate limit goes out as one digest
+                parts = self._collect_digest(priority, chat_id, text) if coalesce else [text]
+                if len(parts) > 1:
+                    logger.info(f"Coalesced {len(parts)} messages into one digest for {chat_id}")
+                await self._send(chat_id, DIGEST_SEPARATOR.join(parts))
+            except Exception as e:
+                logger.error(f"Telegram dispatcher error: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def flush(self, timeout: float = 30.0):
+        # Wait until the queue is drained, used before shutdown
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Telegram queue not drained, {self.queue.qsize()} messages left")
+
+_dispatcher = None
+
+def get_dispatcher(token: str = None, chat_id: str = None) -> TelegramDispatcher:
+    # Shared dispatcher, created on first use from the given or environment credentials
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = TelegramDispatcher(
+            token or os.getenv('TELEGRAM_BOT_TOKEN', ''),
+            chat_id or os.getenv('TELEGRAM_CHAT_ID', '')
+        )
+    return _dispatcher
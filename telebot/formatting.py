@@ -0,0 +1,73 @@
+# Message templates shared by the sender, command handlers and the command cache
+from datetime import datetime
+
+def format_signal_message(signal) -> str:
+    # Format a model.signal.Signal in the user-specified Telegram layout
+    conditions_str = ", ".join(signal.conditions) or "None"
+    return (
+        f"📈 Trading Signal\n"
+        f"💱 Symbol: {signal.symbol}\n"
+        f"📊 Direction: {signal.direction}\n"
+        f"⏰ Timeframe: {signal.timeframe}\n"
+        f"⏳ Trade Duration: {signal.trade_duration}\n"
+        f"💰 Entry Price: {signal.entry:.4f}\n"
+        f"🎯 TP1: {signal.tp1:.4f} ({signal.tp1_possibility:.1f}%)\n"
+        f"🎯 TP2: {signal.tp2:.4f} ({signal.tp2_possibility:.1f}%)\n"
+        f"🎯 TP3: {signal.tp3:.4f} ({signal.tp3_possibility:.1f}%)\n"
+        f"🛑 SL: {signal.sl:.4f}\n"
+        f"🔍 Confidence: {signal.confidence:.2f}%\n"
+        f"⚡ Trade Type: {signal.trade_type}\n"
+        f"📈 1 hour Volume: ${signal.volume:,.2f}\n"
+        f"📈 24 Hour Volume: ${signal.quote_volume_24h:,.2f}\n"
+        f"🔎 Conditions: {conditions_str}\n"
+        f"🕒 Timestamp: {signal.timestamp}\n"
+        f"📊 Leverage: {signal.leverage}x\n"
+        f"📈 BTC Trend: {signal.btc_trend:.2f}%\n"
+        f"📊 MA200: {signal.ma200_status}"
+    )
+
+def format_daily_summary(day, stats: dict = None) -> str:
+    # Format the daily trading summary, an empty or missing stats dict renders all zeros
+    stats = stats or {}
+    total = stats.get('total', 0)
+    successful = stats.get('successful', 0)
+    successful_percentage = (successful / total * 100) if total > 0 else 0
+    return (
+        f"📊 Daily Trading Summary ({day})\n"
+        f"📈 Total Signals: {total}\n"
+        f"📅 Yesterday's Signals: {stats.get('yesterday', 0)}\n"
+        f"🚀 Long Signals: {stats.get('long', 0)}\n"
+        f"📉 Short Signals: {stats.get('short', 0)}\n"
+        f"🎯 Successful Signals: {successful} ({successful_percentage:.2f}%)\n"
+        f"🔍 Average Confidence: {stats.get('avg_confidence', 0):.2f}%\n"
+        f"🏆 Top Symbol: {stats.get('top_symbol', 'None')}\n"
+        f"📊 Most Active Timeframe: {stats.get('timeframe', 'None')}\n"
+        f"⚡ Total Volume Analyzed: {stats.get('volume', 0):,.0f} (USDT)\n"
+        f"🔎 Signal Status Breakdown:\n"
+        f"   - TP1 Hit: {stats.get('tp1_hit', 0)}\n"
+        f"   - TP2 Hit: {stats.get('tp2_hit', 0)}\n"
+        f"   - TP3 Hit: {stats.get('tp3_hit', 0)}\n"
+        f"   - SL Hit: {stats.get('sl_hit', 0)}\n"
+        f"   - Pending: {stats.get('pending', 0)}\n"
+        f"Generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+    )
+
+def format_performance_report(days: int, stats: dict, symbols: list, timeframes: list, top: int = 10) -> str:
+    # Multi-day hit rates; symbols and timeframes are rows from report.analytics.hit_rates
+    def rate(value):
+        return f"{value:.1f}%" if value is not None else "n/a"
+
+    lines = [
+        f"📊 Performance Report (last {days} days)",
+        f"📈 Total Signals: {stats.get('total', 0)}",
+        f"🎯 Successful Signals: {stats.get('successful', 0)}",
+        f"🛑 SL Hit: {stats.get('sl_hit', 0)}",
+        f"⏳ Pending: {stats.get('pending', 0)}",
+        f"🔍 Average Confidence: {stats.get('avg_confidence', 0):.2f}%",
+        "⏰ By Timeframe:"
+    ]
+    lines += [f"   - {row['timeframe']}: {row['signals']} signals, hit rate {rate(row['hit_rate'])}" for row in timeframes]
+    lines.append(f"💱 Top {top} Symbols:")
+    lines += [f"   - {row['symbol']}: {row['signals']} signals, hit rate {rate(row['hit_rate'])}" for row in symbols[:top]]
+    lines.append(f"Generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
+    return "\n".join(lines)
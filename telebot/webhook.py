@@ -0,0 +1,45 @@
+# Telegram webhook mode served from the FastAPI app
+# Updates are posted by Telegram and fed into the same Application handlers used by polling
+import os
+from fastapi import FastAPI, Request, Response
+from telegram import Update
+from telegram.ext import Application
+from utils.logger import logger
+
+WEBHOOK_PATH = "/telegram/webhook"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def webhook_enabled() -> bool:
+    # Webhook mode is used when a public URL is configured, otherwise the bot polls
+    return bool(os.getenv('TELEGRAM_WEBHOOK_URL'))
+
+def mount_webhook(app: FastAPI, application: Application, path: str = WEBHOOK_PATH):
+    # Register the update endpoint; routes can be added while uvicorn is already serving
+    secret = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+
+    async def telegram_webhook(request: Request):
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            logger.warning("Rejected Telegram webhook call with invalid secret")
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+            # Handlers run on the Application's own workers, Telegram gets its 200 right away
+            await application.update_queue.put(update)
+        except Exception as e:
+            logger.error(f"Error handling Telegram webhook update: {str(e)}")
+        return Response(status_code=200)
+
+    app.add_api_route(path, telegram_webhook, methods=["POST"], include_in_schema=False)
+    logger.info(f"Telegram webhook endpoint mounted at {path}")
+
+async def start_webhook(application: Application, path: str = WEBHOOK_PATH):
+    # Point Telegram at our endpoint instead of long polling
+    url = os.getenv('TELEGRAM_WEBHOOK_URL', '').rstrip('/') + path
+    secret = os.getenv('TELEGRAM_WEBHOOK_SECRET') or None
+    await application.bot.set_webhook(
+        url=url,
+        secret_token=secret,
+        allowed_updates=["message"],
+        drop_pending_updates=True
+    )
+    logger.info(f"Telegram webhook set to {url}")
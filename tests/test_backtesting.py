@@ -0,0 +1,39 @@
+import numpy as np
+from data.backtesting import evaluate_outcomes, PENDING, TP1_HIT, TP2_HIT, SL_HIT
+
+LEVELS = {'tp1': np.array([102.0]), 'tp2': np.array([104.0]), 'tp3': np.array([106.0]), 'sl': np.array([97.0])}
+
+def _outcome(high, low, sign=1.0, levels=LEVELS):
+    high, low = np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64)
+    close = (high + low) / 2
+    close[0] = 100.0
+    return evaluate_outcomes(high, low, close, np.array([0]), np.array([sign]), levels)
+
+def test_sl_before_tp_is_a_loss():
+    status, pnl = _outcome([100, 99, 99, 99, 99, 103], [100, 95, 98, 98, 98, 101])
+    assert status[0] == SL_HIT
+    assert np.isclose(pnl[0], -3.0)
+
+def test_tp_before_sl_is_a_win():
+    status, pnl = _outcome([100, 103, 101, 101, 101, 101], [100, 99, 98, 98, 95, 98])
+    assert status[0] == TP1_HIT
+    assert np.isclose(pnl[0], 2.0)
+
+def test_higher_tp_after_sl_does_not_count():
+    status, _ = _outcome([100, 103, 101, 101, 105], [100, 101, 96, 99, 101])
+    assert status[0] == TP1_HIT
+
+def test_sl_and_tp_on_the_same_candle_is_a_loss():
+    status, _ = _outcome([100, 103, 101], [100, 96, 99])
+    assert status[0] == SL_HIT
+
+def test_short_resolves_by_first_touch():
+    levels = {'tp1': np.array([98.0]), 'tp2': np.array([96.0]), 'tp3': np.array([94.0]), 'sl': np.array([103.0])}
+    status, pnl = _outcome([100, 101, 101, 104], [100, 99, 95, 99], sign=-1.0, levels=levels)
+    assert status[0] == TP2_HIT
+    assert np.isclose(pnl[0], 4.0)
+
+def test_unresolved_signal_exits_at_the_last_close():
+    status, pnl = _outcome([100, 101, 101], [100, 99, 99])
+    assert status[0] == PENDING
+    assert np.isclose(pnl[0], 0.0)
@@ -1,58 +1,89 @@
-# Updated utils/fibonacci.py to include only 38.2% and 61.8% levels and improve validation
+# Fibonacci retracement levels between the high and low of the last FIB_WINDOW candles
+import math
+from collections import deque
+import cachetools
 import pandas as pd
-import numpy as np
 from utils.logger import logger
+from utils.helpers import candles_since
 
-def calculate_fibonacci_levels(df):
-    try:
-        if len(df) < 2 or df['high'].std() <= 0 or df['low'].std() <= 0:
-            logger.warning("Insufficient data for Fibonacci levels, returning dummy DataFrame")
-            dummy_df = df.copy()
-            fib_levels = {'fib_0.382': 0.0, 'fib_0.618': 0.0}
-            for level, value in fib_levels.items():
-                dummy_df[level] = value
-            logger.info("Dummy Fibonacci levels added: fib_0.382, fib_0.618")
-            return dummy_df
-
-        df = df.copy()
-        df = df.astype({'high': 'float32', 'low': 'float32', 'close': 'float32'})
-        window = min(len(df), 100)
-        max_high = df['high'].tail(window).max()
-        min_low = df['low'].tail(window).min()
-
-        if pd.isna(max_high) or pd.isna(min_low) or max_high <= min_low:
-            logger.warning("Invalid high/low for Fibonacci levels, returning dummy DataFrame")
-            dummy_df = df.copy()
-            fib_levels = {'fib_0.382': 0.0, 'fib_0.618': 0.0}
-            for level, value in fib_levels.items():
-                dummy_df[level] = value
-            logger.info("Dummy Fibonacci levels added: fib_0.382, fib_0.618")
-            return dummy_df
+# Rolling-extrema Fibonacci levels per (symbol, timeframe)
+# Monotonic deques keep the window max/min so each candle is O(1) and the DataFrame is never copied
+FIB_WINDOW = 100
+FIB_RATIOS = (0.0, 0.236, 0.382, 0.5, 0.618, 0.786, 1.0)
+
+class FibonacciTracker:
+    def __init__(self, window: int = FIB_WINDOW, ratios: tuple = FIB_RATIOS):
+        self.window = window
+        self.ratios = ratios
+        self.reset()
+
+    def reset(self):
+        self.index = -1
+        self.last_timestamp = None
+        self.forming = None
+        # (index, price) pairs, highs decreasing and lows increasing from the front
+        self.max_highs = deque()
+        self.min_lows = deque()
+
+    def update(self, high: float, low: float):
+        # Add one closed candle; the window keeps window - 1 closed candles plus the forming one
+        self.index += 1
+        high, low = float(high), float(low)
+        while self.max_highs and self.max_highs[-1][1] <= high:
+            self.max_highs.pop()
+        self.max_highs.append((self.index, high))
+        while self.min_lows and self.min_lows[-1][1] >= low:
+            self.min_lows.pop()
+        self.min_lows.append((self.index, low))
+        oldest = self.index - self.window + 2
+        while self.max_highs[0][0] < oldest:
+            self.max_highs.popleft()
+        while self.min_lows[0][0] < oldest:
+            self.min_lows.popleft()
 
+    def feed(self, df: pd.DataFrame):
+        # Closed candles go into the deques, the still-forming last candle is only remembered
+        if df.empty:
+            return
+        closed = df.iloc[:-1]
+        rows, reset = candles_since(closed, self.last_timestamp)
+        if reset:
+            self.reset()
+            rows = closed.tail(self.window - 1)
+        for high, low in zip(rows['high'].to_numpy(), rows['low'].to_numpy()):
+            self.update(high, low)
+        if 'timestamp' in closed.columns and not closed.empty:
+            self.last_timestamp = closed['timestamp'].iloc[-1]
+        self.forming = (float(df['high'].iloc[-1]), float(df['low'].iloc[-1]))
+
+    def levels(self) -> dict:
+        # Levels as scalars keyed fib_<ratio> (fib_0.382, fib_0.618, ...), zeros when invalid
+        highs = [self.max_highs[0][1]] if self.max_highs else []
+        lows = [self.min_lows[0][1]] if self.min_lows else []
+        if self.forming is not None:
+            highs.append(self.forming[0])
+            lows.append(self.forming[1])
+        if not highs:
+            return {f"fib_{ratio}": 0.0 for ratio in self.ratios}
+        max_high, min_low = max(highs), min(lows)
+        if not (math.isfinite(max_high) and math.isfinite(min_low)) or max_high <= min_low:
+            return {f"fib_{ratio}": 0.0 for ratio in self.ratios}
         diff = max_high - min_low
-        fib_levels = {
-            'fib_0.382': min_low + 0.382 * diff,
-            'fib_0.618': min_low + 0.618 * diff
-        }
-
-        for level, value in fib_levels.items():
-            df[level] = value
-
-        if df.isna().any().any() or df.isin([np.inf, -np.inf]).any().any():
-            logger.warning("NaN or Inf values in Fibonacci levels, returning dummy DataFrame")
-            dummy_df = df.copy()
-            for level in fib_levels:
-                dummy_df[level] = 0.0
-            logger.info("Dummy Fibonacci levels added: fib_0.382, fib_0.618")
-            return dummy_df
-
-        logger.info(f"Fibonacci levels calculated for {len(df)} rows: fib_0.382, fib_0.618")
-        return df
+        return {f"fib_{ratio}": min_low + ratio * diff for ratio in self.ratios}
+
+fibonacci_trackers = cachetools.LRUCache(maxsize=2000)
+
+def track_fibonacci_levels(symbol: str, timeframe: str, df: pd.DataFrame) -> dict:
+    # Scalar levels of the symbol's candles, fed incrementally per (symbol, timeframe)
+    try:
+        key = (symbol, timeframe)
+        if key not in fibonacci_trackers:
+            fibonacci_trackers[key] = FibonacciTracker()
+        tracker = fibonacci_trackers[key]
+        tracker.feed(df)
+        levels = tracker.levels()
+        logger.info(f"[{symbol}] Fibonacci levels for {timeframe}: fib_0.382={levels.get('fib_0.382', 0):.4f}, fib_0.618={levels.get('fib_0.618', 0):.4f}")
+        return levels
     except Exception as e:
-        logger.error(f"Error in calculate_fibonacci_levels: {e}")
-        dummy_df = df.copy()
-        fib_levels = {'fib_0.382': 0.0, 'fib_0.618': 0.0}
-        for level, value in fib_levels.items():
-            dummy_df[level] = value
-        logger.info("Dummy Fibonacci levels added due to error: fib_0.382, fib_0.618")
-        return dummy_df
+        logger.error(f"[{symbol}] Error tracking Fibonacci levels: {e}")
+        return {f"fib_{ratio}": 0.0 for ratio in FIB_RATIOS}
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from utils.logger import logger  # Changed from 'log' to 'logger'
 
 def validate_dataframe(df: pd.DataFrame) -> bool:
@@ -18,3 +19,14 @@ def validate_dataframe(df: pd.DataFrame) -> bool:
     except Exception as e:
         logger.error(f"Error validating DataFrame: {str(e)}")
         return False
+
+def candles_since(df: pd.DataFrame, last_timestamp):
+    # Split off the rows newer than last_timestamp for incremental trackers
+    # Returns (rows, reset): reset is True when the frame does not continue the seen history
+    if 'timestamp' not in df.columns or last_timestamp is None or df.empty:
+        return df, True
+    timestamps = df['timestamp'].to_numpy()
+    if timestamps[0] > last_timestamp or timestamps[-1] < last_timestamp:
+        return df, True
+    start = int(np.searchsorted(timestamps, last_timestamp, side='right'))
+    return df.iloc[start:], False
@@ -1,5 +1,6 @@
 # Updated logger to ensure robust CSV logging, archiving, and include market trend data
 import os
+import csv
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
@@ -33,72 +34,60 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 logger.propagate = False
 
-def log_signal_to_csv(signal):
-    # Log signal data to CSV with all required fields including market trend
-    # Added btc_trend and ma200_status for better signal context
-    try:
-        csv_path = "logs/signals_log_new.csv"
-        timestamp = signal.get("timestamp", pd.Timestamp.now()).strftime('%Y-%m-%d %H:%M:%S')
-        data = pd.DataFrame({
-            "symbol": [signal.get("symbol", "")],
-            "price": [signal.get("entry", "")],
-            "direction": [signal.get("direction", "")],
-            "tp1": [signal.get("tp1", "")],
-            "tp2": [signal.get("tp2", "")],
-            "tp3": [signal.get("tp3", "")],
-            "sl": [signal.get("sl", "")],
-            "confidence": [signal.get("confidence", 0)],
-            "trade_type": [signal.get("trade_type", "")],
-            "timestamp": [timestamp],
-            "tp1_possibility": [signal.get("tp1_possibility", 0)],
-            "tp2_possibility": [signal.get("tp2_possibility", 0)],
-            "tp3_possibility": [signal.get("tp3_possibility", 0)],
-            "conditions": [", ".join(signal.get("conditions", []))],
-            "volume": [signal.get("volume", 0)],
-            "quote_volume_24h": [signal.get("quote_volume_24h", 0)],
-            "status": [signal.get("status", "pending")],
-            "hit_timestamp": [signal.get("hit_timestamp", None)],
-            "leverage": [signal.get("leverage", 10)],
-            "btc_trend": [signal.get("btc_trend", 0)],  # Added BTC trend
-            "ma200_status": [signal.get("ma200_status", "unknown")]  # Added MA200 status
-        })
-
-        if os.path.exists(csv_path):
-            old_df = pd.read_csv(csv_path)
-            if not data.empty:
-                data = pd.concat([old_df, data], ignore_index=True)
+SIGNALS_LOG = os.path.join(LOG_DIR, "signals_log_new.csv")
+_prepared_logs = set()
+_archived_on = {}
 
-        if not data.empty:
-            data.to_csv(csv_path, index=False)
-            logger.info(f"Signal logged to CSV for {signal.get('symbol', '')}")
-        else:
-            logger.error("No valid data to log to CSV")
+def _prepare_signal_log(csv_path, columns):
+    # Once per process: write the header to a new log, and set aside a log written with another layout
+    if csv_path in _prepared_logs:
+        return
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+        with open(csv_path, newline="") as f:
+            header = next(csv.reader(f), [])
+        if header != list(columns):
+            legacy_path = os.path.join(LOG_DIR, "archive", f"signals_log_legacy_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv")
+            os.makedirs(os.path.dirname(legacy_path), exist_ok=True)
+            os.replace(csv_path, legacy_path)
+            logger.warning(f"Signal log had an old column layout, moved to {legacy_path}")
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        with open(csv_path, "w", newline="") as f:
+            csv.writer(f).writerow(columns)
+    _prepared_logs.add(csv_path)
 
+def log_signal_to_csv(signal, csv_path=SIGNALS_LOG):
+    # Append one row per new signal or status change (model.signal.Signal layout)
+    # Readers keep the last row per (symbol, timestamp), see model.signal.read_signal_log
+    try:
+        _prepare_signal_log(csv_path, signal.COLUMNS)
+        with open(csv_path, "a", newline="") as f:
+            csv.writer(f).writerow(signal.to_row())
+        logger.info(f"Signal logged to CSV for {signal.symbol} ({signal.status})")
         archive_old_logs(csv_path)
-
     except Exception as e:
         logger.error(f"Error logging signal to CSV: {e}")
 
 def archive_old_logs(csv_path):
     # Archive old logs to prevent file size issues
-    # Keep logs for last 7 days, archive older data
+    # Keep logs for last 7 days, archive older data; checked once a day rather than on every append
     try:
-        if not os.path.exists(csv_path):
+        current_date = datetime.utcnow()
+        if _archived_on.get(csv_path) == current_date.date() or not os.path.exists(csv_path):
             return
+        _archived_on[csv_path] = current_date.date()
         df = pd.read_csv(csv_path)
         if df.empty:
             return
-        
-        current_date = datetime.utcnow()
+
         week_ago = current_date - pd.Timedelta(days=7)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        old_data = df[df['timestamp'].dt.date < week_ago.date()]
-        
+        dates = pd.to_datetime(df['timestamp'], errors='coerce').dt.date
+        old_data = df[dates < week_ago.date()]
+
         if not old_data.empty:
             archive_path = f"logs/archive/signals_log_{week_ago.strftime('%Y%m%d')}.csv"
             os.makedirs(os.path.dirname(archive_path), exist_ok=True)
-            old_data.to_csv(archive_path, index=False)
-            new_data = df[df['timestamp'].dt.date >= week_ago.date()]
+            old_data.to_csv(archive_path, mode="a", header=not os.path.exists(archive_path), index=False)
+            new_data = df[~(dates < week_ago.date())]
             new_data.to_csv(csv_path, index=False)
             logger.info(f"Archived {len(old_data)} old signals to {archive_path}")
     except Exception as e:
@@ -0,0 +1,36 @@
+# Token bucket rate limiter shared by outbound senders and API clients
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        # rate is tokens refilled per second, capacity is the largest burst allowed
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        # Take tokens without waiting, returns False when the bucket is empty
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        # Seconds until the requested tokens become available
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0):
+        # Wait until the tokens are available and take them
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.wait_time(tokens))
@@ -1,40 +1,170 @@
-# Updated utils/support_resistance.py to increase range to 10% and improve validation
+# Support/resistance from swing pivots over the last PIVOT_LOOKBACK closed candles
+import bisect
+import heapq
+from collections import deque
+import cachetools
 import pandas as pd
 import numpy as np
 from utils.logger import logger
+from utils.helpers import candles_since
 
-def calculate_support_resistance(symbol: str, df: pd.DataFrame) -> dict:
-    try:
-        window = min(len(df), 100)
-        recent_df = df.tail(window).copy()
-        
-        if len(recent_df) < 20:
-            logger.warning(f"[{symbol}] Insufficient data for support/resistance")
+# Incremental pivot tracking per (symbol, timeframe)
+# Pivots are confirmed once the candles after them have closed, so each new candle costs O(1)
+PIVOT_WINDOW = 5  # centered window: a pivot is the extreme of the two candles on each side
+PIVOT_LOOKBACK = 100
+ZONE_TOLERANCE = 0.005
+
+class PivotTracker:
+    def __init__(self, lookback: int = PIVOT_LOOKBACK, window: int = PIVOT_WINDOW):
+        self.lookback = lookback
+        self.half = window // 2
+        self.reset()
+
+    def reset(self):
+        self.index = -1
+        self.last_timestamp = None
+        self.recent = deque(maxlen=self.half * 2 + 1)
+        # Confirmed pivots in arrival order (for expiry) and sorted by price (for bisect queries)
+        self.pivot_highs = deque()
+        self.pivot_lows = deque()
+        self.sorted_highs = []
+        self.sorted_lows = []
+        self.high_sum = 0.0
+        self.low_sum = 0.0
+        # Monotonic deques of (index, price) for the lookback max/min fallback
+        self.max_highs = deque()
+        self.min_lows = deque()
+
+    def update(self, high: float, low: float):
+        self.index += 1
+        high, low = float(high), float(low)
+        self.recent.append((high, low))
+        while self.max_highs and self.max_highs[-1][1] <= high:
+            self.max_highs.pop()
+        self.max_highs.append((self.index, high))
+        while self.min_lows and self.min_lows[-1][1] >= low:
+            self.min_lows.pop()
+        self.min_lows.append((self.index, low))
+
+        # The middle candle of a full window is now confirmed (or not) as a pivot
+        if len(self.recent) == self.recent.maxlen:
+            center_high, center_low = self.recent[self.half]
+            center_index = self.index - self.half
+            if center_high >= max(h for h, _ in self.recent):
+                self.pivot_highs.append((center_index, center_high))
+                bisect.insort(self.sorted_highs, center_high)
+                self.high_sum += center_high
+            if center_low <= min(l for _, l in self.recent):
+                self.pivot_lows.append((center_index, center_low))
+                bisect.insort(self.sorted_lows, center_low)
+                self.low_sum += center_low
+        self._expire()
+
+    def _expire(self):
+        # Drop pivots and extremes that fell out of the lookback window
+        oldest = self.index - self.lookback + 1
+        for pivots, levels, side in ((self.pivot_highs, self.sorted_highs, 'high'), (self.pivot_lows, self.sorted_lows, 'low')):
+            while pivots and pivots[0][0] < oldest + self.half:
+                _, price = pivots.popleft()
+                del levels[bisect.bisect_left(levels, price)]
+                if side == 'high':
+                    self.high_sum -= price
+                else:
+                    self.low_sum -= price
+        while self.max_highs and self.max_highs[0][0] < oldest:
+            self.max_highs.popleft()
+        while self.min_lows and self.min_lows[0][0] < oldest:
+            self.min_lows.popleft()
+
+    def feed(self, df: pd.DataFrame):
+        # Feed closed candles not seen yet; the last row is still forming and is skipped
+        closed = df.iloc[:-1]
+        rows, reset = candles_since(closed, self.last_timestamp)
+        if reset:
+            self.reset()
+            rows = closed.tail(self.lookback)
+        for high, low in zip(rows['high'].to_numpy(), rows['low'].to_numpy()):
+            self.update(high, low)
+        if 'timestamp' in closed.columns and not closed.empty:
+            self.last_timestamp = closed['timestamp'].iloc[-1]
+
+    def levels(self) -> dict:
+        # Average pivot levels, falling back to the lookback extremes while no pivot is confirmed
+        if self.index + 1 < 20:
             return {'support': 0.0, 'resistance': 0.0}
-            
-        pivots_high = recent_df['high'].rolling(window=5, center=True).max()
-        pivots_low = recent_df['low'].rolling(window=5, center=True).min()
-        
-        resistance_levels = recent_df[pivots_high == recent_df['high']]['high'].dropna()
-        support_levels = recent_df[pivots_low == recent_df['low']]['low'].dropna()
-        
-        if len(resistance_levels) > 0:
-            resistance = float(np.mean(resistance_levels))
+        if self.sorted_highs:
+            resistance = self.high_sum / len(self.sorted_highs)
         else:
-            resistance = float(recent_df['high'].max())
-            
-        if len(support_levels) > 0:
-            support = float(np.mean(support_levels))
+            resistance = self.max_highs[0][1]
+        if self.sorted_lows:
+            support = self.low_sum / len(self.sorted_lows)
         else:
-            support = float(recent_df['low'].min())
-            
-        # Validate non-zero support/resistance
+            support = self.min_lows[0][1]
         if support <= 0.01 or resistance <= 0.01:
-            logger.warning(f"[{symbol}] Invalid support/resistance: support={support}, resistance={resistance}")
             return {'support': 0.0, 'resistance': 0.0}
-            
-        logger.info(f"[{symbol}] Support: {support}, Resistance: {resistance}")
-        return {'support': support, 'resistance': resistance}
+        return {'support': float(support), 'resistance': float(resistance)}
+
+    def nearest_support(self, price: float):
+        # Highest confirmed pivot at or below price, None if there is none
+        candidates = []
+        for levels in (self.sorted_lows, self.sorted_highs):
+            i = bisect.bisect_right(levels, price)
+            if i > 0:
+                candidates.append(levels[i - 1])
+        return max(candidates) if candidates else None
+
+    def nearest_resistance(self, price: float):
+        # Lowest confirmed pivot at or above price, None if there is none
+        candidates = []
+        for levels in (self.sorted_lows, self.sorted_highs):
+            i = bisect.bisect_left(levels, price)
+            if i < len(levels):
+                candidates.append(levels[i])
+        return min(candidates) if candidates else None
+
+    def zones(self, tolerance: float = ZONE_TOLERANCE) -> list:
+        # Cluster confirmed pivots into price zones in one pass over the sorted levels
+        zones = []
+        for price in heapq.merge(self.sorted_lows, self.sorted_highs):
+            if zones and price <= zones[-1]['low'] * (1 + tolerance):
+                zone = zones[-1]
+                zone['high'] = price
+                zone['touches'] += 1
+                zone['total'] += price
+            else:
+                zones.append({'low': price, 'high': price, 'touches': 1, 'total': price})
+        for zone in zones:
+            zone['price'] = zone.pop('total') / zone['touches']
+        return zones
+
+pivot_trackers = cachetools.LRUCache(maxsize=2000)
+
+def get_pivot_tracker(symbol: str, timeframe: str) -> PivotTracker:
+    key = (symbol, timeframe)
+    if key not in pivot_trackers:
+        pivot_trackers[key] = PivotTracker()
+    return pivot_trackers[key]
+
+def track_support_resistance(symbol: str, timeframe: str, df: pd.DataFrame) -> dict:
+    # Support/resistance of the symbol's closed candles, zeros while there are fewer than 20
+    try:
+        tracker = get_pivot_tracker(symbol, timeframe)
+        tracker.feed(df)
+        levels = tracker.levels()
+        logger.info(f"[{symbol}] Support: {levels['support']}, Resistance: {levels['resistance']}")
+        return levels
     except Exception as e:
-        logger.error(f"[{symbol}] Error calculating support/resistance: {str(e)}")
+        logger.error(f"[{symbol}] Error tracking support/resistance: {str(e)}")
         return {'support': 0.0, 'resistance': 0.0}
+
+def support_resistance_series(df: pd.DataFrame, lookback: int = PIVOT_LOOKBACK):
+    # Levels each row would have seen live: row i uses only the closed candles before it
+    tracker = PivotTracker(lookback)
+    support = np.zeros(len(df))
+    resistance = np.zeros(len(df))
+    for i, (high, low) in enumerate(zip(df['high'].to_numpy(), df['low'].to_numpy())):
+        levels = tracker.levels()
+        support[i] = levels['support']
+        resistance[i] = levels['resistance']
+        tracker.update(high, low)
+    return support, resistance